@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Move conversations that have been idle for a while into compressed cold storage.
+
+    python archive_conversations.py             # idle for ARCHIVE_IDLE_DAYS (default 90)
+    python archive_conversations.py --days 30
+"""
+import asyncio
+import argparse
+from motor.motor_asyncio import AsyncIOMotorClient
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import message_archive
+from events import event_bus
+
+async def archive_conversations(idle_days: int):
+    """Archive every conversation idle for idle_days"""
+
+    print(f"🧊 Archiving conversations idle for {idle_days}+ days...")
+    print(f"   Codec: {message_archive.ARCHIVE_CODEC}")
+
+    # Connect to MongoDB
+    mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+    database_name = os.getenv("DATABASE_NAME", "jai_database")
+
+    client = AsyncIOMotorClient(mongodb_url)
+    db = client[database_name]
+
+    # Relays cache invalidations to the API workers when Redis is configured
+    await event_bus.start()
+
+    try:
+        await message_archive.create_archive_indexes(db)
+
+        stats = await message_archive.archive_idle_conversations(db, idle_days)
+
+        print(f"\n🎉 Archived {stats['messages']} messages from {stats['conversations']} conversations")
+
+        # Show summary
+        pipeline = [{"$group": {
+            "_id": None,
+            "conversations": {"$sum": 1},
+            "raw_size": {"$sum": "$raw_size"},
+            "stored_size": {"$sum": {"$binarySize": "$blob"}}
+        }}]
+        summary = await db.message_archive.aggregate(pipeline).to_list(length=1)
+        if summary:
+            totals = summary[0]
+            ratio = totals["raw_size"] / totals["stored_size"] if totals["stored_size"] else 0
+            print("\n📊 Archive Summary:")
+            print(f"   Conversations: {totals['conversations']}")
+            print(f"   BSON size:     {totals['raw_size']:,} bytes")
+            print(f"   Stored size:   {totals['stored_size']:,} bytes ({ratio:.1f}x smaller)")
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+    finally:
+        await event_bus.stop()
+        client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive idle conversations")
+    parser.add_argument("--days", type=int, default=message_archive.ARCHIVE_IDLE_DAYS,
+                        help="Archive conversations idle for at least this many days")
+    args = parser.parse_args()
+    asyncio.run(archive_conversations(args.days))
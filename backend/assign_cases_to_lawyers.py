@@ -9,6 +9,8 @@ import os
 from dotenv import load_dotenv
 from bson import ObjectId
 
+from write_coalescer import WriteCoalescer, MODE_DEFERRED
+
 load_dotenv()
 
 async def assign_cases_to_lawyers():
@@ -94,14 +96,15 @@ async def assign_cases_to_lawyers():
             unassigned_cases = await db.cases.find({"lawyer_id": {"$exists": False}}).to_list(length=100)
             print(f"✅ Created {len(test_cases)} new test cases")
         
-        # Assign cases to lawyers
+        # Assign cases to lawyers; assignments are queued and written in bulk
+        case_writer = WriteCoalescer(db.cases, mode=MODE_DEFERRED)
         assigned_count = 0
         for i, case in enumerate(unassigned_cases):
             # Assign to lawyer in round-robin fashion
             lawyer = lawyers[i % len(lawyers)]
             
             # Update case with lawyer assignment
-            await db.cases.update_one(
+            await case_writer.update_one(
                 {"_id": case["_id"]},
                 {
                     "$set": {
@@ -114,6 +117,8 @@ async def assign_cases_to_lawyers():
             assigned_count += 1
             print(f"✅ Assigned case '{case['title']}' to {lawyer['first_name']} {lawyer['last_name']}")
         
+        await case_writer.close()
+        
         print(f"\n🎉 Successfully assigned {assigned_count} cases to lawyers!")
         
         # Show summary
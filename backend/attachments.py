@@ -0,0 +1,359 @@
+"""
+File attachments for J.A.I conversations
+
+Uploads are hashed into a spool file (in memory up to UPLOAD_SPOOL_MEMORY, on
+disk beyond that) and only copied into GridFS when the content is new;
+downloads are streamed out of GridFS chunk by chunk, so neither direction ever
+holds a whole file in memory. Downloads honour HTTP Range (single range) and
+If-None-Match.
+
+Storage is content addressed: each unique file is kept once as a blob keyed by
+its SHA-256 digest (attachment_blobs) with a reference count, and every share in
+a conversation is a lightweight reference (attachment_refs) that carries the
+conversation ACL and the file name. A client that re-sends a document it has
+uploaded before can pass X-Content-SHA256 and skip the body altogether; other
+duplicates are recognised from the spooled digest and never written to GridFS.
+Blobs whose count drops to zero are removed in batches by collect_garbage().
+"""
+
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, Optional, Tuple
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pymongo.errors import DuplicateKeyError
+from urllib.parse import quote
+import hashlib
+import tempfile
+import os
+import re
+import unicodedata
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Attachment configuration
+ATTACHMENT_BUCKET = "attachments"
+MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", str(100 * 1024 * 1024)))
+GRIDFS_CHUNK_SIZE = 255 * 1024
+DOWNLOAD_READ_SIZE = 256 * 1024
+UPLOAD_SPOOL_MEMORY = int(os.getenv("UPLOAD_SPOOL_MEMORY", str(1024 * 1024)))
+STORE_BLOB_ATTEMPTS = 3
+
+# Garbage collection of unreferenced blobs
+BLOB_GC_BATCH_SIZE = int(os.getenv("BLOB_GC_BATCH_SIZE", "100"))
+BLOB_GC_GRACE_MINUTES = int(os.getenv("BLOB_GC_GRACE_MINUTES", "60"))
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+UNSAFE_FILENAME_CHARS = re.compile(r"[^A-Za-z0-9 ._()-]")
+
+class AttachmentTooLarge(Exception):
+    """Raised when an upload exceeds MAX_FILE_SIZE"""
+
+class DigestMismatch(Exception):
+    """Raised when the uploaded bytes do not hash to the digest the client claimed"""
+
+class RangeNotSatisfiable(Exception):
+    """Raised when a Range header cannot be served for the file"""
+
+def get_bucket(db) -> AsyncIOMotorGridFSBucket:
+    return AsyncIOMotorGridFSBucket(db, bucket_name=ATTACHMENT_BUCKET, chunk_size_bytes=GRIDFS_CHUNK_SIZE)
+
+def attachment_url(attachment_id: ObjectId) -> str:
+    return f"/api/messages/attachments/{attachment_id}"
+
+def normalize_digest(digest: Optional[str]) -> Optional[str]:
+    """Lower-case hex SHA-256, or None when the value is not a valid digest"""
+    if not digest:
+        return None
+    digest = digest.strip().lower()
+    return digest if DIGEST_PATTERN.match(digest) else None
+
+async def create_attachment_indexes(db):
+    """Indexes for blobs, references and legacy per-conversation files"""
+    await db[f"{ATTACHMENT_BUCKET}.files"].create_index("metadata.request_id")
+    await db.attachment_blobs.create_index([("ref_count", 1), ("released_at", 1)])
+    await db.attachment_refs.create_index("request_id")
+    await db.attachment_refs.create_index([("uploaded_by", 1), ("digest", 1)])
+
+async def save_stream(
+    db,
+    chunks: AsyncIterator[bytes],
+    file_name: str,
+    metadata: dict
+) -> Tuple[ObjectId, int, str]:
+    """Write an incoming byte stream to GridFS, hashing as it goes; returns (file_id, size, sha256)"""
+    grid_in = get_bucket(db).open_upload_stream(file_name, metadata=metadata)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            size += len(chunk)
+            if size > MAX_FILE_SIZE:
+                raise AttachmentTooLarge(f"Attachments are limited to {MAX_FILE_SIZE} bytes")
+            digest.update(chunk)
+            await grid_in.write(chunk)
+    except BaseException:
+        # Drops any chunks already written
+        await grid_in.abort()
+        raise
+    await grid_in.close()
+    return grid_in._id, size, digest.hexdigest()
+
+async def reuse_blob(db, digest: str) -> bool:
+    """Take another reference on an existing blob; False when it does not exist"""
+    result = await db.attachment_blobs.update_one(
+        {"_id": digest},
+        {"$inc": {"ref_count": 1}, "$unset": {"released_at": ""}}
+    )
+    return result.modified_count == 1
+
+async def uploaded_before(db, digest: str, user_id: ObjectId) -> bool:
+    """Whether this user has already shared a file with this digest.
+
+    Only then may the body be skipped; otherwise knowing a hash would be enough
+    to obtain someone else's document.
+    """
+    return await db.attachment_refs.find_one(
+        {"uploaded_by": user_id, "digest": digest}, {"_id": 1}
+    ) is not None
+
+async def spool_stream(chunks: AsyncIterator[bytes]) -> Tuple[tempfile.SpooledTemporaryFile, int, str]:
+    """Buffer an incoming byte stream locally, hashing as it goes; returns (spool, size, sha256)"""
+    spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MEMORY)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            size += len(chunk)
+            if size > MAX_FILE_SIZE:
+                raise AttachmentTooLarge(f"Attachments are limited to {MAX_FILE_SIZE} bytes")
+            digest.update(chunk)
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool, size, digest.hexdigest()
+
+async def read_spool(spool) -> AsyncIterator[bytes]:
+    while True:
+        chunk = spool.read(GRIDFS_CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+async def store_blob(
+    db,
+    chunks: AsyncIterator[bytes],
+    file_name: str,
+    content_type: str,
+    expected_digest: Optional[str] = None
+) -> Tuple[str, int, bool]:
+    """Add a file to the blob store; returns (digest, size, deduplicated).
+
+    Content that is already stored only gains a reference; GridFS is written
+    only for new content.
+    """
+    spool, size, digest = await spool_stream(chunks)
+    bucket = get_bucket(db)
+    file_id = None
+    stored = False
+    try:
+        if expected_digest and digest != expected_digest:
+            raise DigestMismatch(f"Content hashes to {digest}, not {expected_digest}")
+
+        for _ in range(STORE_BLOB_ATTEMPTS):
+            if await reuse_blob(db, digest):
+                return digest, size, True
+
+            if file_id is None:
+                file_id, _, _ = await save_stream(
+                    db, read_spool(spool), file_name, metadata={"kind": "blob", "content_type": content_type}
+                )
+            try:
+                await db.attachment_blobs.insert_one({
+                    "_id": digest,
+                    "file_id": file_id,
+                    "length": size,
+                    "content_type": content_type,
+                    "ref_count": 1,
+                    "created_at": datetime.utcnow()
+                })
+                stored = True
+                return digest, size, False
+            except DuplicateKeyError:
+                # A concurrent upload of the same content won; reference its copy,
+                # or register ours if that blob is collected before we get to it
+                continue
+
+        raise RuntimeError(f"Could not store blob {digest}, please retry")
+    finally:
+        spool.close()
+        if file_id is not None and not stored:
+            await bucket.delete(file_id)
+
+async def create_reference(
+    db,
+    digest: str,
+    request_id: ObjectId,
+    uploaded_by: ObjectId,
+    file_name: str,
+    content_type: str
+) -> ObjectId:
+    """Record one share of a blob in a conversation"""
+    result = await db.attachment_refs.insert_one({
+        "digest": digest,
+        "request_id": request_id,
+        "uploaded_by": uploaded_by,
+        "file_name": file_name,
+        "content_type": content_type,
+        "created_at": datetime.utcnow()
+    })
+    return result.inserted_id
+
+async def release_reference(db, attachment_id: ObjectId):
+    """Drop a share; the blob is collected once nothing references it"""
+    ref = await db.attachment_refs.find_one_and_delete({"_id": attachment_id})
+    if ref:
+        await db.attachment_blobs.update_one(
+            {"_id": ref["digest"]},
+            {"$inc": {"ref_count": -1}, "$set": {"released_at": datetime.utcnow()}}
+        )
+
+async def resolve_attachment(db, attachment_id: ObjectId) -> Optional[Dict]:
+    """Where an attachment's bytes live and which conversation may read them"""
+    ref = await db.attachment_refs.find_one({"_id": attachment_id})
+    if ref:
+        blob = await db.attachment_blobs.find_one({"_id": ref["digest"]})
+        if not blob:
+            return None
+        return {
+            "request_id": ref["request_id"],
+            "file_id": blob["file_id"],
+            "length": blob["length"],
+            "file_name": ref["file_name"],
+            "content_type": ref.get("content_type") or blob.get("content_type"),
+            # Content addressed, so the digest is a strong validator
+            "etag": f'"{ref["digest"]}"'
+        }
+
+    # Attachments uploaded before content addressing point straight at a GridFS file
+    file_doc = await db[f"{ATTACHMENT_BUCKET}.files"].find_one({"_id": attachment_id})
+    if not file_doc or "request_id" not in (file_doc.get("metadata") or {}):
+        return None
+    metadata = file_doc["metadata"]
+    return {
+        "request_id": metadata["request_id"],
+        "file_id": file_doc["_id"],
+        "length": file_doc["length"],
+        "file_name": file_doc["filename"],
+        "content_type": metadata.get("content_type"),
+        "etag": f'"{file_doc["_id"]}"'
+    }
+
+async def collect_garbage(
+    db,
+    batch_size: int = BLOB_GC_BATCH_SIZE,
+    grace_minutes: int = BLOB_GC_GRACE_MINUTES
+) -> Dict[str, int]:
+    """Delete blobs nobody references, batch_size at a time.
+
+    A grace period protects blobs that were just released and may be re-shared,
+    and GridFS files left behind by interrupted uploads are removed as well.
+    """
+    cutoff = datetime.utcnow() - timedelta(minutes=grace_minutes)
+    bucket = get_bucket(db)
+    stats = {"blobs": 0, "bytes": 0, "orphans": 0}
+
+    while True:
+        candidates = await db.attachment_blobs.find(
+            {"ref_count": {"$lte": 0}, "released_at": {"$lt": cutoff}},
+            {"_id": 1}
+        ).limit(batch_size).to_list(length=batch_size)
+        if not candidates:
+            break
+
+        for candidate in candidates:
+            # Re-check the count atomically so a concurrent re-share wins
+            blob = await db.attachment_blobs.find_one_and_delete(
+                {"_id": candidate["_id"], "ref_count": {"$lte": 0}}
+            )
+            if not blob:
+                continue
+            await bucket.delete(blob["file_id"])
+            stats["blobs"] += 1
+            stats["bytes"] += blob["length"]
+
+        if len(candidates) < batch_size:
+            break
+
+    # Blob files whose upload never reached attachment_blobs
+    known = set()
+    async for blob in db.attachment_blobs.find({}, {"file_id": 1}):
+        known.add(blob["file_id"])
+    async for file_doc in db[f"{ATTACHMENT_BUCKET}.files"].find(
+        {"metadata.kind": "blob", "uploadDate": {"$lt": cutoff}}, {"_id": 1}
+    ):
+        if file_doc["_id"] not in known:
+            await bucket.delete(file_doc["_id"])
+            stats["orphans"] += 1
+
+    return stats
+
+def parse_range(header: Optional[str], length: int) -> Optional[Tuple[int, int]]:
+    """Resolve a single-range Range header to inclusive (start, end) offsets"""
+    if not header:
+        return None
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        # Multi-range and other units are not supported; serve the full body
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        raise RangeNotSatisfiable(header)
+    if not first:
+        # Suffix range: the last N bytes
+        suffix = int(last)
+        if suffix == 0:
+            raise RangeNotSatisfiable(header)
+        return max(0, length - suffix), length - 1
+
+    start = int(first)
+    end = int(last) if last else length - 1
+    if start >= length or end < start:
+        raise RangeNotSatisfiable(header)
+    return start, min(end, length - 1)
+
+def content_disposition(file_name: str) -> str:
+    """Content-Disposition for a download: an ASCII fallback name plus the exact name (RFC 5987)"""
+    ascii_name = unicodedata.normalize("NFKD", file_name).encode("ascii", "ignore").decode()
+    stem, dot, extension = UNSAFE_FILENAME_CHARS.sub("_", ascii_name).strip().rpartition(".")
+    if not dot:
+        stem, extension = extension, ""
+    fallback = (stem if stem.strip("_ .") else "attachment") + dot + extension
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(file_name, safe='')}"
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+async def stream_range(db, file_id: ObjectId, start: int, end: int) -> AsyncIterator[bytes]:
+    """Yield bytes start..end (inclusive) of a stored file"""
+    grid_out = await get_bucket(db).open_download_stream(file_id)
+    grid_out.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        chunk = await grid_out.read(min(DOWNLOAD_READ_SIZE, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield chunk
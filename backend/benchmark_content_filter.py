@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark the message / request content filter.
+
+Reports the cost per message and per KB of text for typical chat lines and for
+long request descriptions, with the rule set from content_filter_rules.json and
+with a large synthetic term list.
+"""
+import random
+import string
+import time
+
+from content_filter import (
+    AhoCorasick, ContentFilter, ACTION_FLAG, ACTION_REJECT, compile_matcher, content_filter
+)
+
+WORDS = (
+    "contract agreement lease tenant landlord court hearing custody divorce "
+    "employment termination settlement deposit invoice payment review clause "
+    "liability damages property estate will trust visa appeal filing notice "
+    "meeting tomorrow please thanks regarding question documents attached"
+).split()
+
+def make_text(rng: random.Random, length: int) -> str:
+    words = []
+    size = 0
+    while size < length:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)[:length]
+
+def run(filter_instance: ContentFilter, texts, label: str):
+    total_bytes = sum(len(text.encode("utf-8")) for text in texts)
+
+    # Warm up
+    for text in texts[:100]:
+        filter_instance.check(text)
+
+    start = time.perf_counter()
+    for text in texts:
+        filter_instance.check(text)
+    elapsed = time.perf_counter() - start
+
+    per_message = elapsed / len(texts) * 1e6
+    per_kb = elapsed / (total_bytes / 1024) * 1e6
+    print(f"   {label:<34} {per_message:8.1f} µs/message   {per_kb:8.1f} µs/KB")
+
+def main():
+    rng = random.Random(42)
+    chat = [make_text(rng, rng.randint(40, 300)) for _ in range(5000)]
+    descriptions = [make_text(rng, 2000) for _ in range(1000)]
+
+    print("🧪 Content filter benchmark")
+    print("=" * 50)
+    print(f"   Matcher: {type(content_filter.state['matcher']).__name__}")
+
+    print("\n📋 Shipped rule set")
+    run(content_filter, chat, "chat messages (40-300 chars)")
+    run(content_filter, descriptions, "request descriptions (2 KB)")
+
+    # Large term list: the automaton scan cost should barely move
+    big_terms = {}
+    for index in range(20000):
+        term = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 12)))
+        big_terms[term] = ACTION_REJECT if index % 10 == 0 else ACTION_FLAG
+
+    large = ContentFilter(rules_path=content_filter.rules_path)
+    large.reload_if_changed = lambda: None
+
+    print("\n📋 20,000 synthetic terms")
+    large.state = dict(large.state, matcher=compile_matcher(big_terms))
+    run(large, chat, "chat messages (40-300 chars)")
+    run(large, descriptions, "request descriptions (2 KB)")
+
+    if not isinstance(large.state["matcher"], AhoCorasick):
+        print("\n📋 20,000 synthetic terms, pure Python automaton")
+        large.state = dict(large.state, matcher=AhoCorasick(big_terms))
+        run(large, chat, "chat messages (40-300 chars)")
+        run(large, descriptions, "request descriptions (2 KB)")
+
+if __name__ == "__main__":
+    main()
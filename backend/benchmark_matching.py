@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark the case -> lawyer matching engine.
+
+Loads 100,000 synthetic lawyer profiles into the directory snapshot and
+reports the latency of recommendations for random cases, next to scoring the
+same profiles one by one in Python, and checks both pick the same lawyers.
+"""
+import random
+import time
+
+from bson import ObjectId
+
+from lawyer_matching import (
+    BUDGET_STRETCH, BUSY_AVAILABILITY, EXPERIENCE_TARGET_YEARS, GENERAL_PRACTICE, MATCH_WEIGHTS, NO_RATE_BUDGET,
+    CaseCriteria, MatchingEngine
+)
+from lawyer_snapshot import DirectorySnapshot
+
+LAWYERS = 100_000
+CASES = 200
+LIMIT = 10
+
+SPECIALIZATIONS = [
+    "Family Law", "Property Law", "Corporate Law", "Criminal Law", "Tax Law", "IPR Law",
+    "Consumer Protection Law", "Labour and Employment Law", "Contract and Agreement Law", GENERAL_PRACTICE,
+]
+URGENCY = list(EXPERIENCE_TARGET_YEARS)
+AVAILABILITY = ["available"] * 6 + ["busy"] * 3 + ["unavailable"]
+
+def make_profiles(rng: random.Random, count: int):
+    profiles = []
+    for _ in range(count):
+        profiles.append({
+            "_id": ObjectId(),
+            "user_id": ObjectId(),
+            "specializations": rng.sample(SPECIALIZATIONS, rng.randint(1, 3)),
+            "languages": ["English"],
+            "availability_status": rng.choice(AVAILABILITY),
+            "years_experience": rng.randint(0, 35),
+            "hourly_rate": None if rng.random() < 0.1 else float(rng.randrange(500, 10000, 100)),
+            "rating": round(rng.random() * 5, 1),
+            "rank_score": round(rng.random() * 100, 3),
+        })
+    return profiles
+
+def make_case(rng: random.Random) -> CaseCriteria:
+    return CaseCriteria(
+        category=rng.choice(SPECIALIZATIONS[:-1]),
+        urgency_level=rng.choice(URGENCY),
+        budget_max=None if rng.random() < 0.2 else float(rng.randrange(1000, 8000, 500)),
+    )
+
+def python_scores(profiles, case: CaseCriteria):
+    """Same scoring, one profile at a time"""
+    scored = []
+    target = EXPERIENCE_TARGET_YEARS[case.urgency_level]
+    for profile in profiles:
+        rate = profile["hourly_rate"]
+        if profile["availability_status"] == "unavailable":
+            continue
+        if case.budget_max is not None and rate is not None and rate > case.budget_max * BUDGET_STRETCH:
+            continue
+        specialization = 100.0 if case.category in profile["specializations"] else (
+            50.0 if GENERAL_PRACTICE in profile["specializations"] else 0.0)
+        experience = 100.0 * min(profile["years_experience"] / target, 1.0)
+        if case.budget_max is None:
+            budget = 100.0
+        elif rate is None:
+            budget = NO_RATE_BUDGET
+        else:
+            over = (rate - case.budget_max) / max(case.budget_max * (BUDGET_STRETCH - 1), 1e-9)
+            budget = 100.0 * min(max(1.0 - over, 0.0), 1.0)
+        availability = 100.0 if profile["availability_status"] == "available" else BUSY_AVAILABILITY
+        score = (MATCH_WEIGHTS["specialization"] * specialization + MATCH_WEIGHTS["experience"] * experience
+                 + MATCH_WEIGHTS["budget"] * budget + MATCH_WEIGHTS["availability"] * availability
+                 + MATCH_WEIGHTS["rank"] * profile["rank_score"])
+        scored.append((score, profile["rank_score"], str(profile["user_id"])))
+    scored.sort(reverse=True)
+    return scored[:LIMIT]
+
+def main():
+    rng = random.Random(7)
+    profiles = make_profiles(rng, LAWYERS)
+    cases = [make_case(rng) for _ in range(CASES)]
+
+    print("🧪 Lawyer matching benchmark")
+    print("=" * 50)
+
+    start = time.perf_counter()
+    snapshot = DirectorySnapshot()
+    snapshot.load(profiles)
+    engine = MatchingEngine(snapshot)
+    print(f"   Loaded {len(snapshot):,} lawyers in {time.perf_counter() - start:.2f} s")
+
+    for case in cases[:10]:
+        engine.recommend(case, LIMIT)  # Warm up
+
+    start = time.perf_counter()
+    results = [engine.recommend(case, LIMIT) for case in cases]
+    per_case = (time.perf_counter() - start) / len(cases) * 1e3
+    print(f"\n📋 Vectorized engine      {per_case:8.3f} ms/case   (top {LIMIT} of {LAWYERS:,})")
+
+    start = time.perf_counter()
+    expected = [python_scores(profiles, case) for case in cases[:10]]
+    per_case = (time.perf_counter() - start) / 10 * 1e3
+    print(f"📋 Python loop            {per_case:8.3f} ms/case")
+
+    agree = sum(
+        [round(score, 1) for score, _, _ in want] == [match["match_score"] for match in got]
+        for want, got in zip(expected, results)
+    )
+    print(f"\n   Same top-{LIMIT} scores for {agree}/{len(expected)} cases")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Benchmark the typo-tolerant lawyer name search.
+
+Builds the trigram index over 100,000 synthetic lawyers and reports the build
+time, the cost of exact and fuzzy queries (one and two words, with typos) and
+of an incremental update, next to a linear edit-distance scan of every name
+for comparison.
+"""
+import random
+import string
+import time
+
+import lawyer_fuzzy
+from lawyer_fuzzy import TrigramIndex, banded_distance, max_edits, normalize
+
+LAWYERS = 100_000
+
+FIRST_NAMES = (
+    "aarav priya rohan sneha amit anita sanjay smita rahul pooja vikram kavya arjun meera "
+    "john jane michael sarah david emily james olivia robert sophia daniel maria carlos elena"
+).split()
+SYLLABLES = "ra ri ro ru ka ki ko de di do ma mi mo na ni no sa si so ta ti to la li lo ve vi gu gi".split()
+FIRM_WORDS = "associates partners legal chambers law group counsel advocates llp".split()
+
+def make_surname(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) + rng.choice(["", "s", "ez", "son"])
+
+def make_typo(rng: random.Random, word: str) -> str:
+    position = rng.randrange(len(word))
+    edit = rng.choice(("replace", "delete", "insert"))
+    letter = rng.choice(string.ascii_lowercase)
+    if edit == "replace":
+        return word[:position] + letter + word[position + 1:]
+    if edit == "delete" and len(word) > 4:
+        return word[:position] + word[position + 1:]
+    return word[:position] + letter + word[position:]
+
+def make_lawyers(rng: random.Random, count: int):
+    surnames = [make_surname(rng) for _ in range(count // 5)]
+    lawyers = []
+    for index in range(count):
+        lawyers.append({
+            "id": str(index),
+            "first_name": rng.choice(FIRST_NAMES).title(),
+            "last_name": rng.choice(surnames).title(),
+            "law_firm": f"{rng.choice(surnames).title()} {rng.choice(FIRM_WORDS).title()}",
+            "rating": round(rng.random() * 5, 1),
+        })
+    return lawyers
+
+def timed(label: str, queries, search):
+    for query in queries[:20]:
+        search(query)  # Warm up
+
+    start = time.perf_counter()
+    matched = sum(1 for query in queries if search(query))
+    elapsed = time.perf_counter() - start
+    per_query = elapsed / len(queries) * 1e3
+    print(f"   {label:<36} {per_query:8.3f} ms/query   {matched}/{len(queries)} found")
+
+def linear_scan(lawyers):
+    """Edit distance against every indexed word of every lawyer (no index)"""
+    words = [
+        (lawyer["id"], set(normalize(f"{lawyer['first_name']} {lawyer['last_name']} {lawyer['law_firm']}").split()))
+        for lawyer in lawyers
+    ]
+
+    def search(query: str):
+        tokens = normalize(query).split()
+        return [
+            lawyer_id for lawyer_id, lawyer_words in words
+            if all(
+                any(lawyer_fuzzy.bounded_distance(token, word, max_edits(token)) is not None for word in lawyer_words)
+                for token in tokens
+            )
+        ]
+    return search
+
+def main():
+    rng = random.Random(42)
+    lawyers = make_lawyers(rng, LAWYERS)
+
+    print("🧪 Lawyer name search benchmark")
+    print("=" * 50)
+    print(f"   Edit distance: {lawyer_fuzzy.bounded_distance.__name__}")
+
+    start = time.perf_counter()
+    index = TrigramIndex()
+    index.load(lawyers)
+    print(f"   Built index over {len(index):,} lawyers in {time.perf_counter() - start:.2f} s")
+
+    sample = rng.sample(lawyers, 500)
+    surnames = [lawyer["last_name"] for lawyer in sample]
+    typos = [make_typo(rng, surname.lower()) for surname in surnames]
+    full_names = [f"{lawyer['first_name']} {lawyer['last_name']}" for lawyer in sample]
+    full_typos = [f"{make_typo(rng, lawyer['first_name'].lower())} {make_typo(rng, lawyer['last_name'].lower())}"
+                  for lawyer in sample]
+
+    print("\n📋 Trigram index")
+    timed("surname, exact", surnames, lambda query: index.search(query))
+    timed("surname, exact (fuzzy mode)", surnames, lambda query: index.search(query, fuzzy=True))
+    timed("surname with a typo (fuzzy)", typos, lambda query: index.search(query, fuzzy=True))
+    timed("full name, exact", full_names, lambda query: index.search(query))
+    timed("full name, typo in each word (fuzzy)", full_typos, lambda query: index.search(query, fuzzy=True))
+
+    start = time.perf_counter()
+    for lawyer in sample:
+        index.add(dict(lawyer, last_name=make_surname(rng).title()))
+    print(f"   {'incremental update':<36} {(time.perf_counter() - start) / len(sample) * 1e6:8.1f} µs/lawyer")
+
+    if lawyer_fuzzy.bounded_distance is not banded_distance:
+        print("\n📋 Trigram index, pure Python edit distance")
+        lawyer_fuzzy.bounded_distance = banded_distance
+        timed("surname with a typo (fuzzy)", typos, lambda query: index.search(query, fuzzy=True))
+        timed("full name, typo in each word (fuzzy)", full_typos, lambda query: index.search(query, fuzzy=True))
+
+    print("\n📋 Linear scan, no index")
+    timed("surname with a typo", typos[:5], linear_scan(lawyers))
+
+if __name__ == "__main__":
+    main()
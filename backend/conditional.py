@@ -0,0 +1,191 @@
+"""
+Conditional GET support for J.A.I (ETag / Last-Modified, 304 Not Modified)
+
+Read-heavy endpoints derive a weak ETag from a cheap version key (latest
+updated_at, document counts, in-memory state) and call check_not_modified
+before building their body, so an unchanged response costs a couple of
+index lookups instead of the full serialization.
+
+ConditionalGetMiddleware completes the picture for every JSON GET under /api:
+it answers 304 for responses whose handler set an ETag, and gives responses
+without one a strong ETag hashed from the body (saving the transfer, though
+not the work). Hashed responses to authenticated requests are marked private
+so shared caches never store them.
+"""
+
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional, Tuple
+import hashlib
+
+from fastapi import Request, Response
+from starlette.datastructures import Headers, MutableHeaders
+
+# Bodies larger than this are passed through without a hashed ETag
+ETAG_HASH_MAX_BYTES = 1024 * 1024
+
+# Headers a 304 keeps from the full response
+NOT_MODIFIED_DROP = {"content-length", "content-type", "content-encoding", "transfer-encoding"}
+
+def make_etag(*parts, weak: bool = True) -> str:
+    """ETag for a version key; weak unless it identifies the exact bytes"""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"' if weak else f'"{digest}"'
+
+def body_etag(body: bytes) -> str:
+    return f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+
+def _opaque(etag: str) -> str:
+    return etag[2:] if etag.startswith("W/") else etag
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison, as If-None-Match requires"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (candidate.strip() for candidate in if_none_match.split(","))
+    return any(_opaque(candidate) == _opaque(etag) for candidate in candidates)
+
+def http_date(moment: datetime) -> str:
+    """HTTP date for a naive UTC datetime"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return format_datetime(moment.replace(microsecond=0), usegmt=True)
+
+def modified_since(if_modified_since: Optional[str], last_modified: datetime) -> bool:
+    if not if_modified_since:
+        return True
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return True
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return last_modified.replace(microsecond=0) > since
+
+def validator_headers(etag: str, last_modified: Optional[datetime] = None, private: bool = True) -> dict:
+    headers = {
+        "ETag": etag,
+        # Cache, but revalidate every time
+        "Cache-Control": "private, no-cache" if private else "public, no-cache",
+    }
+    if private:
+        headers["Vary"] = "Authorization"
+    if last_modified:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+def check_not_modified(
+    request: Request,
+    response: Response,
+    etag: str,
+    last_modified: Optional[datetime] = None,
+    private: bool = True
+) -> Optional[Response]:
+    """A 304 response when the client's copy is current, else None.
+
+    Either way the validators are set on response, so the full body the
+    endpoint goes on to build carries them too. If-Modified-Since is only
+    consulted when the client sent no If-None-Match.
+    """
+    headers = validator_headers(etag, last_modified, private)
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        fresh = etag_matches(if_none_match, etag)
+    elif last_modified is not None:
+        fresh = not modified_since(request.headers.get("if-modified-since"), last_modified)
+    else:
+        fresh = False
+    if fresh:
+        return Response(status_code=304, headers=headers)
+    return None
+
+async def collection_version(collection, query: dict, field: str = "updated_at") -> Tuple[int, Optional[datetime]]:
+    """(matching documents, latest value of field): changes on insert, update and delete"""
+    count = await collection.count_documents(query)
+    latest = await collection.find(query, {field: 1}).sort(field, -1).limit(1).to_list(length=1)
+    return count, latest[0].get(field) if latest else None
+
+class ConditionalGetMiddleware:
+    """Answers If-None-Match with 304 for successful JSON GET responses"""
+
+    def __init__(self, app, prefixes: Iterable[str] = ("/api/",), max_hash_bytes: int = ETAG_HASH_MAX_BYTES):
+        self.app = app
+        self.prefixes = tuple(prefixes)
+        self.max_hash_bytes = max_hash_bytes
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in ("GET", "HEAD")
+            or not scope["path"].startswith(self.prefixes)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        if_none_match = request_headers.get("if-none-match")
+        authenticated = "authorization" in request_headers
+        state = {"mode": None, "start": None, "chunks": [], "size": 0}
+
+        async def send_not_modified(start):
+            headers = [
+                (name, value) for name, value in start["headers"]
+                if name.decode().lower() not in NOT_MODIFIED_DROP
+            ]
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+
+        async def conditional_send(message):
+            mode = state["mode"]
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                if message["status"] != 200:
+                    state["mode"] = "pass"
+                elif "etag" in headers:
+                    if etag_matches(if_none_match, headers["etag"]):
+                        state["mode"] = "drop"
+                        await send_not_modified(message)
+                        return
+                    state["mode"] = "pass"
+                elif headers.get("content-type", "").startswith("application/json"):
+                    state["mode"] = "buffer"
+                    state["start"] = message
+                    return
+                else:
+                    state["mode"] = "pass"
+                await send(message)
+                return
+
+            if mode == "drop":
+                return
+            if mode != "buffer":
+                await send(message)
+                return
+
+            state["chunks"].append(message.get("body", b""))
+            state["size"] += len(state["chunks"][-1])
+            more = message.get("more_body", False)
+            if more and state["size"] <= self.max_hash_bytes:
+                return
+
+            start = state["start"]
+            body = b"".join(state["chunks"])
+            state["mode"] = "pass"
+            if not more:
+                etag = body_etag(body)
+                headers = MutableHeaders(raw=start["headers"])
+                headers["etag"] = etag
+                if authenticated and "cache-control" not in headers:
+                    headers.update(validator_headers(etag))
+                if etag_matches(if_none_match, etag):
+                    state["mode"] = "drop"
+                    await send_not_modified(start)
+                    return
+            await send(start)
+            await send({"type": "http.response.body", "body": body, "more_body": more})
+
+        await self.app(scope, receive, conditional_send)
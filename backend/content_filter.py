@@ -0,0 +1,278 @@
+"""
+Abuse and spam filtering for free-text fields
+
+Message content and request descriptions are checked before they are stored.
+Terms from the rule file are compiled into a single Aho-Corasick automaton, so
+a text is scanned once regardless of how many terms there are, and URL / phone
+number heuristics catch the usual "contact me off-platform" spam.
+
+Every check returns allow, flag (stored, but marked for review) or reject.
+The rule file (CONTENT_FILTER_RULES) is re-read when it changes on disk, so the
+rule set can be updated without restarting the API.
+"""
+
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+import json
+import os
+import re
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import ahocorasick  # pyahocorasick: optional C implementation of the same automaton
+except ImportError:
+    ahocorasick = None
+
+# Filter configuration
+CONTENT_FILTER_RULES = os.getenv(
+    "CONTENT_FILTER_RULES",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "content_filter_rules.json")
+)
+CONTENT_FILTER_RELOAD_SECONDS = float(os.getenv("CONTENT_FILTER_RELOAD_SECONDS", "5"))
+
+ACTION_ALLOW = "allow"
+ACTION_FLAG = "flag"
+ACTION_REJECT = "reject"
+SEVERITY = {ACTION_ALLOW: 0, ACTION_FLAG: 1, ACTION_REJECT: 2}
+
+URL_PATTERN = re.compile(r"(?:https?://|www\.)\S+", re.IGNORECASE)
+# Bare domains, anchored on the literal dot so the regex engine can skip ahead quickly
+DOMAIN_PATTERN = re.compile(
+    r"\.(?<=[a-z0-9-]\.)(?:com|net|org|io|info|biz|xyz|ru|top|link|click)\b",
+    re.IGNORECASE
+)
+# Digit runs that could be a phone number; count_phones decides which ones are
+PHONE_PATTERN = re.compile(r"(?<![\w/])\+?\(?\d[\d\s().-]{6,}\d(?![\w/])")
+DATE_PATTERN = re.compile(r"\b(?:\d{4}-\d{1,2}-\d{1,2}|\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4})\b")
+DIGIT_GROUPS = re.compile(r"\d+")
+PHONE_MIN_DIGITS = 10
+PHONE_MAX_DIGITS = 15
+
+@dataclass
+class FilterResult:
+    action: str = ACTION_ALLOW
+    reasons: List[str] = field(default_factory=list)
+
+    @property
+    def allowed(self) -> bool:
+        return self.action != ACTION_REJECT
+
+    def escalate(self, action: str, reason: str):
+        self.reasons.append(reason)
+        if SEVERITY[action] > SEVERITY[self.action]:
+            self.action = action
+
+    def as_moderation(self) -> Optional[Dict]:
+        """Value stored on flagged documents"""
+        if self.action == ACTION_ALLOW:
+            return None
+        return {"action": self.action, "reasons": self.reasons}
+
+class AhoCorasick:
+    """Multi-pattern matcher: finds every occurrence of every term in one pass"""
+
+    def __init__(self, terms: Dict[str, str]):
+        # terms: lower-cased term -> action
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[str]] = [[]]
+        self.actions = dict(terms)
+
+        for term in terms:
+            state = 0
+            for char in term:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                state = next_state
+            self.output[state].append(term)
+
+        # Breadth-first pass to wire failure links
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+        # Precompute the deterministic transitions so scanning never walks failure
+        # links. Transitions that land on the root or one of its children are left
+        # out: those are exactly root.get(char, 0), which keeps the table small.
+        depth = [0] * len(self.goto)
+        self.delta: List[Dict[str, int]] = [{} for _ in self.goto]
+        queue = deque(self.goto[0].values())
+        for state in queue:
+            depth[state] = 1
+        while queue:
+            state = queue.popleft()
+            row = dict(self.delta[self.fail[state]]) if state else {}
+            for char, next_state in self.goto[state].items():
+                depth[next_state] = depth[state] + 1
+                row[char] = next_state
+                queue.append(next_state)
+            self.delta[state] = {char: target for char, target in row.items() if depth[target] > 1}
+
+    def find(self, text: str) -> Iterator[Tuple[int, str]]:
+        """Yield (start, term) for every match in already lower-cased text"""
+        delta, root, output = self.delta, self.goto[0], self.output
+        state = 0
+        for index, char in enumerate(text):
+            state = delta[state].get(char) or root.get(char, 0)
+            if output[state]:
+                for term in output[state]:
+                    yield index - len(term) + 1, term
+
+class NativeAhoCorasick:
+    """Same interface as AhoCorasick, backed by pyahocorasick"""
+
+    def __init__(self, terms: Dict[str, str]):
+        self.actions = dict(terms)
+        self.automaton = ahocorasick.Automaton()
+        for term in terms:
+            self.automaton.add_word(term, term)
+        self.automaton.make_automaton()
+
+    def find(self, text: str) -> Iterator[Tuple[int, str]]:
+        for end, term in self.automaton.iter(text):
+            yield end - len(term) + 1, term
+
+def compile_matcher(terms: Dict[str, str]):
+    """Use the C automaton when it is installed, the pure Python one otherwise"""
+    if ahocorasick is not None and terms:
+        return NativeAhoCorasick(terms)
+    return AhoCorasick(terms)
+
+def count_urls(text: str) -> int:
+    """Links with a scheme or www. plus bare domains outside of those links"""
+    lowered = text.lower()
+    if "http" in lowered or "www." in lowered:
+        links = len(URL_PATTERN.findall(text))
+        text = URL_PATTERN.sub(" ", text)
+    else:
+        links = 0
+    return links + len(DOMAIN_PATTERN.findall(text))
+
+def is_phone(run: str) -> bool:
+    """10-15 digits written as "+country ...", as one unbroken run, or in groups of 2-5"""
+    groups = DIGIT_GROUPS.findall(run)
+    if not PHONE_MIN_DIGITS <= sum(len(group) for group in groups) <= PHONE_MAX_DIGITS:
+        return False
+    return run.startswith("+") or len(groups) == 1 or all(2 <= len(group) <= 5 for group in groups)
+
+def count_phones(text: str) -> int:
+    """Phone numbers, not counting dates, case numbers or other digit runs"""
+    count = 0
+    for run in PHONE_PATTERN.findall(text):
+        if DATE_PATTERN.search(run):
+            # "2024-01-15 9876543210": drop the dates and look at what is left
+            count += sum(is_phone(part) for part in PHONE_PATTERN.findall(DATE_PATTERN.sub(" ", run)))
+        else:
+            count += is_phone(run)
+    return count
+
+class ContentFilter:
+    """Compiled rule set with hot reload from a JSON file"""
+
+    def __init__(self, rules_path: str = CONTENT_FILTER_RULES):
+        self.rules_path = rules_path
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._load(self._read_rules())
+
+    def _read_rules(self) -> dict:
+        try:
+            with open(self.rules_path, "r", encoding="utf-8") as rules_file:
+                rules = json.load(rules_file)
+            self._mtime = os.path.getmtime(self.rules_path)
+            return rules
+        except FileNotFoundError:
+            logger.warning(f"Content filter rules not found at {self.rules_path}; allowing everything")
+            return {}
+
+    def _load(self, rules: dict):
+        terms = {}
+        for action in (ACTION_FLAG, ACTION_REJECT):
+            for term in rules.get("terms", {}).get(action, []):
+                term = term.strip().lower()
+                # The stricter action wins when a term is listed twice
+                if term and SEVERITY[action] > SEVERITY[terms.get(term, ACTION_ALLOW)]:
+                    terms[term] = action
+
+        # Swap the whole compiled state at once so concurrent checks see one version
+        self.state = {
+            "matcher": compile_matcher(terms),
+            "urls": rules.get("urls", {}),
+            "phones": rules.get("phones", {}),
+            "max_length_flag": rules.get("max_length_flag")
+        }
+        logger.info(f"Content filter loaded {len(terms)} terms")
+
+    def reload_if_changed(self):
+        """Pick up edits to the rule file (checked at most every few seconds)"""
+        now = time.monotonic()
+        if now - self._checked_at < CONTENT_FILTER_RELOAD_SECONDS:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.path.getmtime(self.rules_path)
+        except OSError:
+            return
+        if mtime != self._mtime:
+            try:
+                self._load(self._read_rules())
+            except (ValueError, KeyError) as e:
+                # Keep serving the previous rule set if the new file is broken
+                logger.error(f"Invalid content filter rules, keeping previous set: {e}")
+
+    def check(self, text: str) -> FilterResult:
+        self.reload_if_changed()
+        state = self.state
+        result = FilterResult()
+        if not text:
+            return result
+
+        lowered = text.lower()
+        seen = set()
+        for start, term in state["matcher"].find(lowered):
+            if term in seen:
+                continue
+            # Whole words only, so "class" does not match "ass"
+            end = start + len(term)
+            if (start > 0 and lowered[start - 1].isalnum()) or (end < len(lowered) and lowered[end].isalnum()):
+                continue
+            seen.add(term)
+            result.escalate(state["matcher"].actions[term], f"term:{term}")
+
+        self._check_count(result, "urls", count_urls(text), state["urls"])
+        self._check_count(result, "phones", count_phones(text), state["phones"])
+
+        if state["max_length_flag"] and len(text) > state["max_length_flag"]:
+            result.escalate(ACTION_FLAG, "length")
+        return result
+
+    @staticmethod
+    def _check_count(result: FilterResult, name: str, count: int, limits: dict):
+        if not count:
+            return
+        if limits.get("reject_over") is not None and count > limits["reject_over"]:
+            result.escalate(ACTION_REJECT, f"{name}:{count}")
+        elif limits.get("flag_over") is not None and count > limits["flag_over"]:
+            result.escalate(ACTION_FLAG, f"{name}:{count}")
+
+content_filter = ContentFilter()
+
+def check_text(*parts: Optional[str]) -> FilterResult:
+    """Run the filter over one or more text fields as a single document"""
+    return content_filter.check("\n".join(part for part in parts if part))
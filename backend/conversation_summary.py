@@ -0,0 +1,259 @@
+"""
+Extractive conversation summaries for J.A.I
+
+A background worker keeps a short summary for every active conversation in the
+conversation_summaries collection, so opening a thread does not mean re-reading
+(or re-fetching) its whole history to recall context.
+
+Sentences are ranked by TF-IDF similarity to the conversation as a whole (the
+centroid of all its sentences) and the best few are returned in the order they
+were written, skipping near-duplicates. Everything is computed locally.
+
+Summaries are incremental: the document keeps term / document frequencies for
+the conversation and a bounded pool of candidate sentences, so a refresh only
+reads the messages that arrived since the last run.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+import asyncio
+import math
+import os
+import re
+import logging
+
+import message_store
+
+logger = logging.getLogger(__name__)
+
+# Summary configuration
+SUMMARY_ENABLED = os.getenv("SUMMARY_ENABLED", "true").lower() == "true"
+SUMMARY_INTERVAL_SECONDS = int(os.getenv("SUMMARY_INTERVAL_SECONDS", "60"))
+SUMMARY_SENTENCES = int(os.getenv("SUMMARY_SENTENCES", "3"))
+SUMMARY_CANDIDATES = int(os.getenv("SUMMARY_CANDIDATES", "40"))
+SUMMARY_MAX_TERMS = int(os.getenv("SUMMARY_MAX_TERMS", "3000"))
+
+SUMMARIZED_TYPES = ("text", "file")
+MIN_SENTENCE_WORDS = 4
+MAX_SENTENCE_CHARS = 300
+# Sentences this similar to one already picked are treated as repeats
+REDUNDANCY_THRESHOLD = 0.7
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+TOKEN_PATTERN = re.compile(r"[a-z][a-z0-9]+")
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before
+being below between both but by can could did do does doing down during each few for
+from further had has have having he her here hers him his how i if in into is it its
+just me more most my no nor not now of off on once only or other our ours out over own
+please same she should so some such than thank thanks that the their theirs them then
+there these they this those through to too under until up very was we were what when
+where which while who whom why will with would you your yours hi hello ok okay yes
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+def split_sentences(text: str) -> List[str]:
+    """Sentences worth ranking, trimmed to a readable length"""
+    sentences = []
+    for sentence in SENTENCE_SPLIT.split(text or ""):
+        sentence = sentence.strip()
+        if len(sentence.split()) < MIN_SENTENCE_WORDS:
+            continue
+        if len(sentence) > MAX_SENTENCE_CHARS:
+            sentence = sentence[:MAX_SENTENCE_CHARS].rsplit(" ", 1)[0] + "…"
+        sentences.append(sentence)
+    return sentences
+
+def term_frequencies(tokens: List[str]) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for token in tokens:
+        counts[token] = counts.get(token, 0) + 1
+    return counts
+
+def empty_summary(request_id: ObjectId) -> Dict:
+    return {
+        "_id": request_id,
+        "message_count": 0,
+        "sentence_count": 0,
+        "doc_freq": {},
+        "term_counts": {},
+        "candidates": [],
+        "sentences": []
+    }
+
+class SummaryModel:
+    """TF-IDF statistics of one conversation"""
+
+    def __init__(self, summary_doc: Dict):
+        self.sentence_count = summary_doc["sentence_count"]
+        self.doc_freq = summary_doc["doc_freq"]
+        self.term_counts = summary_doc["term_counts"]
+
+    def add(self, terms: Dict[str, int]):
+        self.sentence_count += 1
+        for term, count in terms.items():
+            self.doc_freq[term] = self.doc_freq.get(term, 0) + 1
+            self.term_counts[term] = self.term_counts.get(term, 0) + count
+
+    def prune(self, max_terms: int = SUMMARY_MAX_TERMS):
+        """Keep the vocabulary bounded; rare terms barely move the centroid"""
+        if len(self.term_counts) <= max_terms:
+            return
+        kept = sorted(self.term_counts, key=self.term_counts.get, reverse=True)[:max_terms]
+        self.term_counts = {term: self.term_counts[term] for term in kept}
+        self.doc_freq = {term: self.doc_freq[term] for term in kept}
+
+    def idf(self, term: str) -> float:
+        return math.log((1 + self.sentence_count) / (1 + self.doc_freq.get(term, 0))) + 1
+
+    def vector(self, terms: Dict[str, int]) -> Dict[str, float]:
+        return {term: count * self.idf(term) for term, count in terms.items()}
+
+    def centroid(self) -> Dict[str, float]:
+        return self.vector(self.term_counts)
+
+def cosine(left: Dict[str, float], right: Dict[str, float]) -> float:
+    if len(left) > len(right):
+        left, right = right, left
+    dot = sum(weight * right.get(term, 0.0) for term, weight in left.items())
+    if not dot:
+        return 0.0
+    norm = math.sqrt(sum(w * w for w in left.values())) * math.sqrt(sum(w * w for w in right.values()))
+    return dot / norm
+
+def rank_candidates(model: SummaryModel, candidates: List[Dict]) -> List[Tuple[float, Dict]]:
+    """Score every candidate against the conversation centroid, best first"""
+    centroid = model.centroid()
+    scored = [(cosine(model.vector(candidate["terms"]), centroid), candidate) for candidate in candidates]
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return scored
+
+def select_sentences(model: SummaryModel, ranked: List[Tuple[float, Dict]], count: int) -> List[Dict]:
+    """Top sentences without near-duplicates, in conversation order"""
+    picked = []
+    for score, candidate in ranked:
+        vector = model.vector(candidate["terms"])
+        if any(cosine(vector, model.vector(other["terms"])) > REDUNDANCY_THRESHOLD for other in picked):
+            continue
+        picked.append(candidate)
+        if len(picked) == count:
+            break
+    picked.sort(key=lambda candidate: (candidate["created_at"], candidate["index"]))
+    return [
+        {
+            "text": candidate["text"],
+            "message_id": candidate["message_id"],
+            "sender_type": candidate["sender_type"],
+            "created_at": candidate["created_at"]
+        }
+        for candidate in picked
+    ]
+
+async def create_summary_indexes(db):
+    """Lets the worker find conversations touched since its last pass"""
+    await db.lawyer_requests.create_index([("status", 1), ("updated_at", 1)])
+
+async def refresh_summary(db, request_id: ObjectId) -> int:
+    """Fold new messages into a conversation's summary; returns how many were read"""
+    summary_doc = await db.conversation_summaries.find_one({"_id": request_id}) or empty_summary(request_id)
+
+    # Only the messages added since the previous run
+    messages = await message_store.read_messages(db, request_id, offset=summary_doc["message_count"])
+    if not messages:
+        return 0
+
+    model = SummaryModel(summary_doc)
+    candidates = summary_doc["candidates"]
+    for message in messages:
+        # Screened and system messages do not describe the matter
+        if message.get("message_type", "text") not in SUMMARIZED_TYPES or message.get("moderation"):
+            continue
+        for index, sentence in enumerate(split_sentences(message.get("content"))):
+            terms = term_frequencies(tokenize(sentence))
+            if not terms:
+                continue
+            model.add(terms)
+            candidates.append({
+                "text": sentence,
+                "terms": terms,
+                "message_id": str(message["_id"]),
+                "sender_type": message.get("sender_type"),
+                "created_at": message["created_at"],
+                "index": index
+            })
+    model.prune()
+
+    # Rescore with the updated statistics and keep only the best candidates
+    ranked = rank_candidates(model, candidates)
+    candidates = [candidate for _, candidate in ranked[:SUMMARY_CANDIDATES]]
+
+    await db.conversation_summaries.replace_one(
+        {"_id": request_id},
+        {
+            "_id": request_id,
+            "message_count": summary_doc["message_count"] + len(messages),
+            "sentence_count": model.sentence_count,
+            "doc_freq": model.doc_freq,
+            "term_counts": model.term_counts,
+            "candidates": candidates,
+            "sentences": select_sentences(model, ranked, SUMMARY_SENTENCES),
+            "updated_at": datetime.utcnow()
+        },
+        upsert=True
+    )
+    return len(messages)
+
+async def refresh_changed_summaries(db, since: Optional[datetime] = None) -> Dict[str, int]:
+    """Refresh every accepted conversation updated after since (all of them when None)"""
+    query = {"status": "accepted", "messages_archived": {"$ne": True}}
+    if since is not None:
+        query["updated_at"] = {"$gt": since}
+
+    stats = {"conversations": 0, "messages": 0}
+    async for request in db.lawyer_requests.find(query, {"_id": 1}):
+        try:
+            read = await refresh_summary(db, request["_id"])
+        except Exception as e:
+            logger.error(f"Could not summarize conversation {request['_id']}: {e}")
+            continue
+        if read:
+            stats["conversations"] += 1
+            stats["messages"] += read
+    return stats
+
+async def get_summary(db, request_id: ObjectId) -> Optional[Dict]:
+    """Stored summary for a conversation, without the ranking state"""
+    summary_doc = await db.conversation_summaries.find_one(
+        {"_id": request_id},
+        {"sentences": 1, "message_count": 1, "updated_at": 1}
+    )
+    if not summary_doc:
+        return None
+    return {
+        "sentences": summary_doc.get("sentences", []),
+        "message_count": summary_doc.get("message_count", 0),
+        "updated_at": summary_doc.get("updated_at")
+    }
+
+async def run_summary_worker(get_db, interval: int = SUMMARY_INTERVAL_SECONDS):
+    """Refresh summaries of conversations with new messages until cancelled"""
+    since = None
+    while True:
+        db = get_db()
+        if db is not None:
+            started = datetime.utcnow()
+            try:
+                stats = await refresh_changed_summaries(db, since)
+                if stats["conversations"]:
+                    logger.info(
+                        f"Summarized {stats['messages']} new messages in {stats['conversations']} conversations"
+                    )
+                # Overlap one interval so updated_at writes that landed late are not missed;
+                # refreshing an unchanged conversation reads nothing
+                since = started - timedelta(seconds=interval)
+            except Exception as e:
+                logger.error(f"Summary worker pass failed: {e}")
+        await asyncio.sleep(interval)
@@ -6,6 +6,13 @@ import logging
 
 load_dotenv()
 
+import message_store
+import message_archive
+import attachments
+import conversation_summary
+import lawyer_directory
+import lawyer_reviews
+
 # MongoDB connection
 client: AsyncIOMotorClient = None
 database = None
@@ -58,6 +65,18 @@ async def create_indexes():
         await database.lawyers.create_index("specializations")
         await database.lawyers.create_index("bar_number", unique=True)
         await database.lawyers.create_index("rating")
+        # Directory search: filter on specializations / availability, sort, then _id for keyset paging
+        await database.lawyers.create_index([("specializations", 1), ("rating", -1), ("_id", -1)])
+        await database.lawyers.create_index([("specializations", 1), ("years_experience", -1), ("_id", -1)])
+        await database.lawyers.create_index([("specializations", 1), ("hourly_rate", 1), ("_id", 1)])
+        await database.lawyers.create_index([("availability_status", 1), ("rating", -1), ("_id", -1)])
+        await database.lawyers.create_index([("specializations", 1), ("rank_score", -1), ("_id", -1)])
+        await database.lawyers.create_index([("rank_score", -1), ("_id", -1)])
+        await database.lawyers.create_index([("rating", -1), ("_id", -1)])
+        await database.lawyers.create_index([("years_experience", -1), ("_id", -1)])
+        await database.lawyers.create_index([("hourly_rate", 1), ("_id", 1)])
+        # Proximity search (geo is a GeoJSON point from the offline gazetteer)
+        await database.lawyers.create_index([("geo", "2dsphere")])
         
         # Cases collection indexes
         await database.cases.create_index("client_id")
@@ -71,6 +90,10 @@ async def create_indexes():
         await database.lawyer_requests.create_index("lawyer_id")
         await database.lawyer_requests.create_index("status")
         await database.lawyer_requests.create_index("created_at")
+        await database.lawyer_requests.create_index([("client_id", 1), ("updated_at", 1)])
+        await database.lawyer_requests.create_index([("lawyer_id", 1), ("updated_at", 1)])
+        await database.lawyer_requests.create_index([("lawyer_id", 1), ("created_at", 1)])
+        await database.lawyer_requests.create_index("moderation.action", sparse=True)
         
         # Messages collection indexes
         await database.messages.create_index("request_id")
@@ -78,6 +101,28 @@ async def create_indexes():
         await database.messages.create_index("created_at")
         await database.messages.create_index([("request_id", 1), ("created_at", 1)])
         await database.messages.create_index([("request_id", 1), ("is_read", 1)])
+        await database.messages.create_index([("request_id", 1), ("updated_at", 1)])
+        await database.messages.create_index([("content", "text")])
+        await database.messages.create_index("moderation.action", sparse=True)
+        
+        # Message buckets (only used when MESSAGE_STORAGE_MODE=buckets)
+        if message_store.is_bucketed():
+            await message_store.create_bucket_indexes(database)
+        
+        # Archived conversations
+        await message_archive.create_archive_indexes(database)
+        
+        # Message attachments (GridFS)
+        await attachments.create_attachment_indexes(database)
+        
+        # Background conversation summaries
+        await conversation_summary.create_summary_indexes(database)
+        
+        # Public lawyer directory read model
+        await lawyer_directory.create_directory_indexes(database)
+        
+        # Client reviews (one per accepted request)
+        await lawyer_reviews.create_review_indexes(database)
         
         # AI matches collection indexes
         await database.ai_matches.create_index("case_id")
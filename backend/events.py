@@ -0,0 +1,160 @@
+"""
+Real-time event bus for J.A.I
+
+Events are published to topics ("conversation:<id>", "user:<id>") and delivered
+to in-process subscribers through bounded queues; the SSE live channel is one
+such subscriber. When REDIS_URL is set and the redis package is installed,
+events are also relayed through one Redis pub/sub channel so that every API
+worker sees them. Without Redis the bus is process local.
+
+Nothing here touches MongoDB.
+"""
+
+from typing import Callable, Dict, List, Optional, Set
+import asyncio
+import json
+import os
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # cross-worker delivery is optional
+    aioredis = None
+
+# Event bus configuration
+REDIS_URL = os.getenv("REDIS_URL")
+EVENTS_CHANNEL = os.getenv("EVENTS_CHANNEL", "jai:events")
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "100"))
+
+class Subscription:
+    """Queue of events for a set of topics; use as a context manager"""
+
+    def __init__(self, bus: "EventBus", topics: List[str], max_size: int = EVENT_QUEUE_SIZE):
+        self.bus = bus
+        self.topics = topics
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+
+    def put(self, topic: str, event: dict):
+        if self.queue.full():
+            # A slow consumer loses its oldest events rather than stalling publishers
+            self.queue.get_nowait()
+        self.queue.put_nowait((topic, event))
+
+    async def get(self, timeout: Optional[float] = None):
+        """Next (topic, event), or None when timeout passes first"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class EventBus:
+    """Topic based pub/sub with an optional Redis relay between workers"""
+
+    def __init__(self, redis_url: Optional[str] = REDIS_URL, channel: str = EVENTS_CHANNEL):
+        self.redis_url = redis_url
+        self.channel = channel
+        self.worker_id = uuid.uuid4().hex
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self._handlers: Dict[str, List[Callable[[dict], None]]] = {}
+        self._redis = None
+        self._listener: Optional[asyncio.Task] = None
+
+    @property
+    def distributed(self) -> bool:
+        return self._redis is not None
+
+    def subscribe(self, *topics: str) -> Subscription:
+        subscription = Subscription(self, list(topics))
+        for topic in topics:
+            self._subscriptions.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for topic in subscription.topics:
+            subscribers = self._subscriptions.get(topic)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscriptions[topic]
+
+    def on(self, topic: str, handler: Callable[[dict], None]):
+        """Call handler for every event on topic, local or relayed (for internal state replicas)"""
+        self._handlers.setdefault(topic, []).append(handler)
+
+    def deliver(self, topic: str, event: dict):
+        """Hand an event to this worker's handlers and subscribers"""
+        for handler in self._handlers.get(topic, []):
+            try:
+                handler(event)
+            except Exception as e:
+                logger.error(f"Event handler for {topic} failed: {e}")
+        for subscription in list(self._subscriptions.get(topic, ())):
+            subscription.put(topic, event)
+
+    async def publish(self, topic: str, event: dict, relay: bool = True, local: bool = True):
+        """Deliver locally and, when Redis is configured, to the other workers"""
+        if local:
+            self.deliver(topic, event)
+        if relay and self._redis is not None:
+            payload = json.dumps({"origin": self.worker_id, "topic": topic, "event": event}, default=str)
+            try:
+                await self._redis.publish(self.channel, payload)
+            except Exception as e:
+                logger.error(f"Could not relay event on {topic}: {e}")
+
+    async def start(self):
+        """Connect the Redis relay if configured"""
+        if not self.redis_url:
+            return
+        if aioredis is None:
+            logger.warning("REDIS_URL is set but the redis package is not installed; events stay in this worker")
+            return
+        try:
+            self._redis = aioredis.from_url(self.redis_url, decode_responses=True)
+            pubsub = self._redis.pubsub()
+            await pubsub.subscribe(self.channel)
+            self._listener = asyncio.create_task(self._listen(pubsub))
+            logger.info(f"Event bus relaying through Redis channel {self.channel}")
+        except Exception as e:
+            logger.warning(f"Redis unavailable ({e}); events stay in this worker")
+            self._redis = None
+
+    async def _listen(self, pubsub):
+        async for message in pubsub.listen():
+            if message.get("type") != "message":
+                continue
+            try:
+                payload = json.loads(message["data"])
+            except ValueError:
+                continue
+            if payload.get("origin") == self.worker_id:
+                continue
+            self.deliver(payload["topic"], payload["event"])
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+def conversation_topic(request_id) -> str:
+    return f"conversation:{request_id}"
+
+def user_topic(user_id) -> str:
+    return f"user:{user_id}"
+
+event_bus = EventBus()
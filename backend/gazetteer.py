@@ -0,0 +1,166 @@
+"""
+Offline place-name geocoding for J.A.I
+
+Free-text locations ("Mumbai, Maharashtra", "Chicago, IL") are resolved
+against a small gazetteer file of cities and regions, loaded once at startup;
+no geocoding service is called. A place that is not in the file resolves to
+its region when the region is named, and otherwise to nothing.
+
+Region codes are not unique across countries ("TN" is Tamil Nadu and
+Tennessee), so a code only picks a region on its own when it is unambiguous
+or a country is named ("..., GA, USA"); otherwise it just disambiguates the
+city in front of it.
+
+Coordinates are returned as GeoJSON points ([longitude, latitude]), the form
+stored on lawyer profiles for the 2dsphere index.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+import csv
+import os
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+GAZETTEER_FILE = os.getenv(
+    "GAZETTEER_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "gazetteer.csv")
+)
+
+EARTH_RADIUS_KM = 6378.1
+COORDINATES_PATTERN = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$")
+
+# Country names accepted after a place; "IN" is left out as it is also Indiana
+COUNTRY_NAMES = {
+    "india": "IN",
+    "us": "US",
+    "usa": "US",
+    "united states": "US",
+    "united states of america": "US",
+}
+
+@dataclass
+class Place:
+    name: str
+    region: str
+    region_code: str
+    country: str
+    kind: str        # "city" or "region"
+    lat: float
+    lon: float
+    aliases: List[str] = field(default_factory=list)
+
+def normalize(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+class Gazetteer:
+    """Name lookups over the gazetteer file"""
+
+    def __init__(self, places: List[Place]):
+        self.places = places
+        self._cities: Dict[str, List[Place]] = {}
+        self._regions: Dict[str, List[Place]] = {}  # name, alias or code -> every region using it
+        for place in places:
+            if place.kind == "region":
+                for key in {normalize(key) for key in [place.name, place.region_code] + place.aliases}:
+                    self._regions.setdefault(key, []).append(place)
+            else:
+                for key in [place.name] + place.aliases:
+                    self._cities.setdefault(normalize(key), []).append(place)
+
+    @classmethod
+    def load(cls, path: str = GAZETTEER_FILE) -> "Gazetteer":
+        places = []
+        with open(path, newline="", encoding="utf-8") as handle:
+            for row in csv.DictReader(handle):
+                place = Place(
+                    name=row["name"],
+                    region=row["region"],
+                    region_code=row["region_code"],
+                    country=row["country"],
+                    kind=row["kind"],
+                    lat=float(row["lat"]),
+                    lon=float(row["lon"]),
+                    aliases=[alias for alias in row["aliases"].split("|") if alias]
+                )
+                places.append(place)
+        logger.info(f"Loaded {len(places)} places from {path}")
+        return cls(places)
+
+    def resolve(self, text: Optional[str]) -> Optional[Place]:
+        """Best match for "City", "City, Region" or "Region", optionally followed by a country
+
+        A known city wins over the region named after it (the first listed city
+        wins ties); an ambiguous region code alone resolves to nothing.
+        """
+        if not text:
+            return None
+        parts = [normalize(part) for part in text.split(",") if normalize(part)]
+        if not parts:
+            return None
+
+        countries = {COUNTRY_NAMES[part] for part in parts[1:] if part in COUNTRY_NAMES}
+        regions = [region for part in parts[1:] for region in self._regions.get(part, [])]
+        candidates = self._cities.get(parts[0], [])
+        for place in candidates:
+            if any(place.region == region.region and place.country == region.country for region in regions):
+                return place
+        for place in candidates:
+            if place.country in countries:
+                return place
+        if candidates:
+            # A known city beats a region that does not contain it ("Mumbai, IN" is not Indiana)
+            return candidates[0]
+
+        # Unknown city: fall back to the region it names, if that is unambiguous
+        for part in reversed(parts):
+            matches = [
+                region for region in self._regions.get(part, [])
+                if not countries or region.country in countries
+            ]
+            if len(matches) == 1:
+                return matches[0]
+        return None
+
+_gazetteer: Optional[Gazetteer] = None
+
+def get_gazetteer() -> Gazetteer:
+    global _gazetteer
+    if _gazetteer is None:
+        _gazetteer = Gazetteer.load()
+    return _gazetteer
+
+def coordinates(text: Optional[str]) -> Optional[Tuple[float, float]]:
+    """(longitude, latitude) for a place name or a "lat,lon" pair"""
+    if not text:
+        return None
+    match = COORDINATES_PATTERN.match(text)
+    if match:
+        lat, lon = float(match.group(1)), float(match.group(2))
+        if -90 <= lat <= 90 and -180 <= lon <= 180:
+            return lon, lat
+        return None
+    place = get_gazetteer().resolve(text)
+    return (place.lon, place.lat) if place else None
+
+def profile_point(location: Optional[str], bar_state: Optional[str] = None) -> Optional[Dict]:
+    """GeoJSON point for a lawyer profile: its location, else its bar state"""
+    for text in (location, bar_state):
+        point = coordinates(text)
+        if point:
+            return {"type": "Point", "coordinates": list(point)}
+    return None
+
+async def geocode_profiles(db) -> int:
+    """Set geo on profiles that have none yet (startup backfill); returns how many changed"""
+    updated = 0
+    async for profile in db.lawyers.find(
+        {"geo": {"$exists": False}}, {"location": 1, "bar_state": 1}
+    ):
+        point = profile_point(profile.get("location"), profile.get("bar_state"))
+        if point:
+            await db.lawyers.update_one({"_id": profile["_id"]}, {"$set": {"geo": point}})
+            updated += 1
+    return updated
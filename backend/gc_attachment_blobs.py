@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Remove attachment blobs that no message references any more.
+
+    python gc_attachment_blobs.py
+    python gc_attachment_blobs.py --batch-size 500 --grace-minutes 10
+"""
+import asyncio
+import argparse
+from motor.motor_asyncio import AsyncIOMotorClient
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import attachments
+
+async def gc_attachment_blobs(batch_size: int, grace_minutes: int):
+    """Collect unreferenced blobs in batches"""
+
+    print("🧹 Collecting unreferenced attachment blobs...")
+
+    # Connect to MongoDB
+    mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+    database_name = os.getenv("DATABASE_NAME", "jai_database")
+
+    client = AsyncIOMotorClient(mongodb_url)
+    db = client[database_name]
+
+    try:
+        stats = await attachments.collect_garbage(db, batch_size, grace_minutes)
+
+        print(f"\n🎉 Removed {stats['blobs']} blobs ({stats['bytes']:,} bytes)")
+        print(f"   Orphaned upload files removed: {stats['orphans']}")
+
+        # Show summary
+        blobs = await db.attachment_blobs.count_documents({})
+        refs = await db.attachment_refs.count_documents({})
+        print("\n📊 Attachment Summary:")
+        print(f"   Unique blobs: {blobs}")
+        print(f"   References:   {refs}")
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Garbage-collect attachment blobs")
+    parser.add_argument("--batch-size", type=int, default=attachments.BLOB_GC_BATCH_SIZE)
+    parser.add_argument("--grace-minutes", type=int, default=attachments.BLOB_GC_GRACE_MINUTES)
+    args = parser.parse_args()
+    asyncio.run(gc_attachment_blobs(args.batch_size, args.grace_minutes))
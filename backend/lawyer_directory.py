@@ -0,0 +1,259 @@
+"""
+Lawyer directory read model for J.A.I
+
+The public directory needs a handful of fields from two collections (the
+account in users, the profile in lawyers). Instead of joining them on every
+read, the lawyer_directory collection holds one ready-to-serve document per
+lawyer, keyed by the lawyer's user id, so listing the directory is a single
+indexed scan.
+
+Entries are refreshed incrementally whenever a signup or a profile /
+availability change is written (refresh_lawyer), and the whole collection is
+rebuilt periodically with an aggregation that $merges into it, which repairs
+anything an incremental refresh missed and drops lawyers that no longer exist.
+
+Every change is announced on the event bus (DIRECTORY_TOPIC), relayed to the
+other workers, so caches built on top of the directory can register with
+on_directory_change and invalidate instead of polling. In-memory indexes over
+the directory subclass DirectoryIndex, which follows those events for them.
+"""
+
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from bson import ObjectId
+import asyncio
+import os
+import logging
+
+from events import event_bus
+
+logger = logging.getLogger(__name__)
+
+# Directory configuration
+DIRECTORY_COLLECTION = "lawyer_directory"
+DIRECTORY_REBUILD_SECONDS = int(os.getenv("DIRECTORY_REBUILD_SECONDS", "900"))
+
+# Event carrying {"user_ids": [...]} for changed entries, or {"rebuilt": true}
+DIRECTORY_TOPIC = "directory:changed"
+
+# Profile fields copied into the directory, with the default for missing ones
+PROFILE_FIELDS = {
+    "specializations": [],
+    "languages": [],
+    "rating": 0.0,
+    "rank_score": 0.0,
+    "total_reviews": 0,
+    "years_experience": 0,
+    "hourly_rate": None,
+    "law_firm": "",
+    "bio": "",
+    "bar_state": "",
+    "location": "",
+    "availability_status": "available",
+}
+USER_FIELDS = ("first_name", "last_name", "email")
+
+def directory_entry(user: dict, profile: dict) -> dict:
+    """Directory document for a lawyer account and its profile"""
+    entry = {"_id": user["_id"]}
+    for field in USER_FIELDS:
+        entry[field] = user.get(field, "")
+    for field, default in PROFILE_FIELDS.items():
+        value = profile.get(field)
+        entry[field] = default if value is None else value
+    entry["refreshed_at"] = datetime.utcnow()
+    return entry
+
+def to_public(entry: dict) -> dict:
+    """Directory document in the shape served by /api/public/lawyers"""
+    lawyer = {"id": str(entry["_id"])}
+    for field in USER_FIELDS:
+        lawyer[field] = entry.get(field, "")
+    for field, default in PROFILE_FIELDS.items():
+        lawyer[field] = entry.get(field, default)
+    return lawyer
+
+def rebuild_pipeline(started: datetime) -> List[dict]:
+    """Aggregation over lawyers that rewrites every directory entry.
+
+    It starts from the (small) lawyers collection and looks up each account by
+    _id, rather than joining every user document into lawyers.
+    """
+    project = {"_id": "$user._id", "refreshed_at": {"$literal": started}}
+    for field in USER_FIELDS:
+        project[field] = {"$ifNull": [f"$user.{field}", ""]}
+    for field, default in PROFILE_FIELDS.items():
+        project[field] = {"$ifNull": [f"${field}", {"$literal": default}]}
+
+    return [
+        {"$lookup": {
+            "from": "users",
+            "localField": "user_id",
+            "foreignField": "_id",
+            "as": "user"
+        }},
+        {"$unwind": "$user"},
+        {"$match": {"user.user_type": "lawyer"}},
+        {"$project": project},
+        {"$merge": {
+            "into": DIRECTORY_COLLECTION,
+            "on": "_id",
+            "whenMatched": "replace",
+            "whenNotMatched": "insert"
+        }}
+    ]
+
+async def create_directory_indexes(db):
+    collection = db[DIRECTORY_COLLECTION]
+    await collection.create_index([("rank_score", -1), ("_id", -1)])
+    await collection.create_index([("rating", -1), ("_id", -1)])
+    await collection.create_index([("specializations", 1), ("rating", -1)])
+    await collection.create_index("refreshed_at")
+
+def on_directory_change(handler: Callable[[dict], None]):
+    """Call handler whenever directory entries change, on this or another worker"""
+    event_bus.on(DIRECTORY_TOPIC, handler)
+
+async def notify_changed(user_ids: Optional[List] = None, rebuilt: bool = False):
+    event = {"user_ids": [str(user_id) for user_id in user_ids or []]}
+    if rebuilt:
+        event["rebuilt"] = True
+    await event_bus.publish(DIRECTORY_TOPIC, event)
+
+async def refresh_lawyer(db, user_id) -> Optional[dict]:
+    """Rewrite (or remove) one lawyer's directory entry after a signup or profile change"""
+    user_id = ObjectId(user_id)
+    collection = db[DIRECTORY_COLLECTION]
+
+    user = await db.users.find_one({"_id": user_id}, {field: 1 for field in USER_FIELDS + ("user_type",)})
+    profile = await db.lawyers.find_one({"user_id": user_id})
+    if not user or user.get("user_type") != "lawyer" or not profile:
+        await collection.delete_one({"_id": user_id})
+        await notify_changed([user_id])
+        return None
+
+    entry = directory_entry(user, profile)
+    await collection.replace_one({"_id": user_id}, entry, upsert=True)
+    await notify_changed([user_id])
+    return entry
+
+async def rebuild_directory(db) -> int:
+    """Rebuild every entry with $merge and drop entries whose lawyer is gone"""
+    started = datetime.utcnow()
+    async for _ in db.lawyers.aggregate(rebuild_pipeline(started)):
+        pass
+    # Entries refreshed incrementally during the rebuild carry a later timestamp
+    removed = await db[DIRECTORY_COLLECTION].delete_many({"refreshed_at": {"$lt": started}})
+    await notify_changed(rebuilt=True)
+    return removed.deleted_count
+
+async def list_directory(db, query: Optional[Dict] = None) -> List[dict]:
+    """Directory entries, top ranked first (see lawyer_rank), in the public shape"""
+    cursor = db[DIRECTORY_COLLECTION].find(query or {}).sort([("rank_score", -1), ("_id", -1)])
+    return [to_public(entry) async for entry in cursor]
+
+async def run_directory_worker(get_db, interval: int = DIRECTORY_REBUILD_SECONDS):
+    """Rebuild the directory every interval seconds until cancelled"""
+    while True:
+        await asyncio.sleep(interval)
+        db = get_db()
+        if db is None:
+            continue
+        try:
+            removed = await rebuild_directory(db)
+            if removed:
+                logger.info(f"Directory rebuild removed {removed} stale entries")
+        except Exception as e:
+            logger.error(f"Directory rebuild failed: {e}")
+
+class DirectoryIndex(ABC):
+    """Base for in-memory indexes over directory entries (public shape).
+
+    Subclasses implement add (which replaces an existing entry) and remove,
+    and may override load for a faster bulk build. attach keeps the index
+    current from directory change events; updating counts the ones not yet
+    applied.
+    """
+
+    updating = 0
+    # One set per rebuild in progress: lawyers refreshed since it started reading
+    _refreshed: Tuple[Set[str], ...] = ()
+
+    @abstractmethod
+    def add(self, lawyer: Dict):
+        """Index a directory entry, replacing any existing one for the lawyer"""
+
+    @abstractmethod
+    def remove(self, lawyer_id: str):
+        """Drop a lawyer from the index (a no-op when absent)"""
+
+    def load(self, lawyers: Iterable[Dict]):
+        for lawyer in lawyers:
+            self.add(lawyer)
+
+    async def rebuild(self, db):
+        """Rebuild from the directory collection, swapping the new contents in at once"""
+        async def build() -> "DirectoryIndex":
+            fresh = type(self)()
+            fresh.load(await list_directory(db))
+            return fresh
+
+        await self._swap_in(db, build)
+
+    async def _swap_in(self, db, build: Callable[[], Awaitable["DirectoryIndex"]]):
+        """Replace the contents with build()'s index.
+
+        Refreshes that land while it is being built are applied to this (old)
+        index only, so they are re-applied to the new one before the swap.
+        """
+        refreshed: Set[str] = set()
+        self._refreshed = self._refreshed + (refreshed,)
+        try:
+            fresh = await build()
+            while refreshed:
+                lawyer_ids = list(refreshed)
+                refreshed.clear()
+                await fresh.refresh(db, lawyer_ids)
+        finally:
+            self._refreshed = tuple(pending for pending in self._refreshed if pending is not refreshed)
+        self.__dict__.update(fresh.__dict__)
+
+    def _note_refresh(self, lawyer_ids: List[str]):
+        for pending in self._refreshed:
+            pending.update(lawyer_ids)
+
+    async def refresh(self, db, lawyer_ids: List[str]):
+        self._note_refresh(lawyer_ids)
+        entries = {
+            lawyer["id"]: lawyer for lawyer in await list_directory(
+                db, {"_id": {"$in": [ObjectId(lawyer_id) for lawyer_id in lawyer_ids]}}
+            )
+        }
+        for lawyer_id in lawyer_ids:
+            if lawyer_id in entries:
+                self.add(entries[lawyer_id])
+            else:
+                self.remove(lawyer_id)
+
+    def attach(self, get_db: Callable):
+        """Follow directory changes (on this and other workers)"""
+        def on_change(event: dict):
+            db = get_db()
+            if db is None:
+                return
+            if event.get("rebuilt"):
+                update = self.rebuild(db)
+            else:
+                update = self.refresh(db, event.get("user_ids", []))
+            self.updating += 1
+            asyncio.ensure_future(self._run(update))
+        on_directory_change(on_change)
+
+    async def _run(self, update):
+        try:
+            await update
+        except Exception as e:
+            logger.error(f"{type(self).__name__} update failed: {e}")
+        finally:
+            self.updating -= 1
@@ -0,0 +1,117 @@
+"""
+BM25 full-text index over lawyer profiles
+
+Names, specializations, law firm, certifications, education and bio are
+tokenized and stemmed by text_analysis.
+- Fields are weighted BM25F-style: each field's term frequency is
+  normalized by that field's average length and scaled by FIELD_WEIGHTS.
+- The weighted frequency is stored per (term, row), so a query is one
+  vectorized scatter-add per query term.
+
+Rows belong to the caller (the directory snapshot). A changed profile gets
+a new row, so postings are only ever appended; dead rows and the document
+frequencies they still count are dropped by the next full load. Term
+postings are array.array buffers, read through NumPy without copying.
+"""
+
+from array import array
+from typing import Dict, Iterable, List, Tuple
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from text_analysis import analyze
+
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "specializations": 2.5,
+    "law_firm": 2.0,
+    "certifications": 1.5,
+    "education": 1.2,
+    "bio": 1.0,
+}
+K1 = 1.2
+B = 0.75
+
+def profile_fields(profile: Dict) -> Dict[str, str]:
+    """Searchable text of a profile document (with the account's first / last name)"""
+    education = [
+        " ".join(str(entry.get(key) or "") for key in ("degree", "school", "description"))
+        for entry in profile.get("education") or [] if isinstance(entry, dict)
+    ]
+    certifications = [
+        f"{entry.get('name') or ''} {entry.get('issuer') or ''}"
+        for entry in profile.get("certifications") or [] if isinstance(entry, dict)
+    ]
+    return {
+        "name": f"{profile.get('first_name') or ''} {profile.get('last_name') or ''}",
+        "specializations": " ".join(profile.get("specializations") or []),
+        "law_firm": profile.get("law_firm") or "",
+        "certifications": " ".join(certifications),
+        "education": " ".join(education),
+        "bio": profile.get("bio") or "",
+    }
+
+class TextIndex:
+    """term -> (rows, weighted term frequencies) postings"""
+
+    def __init__(self):
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._length_totals = {field: 0 for field in FIELD_WEIGHTS}
+        self._documents = 0
+
+    def __len__(self):
+        return len(self._postings)
+
+    def _average(self, field: str) -> float:
+        return self._length_totals[field] / self._documents if self._documents else 1.0
+
+    def _analyzed(self, fields: Dict[str, str]) -> Dict[str, List[str]]:
+        terms = {field: analyze(fields.get(field, "")) for field in FIELD_WEIGHTS}
+        for field, field_terms in terms.items():
+            self._length_totals[field] += len(field_terms)
+        self._documents += 1
+        return terms
+
+    def _post(self, row: int, terms: Dict[str, List[str]]):
+        weighted: Dict[str, float] = {}
+        for field, field_terms in terms.items():
+            if not field_terms:
+                continue
+            norm = FIELD_WEIGHTS[field] / (1 - B + B * len(field_terms) / max(self._average(field), 1.0))
+            for term in field_terms:
+                weighted[term] = weighted.get(term, 0.0) + norm
+        for term, weight in weighted.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = (array("i"), array("f"))
+            postings[0].append(row)
+            postings[1].append(weight)
+
+    def add(self, row: int, fields: Dict[str, str]):
+        self._post(row, self._analyzed(fields))
+
+    def load(self, documents: Iterable[Tuple[int, Dict[str, str]]]):
+        """Bulk add, normalizing with the final average field lengths"""
+        analyzed = [(row, self._analyzed(fields)) for row, fields in documents]
+        for row, terms in analyzed:
+            self._post(row, terms)
+
+    def scores(self, query: str, size: int, documents: int) -> "np.ndarray":
+        """BM25 score of every row below size for query (0 where no term matches)"""
+        scores = np.zeros(size, dtype=np.float64)
+        for term in set(analyze(query)):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            rows = np.frombuffer(postings[0], dtype=np.intc)
+            weights = np.frombuffer(postings[1], dtype=np.float32)
+            idf = math.log(1 + (documents - len(rows) + 0.5) / (len(rows) + 0.5))
+            inside = rows < size
+            if not inside.all():
+                rows, weights = rows[inside], weights[inside]
+            scores[rows] += idf * weights / (K1 + weights)
+        return scores
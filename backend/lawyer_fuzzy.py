@@ -0,0 +1,171 @@
+"""
+Typo-tolerant name search for the lawyer directory
+
+An in-memory trigram index over the words of lawyer names and law firms.
+- Each query word is looked up exactly, or (fuzzy) matched against the
+  vocabulary: words sharing enough trigrams are candidates, and a bounded
+  edit distance decides.
+- Every query word has to match one of a lawyer's words.
+- Lawyers rank by how closely their words match, then by rating.
+
+A word within k edits of the query shares at least (trigrams - 3k) of its
+trigrams, so the trigram count prunes the vocabulary before any edit distance
+is computed. Like the typeahead index it is built from the lawyer_directory
+collection and kept current from directory change events.
+"""
+
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+import heapq
+import re
+
+import lawyer_directory
+
+try:
+    from rapidfuzz.distance import Levenshtein  # optional C edit distance
+except ImportError:
+    Levenshtein = None
+
+# Most lawyers one text search can match (best first)
+MAX_MATCHES = 500
+
+def normalize(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+def trigrams(word: str) -> Set[str]:
+    """Trigrams of the word padded with two leading blanks and one trailing"""
+    padded = f"  {word} "
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+def max_edits(word: str) -> int:
+    """Typos tolerated in a query word of this length"""
+    if len(word) <= 2:
+        return 0
+    return 1 if len(word) <= 5 else 2
+
+def banded_distance(a: str, b: str, limit: int) -> Optional[int]:
+    """Levenshtein distance between a and b, or None once it must exceed limit.
+
+    Only the cells within limit of the diagonal can stay under the bound, so
+    each row fills that band alone.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return None
+    if a == b:
+        return 0
+    over = limit + 1
+    previous = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [over] * (len(b) + 1)
+        current[0] = i if i <= limit else over
+        best = current[0]
+        char_a = a[i - 1]
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            cost = previous[j - 1] + (char_a != b[j - 1])
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            current[j] = cost if cost < over else over
+            if cost < best:
+                best = cost
+        if best > limit:
+            return None
+        previous = current
+    return previous[-1] if previous[-1] <= limit else None
+
+def native_distance(a: str, b: str, limit: int) -> Optional[int]:
+    distance = Levenshtein.distance(a, b, score_cutoff=limit)
+    return distance if distance <= limit else None
+
+# Use the C edit distance when it is installed, the pure Python one otherwise
+bounded_distance = native_distance if Levenshtein is not None else banded_distance
+
+class TrigramIndex(lawyer_directory.DirectoryIndex):
+    """Name and firm words with a trigram -> words inverted index"""
+
+    def __init__(self):
+        self._postings: Dict[str, Set[str]] = defaultdict(set)   # trigram -> words
+        self._lawyers: Dict[str, Set[str]] = {}                  # word -> lawyer ids
+        self._words: Dict[str, Set[str]] = {}                    # lawyer id -> words
+        self._ratings: Dict[str, float] = {}
+
+    def __len__(self):
+        return len(self._words)
+
+    def add(self, lawyer: Dict):
+        """Index a lawyer in the public directory shape (see lawyer_directory.to_public)"""
+        self.remove(lawyer["id"])
+        text = " ".join(lawyer.get(field) or "" for field in ("first_name", "last_name", "law_firm"))
+        words = set(normalize(text).split())
+        for word in words:
+            if word not in self._lawyers:
+                self._lawyers[word] = set()
+                for gram in trigrams(word):
+                    self._postings[gram].add(word)
+            self._lawyers[word].add(lawyer["id"])
+        self._words[lawyer["id"]] = words
+        self._ratings[lawyer["id"]] = lawyer.get("rating") or 0.0
+
+    def remove(self, lawyer_id: str):
+        self._ratings.pop(lawyer_id, None)
+        for word in self._words.pop(lawyer_id, ()):
+            lawyers = self._lawyers[word]
+            lawyers.discard(lawyer_id)
+            if lawyers:
+                continue
+            del self._lawyers[word]
+            for gram in trigrams(word):
+                self._postings[gram].discard(word)
+                if not self._postings[gram]:
+                    del self._postings[gram]
+
+    def word_matches(self, token: str, fuzzy: bool = True) -> Dict[str, float]:
+        """Indexed words matching one query word, with a similarity in (0, 1]"""
+        matches = {token: 1.0} if token in self._lawyers else {}
+        limit = max_edits(token)
+        if not fuzzy or limit == 0:
+            return matches
+
+        grams = trigrams(token)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        needed = max(len(grams) - 3 * limit, 1)
+        for word, count in shared.items():
+            if count < needed or abs(len(word) - len(token)) > limit or word in matches:
+                continue
+            distance = bounded_distance(token, word, limit)
+            if distance is not None:
+                matches[word] = 1 - distance / max(len(token), len(word))
+        return matches
+
+    def search(self, text: str, fuzzy: bool = False, limit: int = MAX_MATCHES) -> List[Tuple[str, float]]:
+        """(lawyer id, score) for lawyers matching every word of text, best first"""
+        tokens = normalize(text).split()
+        if not tokens:
+            return []
+
+        scores: Optional[Dict[str, float]] = None
+        for token in tokens:
+            token_scores: Dict[str, float] = {}
+            for word, similarity in self.word_matches(token, fuzzy).items():
+                for lawyer_id in self._lawyers[word]:
+                    if similarity > token_scores.get(lawyer_id, 0):
+                        token_scores[lawyer_id] = similarity
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {
+                    lawyer_id: score + token_scores[lawyer_id]
+                    for lawyer_id, score in scores.items() if lawyer_id in token_scores
+                }
+            if not scores:
+                return []
+
+        ranked = heapq.nlargest(
+            limit, scores.items(), key=lambda item: (item[1], self._ratings.get(item[0], 0.0))
+        )
+        return [(lawyer_id, round(score / len(tokens), 4)) for lawyer_id, score in ranked]
+
+name_index = TrigramIndex()
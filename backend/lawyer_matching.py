@@ -0,0 +1,264 @@
+"""
+Case -> lawyer matching engine for J.A.I recommendations
+
+Scores every lawyer in the in-memory profile snapshot (lawyer_snapshot)
+against a case in one vectorized pass instead of a query per candidate:
+1. Hard constraints become a row mask first: live profiles, not
+   "unavailable", an hourly rate no higher than BUDGET_STRETCH times the
+   case's budget_max (profiles without a rate pass).
+2. Only the surviving rows are scored, per component (0-100):
+   - specialization: the case category among the lawyer's specializations,
+     half marks for General Practice
+   - experience: years against a target that grows with the case's urgency
+   - budget: full inside budget_max, falling linearly to 0 at the stretch
+     limit; half marks when the lawyer has no rate
+   - availability: available, or busy at reduced weight
+   match_score is their weighted sum plus a share of the lawyer's rank_score.
+3. The best limit rows come from argpartition, and only those are sorted.
+
+The snapshot follows directory change events, so matches see profile,
+review and rank updates without a cache of their own. A case's matches are
+persisted to ai_matches only when they differ from the stored ones. Needs NumPy; without
+it (or before the snapshot has loaded) there are no recommendations.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+from bson import ObjectId
+import hashlib
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from lawyer_snapshot import DirectorySnapshot, directory_snapshot
+
+# Matching configuration
+DEFAULT_RECOMMENDATIONS = 10
+MAX_RECOMMENDATIONS = 50
+RECOMMENDED_COUNT = 3  # is_recommended for the best few
+
+MATCH_WEIGHTS = {
+    "specialization": 0.40,
+    "experience": 0.20,
+    "budget": 0.20,
+    "availability": 0.10,
+    "rank": 0.10,
+}
+GENERAL_PRACTICE = "General Practice"
+BUDGET_STRETCH = 1.5
+BUSY_AVAILABILITY = 40.0
+NO_RATE_BUDGET = 50.0
+EXPERIENCE_TARGET_YEARS = {"low": 3, "medium": 5, "high": 10, "urgent": 12}
+
+def normalize_label(value: str) -> str:
+    """Case and whitespace insensitive form of a category / specialization"""
+    return " ".join(value.split()).casefold()
+
+@dataclass
+class CaseCriteria:
+    category: str
+    urgency_level: str = "medium"
+    budget_max: Optional[float] = None
+
+    @classmethod
+    def from_case(cls, case: Dict) -> "CaseCriteria":
+        return cls(
+            category=case.get("category") or "",
+            urgency_level=case.get("urgency_level") or "medium",
+            budget_max=case.get("budget_max")
+        )
+
+class MatchingEngine:
+    """Vectorized scoring of all lawyers in a snapshot against one case"""
+
+    def __init__(self, snapshot: DirectorySnapshot):
+        self.snapshot = snapshot
+        self._features: Dict[str, "np.ndarray"] = {}
+        self._features_key = None
+
+    def ready(self) -> bool:
+        return np is not None and self.snapshot.loaded_at is not None
+
+    def features(self) -> Dict[str, "np.ndarray"]:
+        """Case-independent columns by row, recomputed only after the snapshot changed"""
+        key = (self.snapshot.loaded_at, self.snapshot.changes)
+        if key != self._features_key:
+            snapshot = self.snapshot
+            rates = snapshot.column("hourly_rate")
+            availability = snapshot.any_of("availability_status", ["available"]) * (100.0 - BUSY_AVAILABILITY)
+            availability += BUSY_AVAILABILITY
+            rank = np.nan_to_num(snapshot.column("rank_score"), nan=0.0)
+            self._features = {
+                "years": np.nan_to_num(snapshot.column("years_experience"), nan=0.0),
+                "rates": np.nan_to_num(rates, nan=0.0),
+                "no_rate": np.isnan(rates),
+                "availability": availability,
+                "rank": rank,
+                # The weighted case-independent part of match_score
+                "base": MATCH_WEIGHTS["availability"] * availability + MATCH_WEIGHTS["rank"] * rank,
+            }
+            self._features_key = key
+        return self._features
+
+    def candidates(self, criteria: CaseCriteria) -> "np.ndarray":
+        """Rows that satisfy the hard constraints"""
+        snapshot = self.snapshot
+        mask = snapshot.alive() & ~snapshot.any_of("availability_status", ["unavailable"])
+        if criteria.budget_max is not None:
+            # NaN (no rate) compares False and stays in
+            mask &= ~(snapshot.column("hourly_rate") > criteria.budget_max * BUDGET_STRETCH)
+        return np.flatnonzero(mask)
+
+    def _labelled(self, label: str) -> "np.ndarray":
+        """Row mask of lawyers with a specialization equal to label, ignoring case and spacing"""
+        label = normalize_label(label)
+        values = [value for value in self.snapshot.distinct("specializations") if normalize_label(value) == label]
+        return self.snapshot.any_of("specializations", values)
+
+    def _specialization(self, criteria: CaseCriteria, rows: "np.ndarray") -> "np.ndarray":
+        exact = self._labelled(criteria.category)[rows]
+        general = self._labelled(GENERAL_PRACTICE)[rows]
+        return exact * 50.0 + (exact | general) * 50.0
+
+    def _experience(self, criteria: CaseCriteria, rows: "np.ndarray") -> "np.ndarray":
+        target = EXPERIENCE_TARGET_YEARS.get(criteria.urgency_level, EXPERIENCE_TARGET_YEARS["medium"])
+        experience = np.minimum(self.features()["years"][rows], target)
+        experience *= 100.0 / target
+        return experience
+
+    def _budget(self, criteria: CaseCriteria, rows: "np.ndarray") -> "np.ndarray":
+        if criteria.budget_max is None:
+            return np.full(len(rows), 100.0)
+        # 100 up to budget_max, 0 at the stretch limit
+        slope = 100.0 / max(criteria.budget_max * (BUDGET_STRETCH - 1), 1e-9)
+        features = self.features()
+        budget = features["rates"][rows] * -slope
+        budget += 100.0 + criteria.budget_max * slope
+        np.clip(budget, 0.0, 100.0, out=budget)
+        no_rate = features["no_rate"][rows]
+        if no_rate.any():
+            budget[no_rate] = NO_RATE_BUDGET
+        return budget
+
+    def components(self, criteria: CaseCriteria, rows: "np.ndarray") -> Dict[str, "np.ndarray"]:
+        """Per-component scores (0-100) for rows"""
+        features = self.features()
+        return {
+            "specialization": self._specialization(criteria, rows),
+            "experience": self._experience(criteria, rows),
+            "budget": self._budget(criteria, rows),
+            "availability": features["availability"][rows],
+            "rank": features["rank"][rows],
+        }
+
+    def scores(self, criteria: CaseCriteria, rows: "np.ndarray") -> "np.ndarray":
+        """match_score for rows: the weighted components, accumulated in place"""
+        scores = self.features()["base"][rows]
+        for name, component in (
+            ("specialization", self._specialization), ("experience", self._experience), ("budget", self._budget)
+        ):
+            values = component(criteria, rows)
+            values *= MATCH_WEIGHTS[name]
+            scores += values
+        return scores
+
+    def recommend(self, criteria: CaseCriteria, limit: int = DEFAULT_RECOMMENDATIONS) -> List[Dict]:
+        """The best limit lawyers for the case, best first, with their component scores"""
+        if not self.ready():
+            return []
+        rows = self.candidates(criteria)
+        if not len(rows):
+            return []
+        scores = self.scores(criteria, rows)
+        if len(rows) > limit:
+            best = np.argpartition(scores, len(rows) - limit)[len(rows) - limit:]
+            rows, scores = rows[best], scores[best]
+
+        # Components for just the winners, for the response
+        components = self.components(criteria, rows)
+        # Best score first; ties go to the better ranked lawyer
+        order = np.lexsort((-components["rank"], -scores))
+
+        snapshot = self.snapshot
+        matches = []
+        for index in order:
+            row = rows[index]
+            rate = snapshot.column("hourly_rate")[row]
+            matches.append({
+                "lawyer_id": snapshot.user_id(row),
+                "match_score": round(float(scores[index]), 1),
+                "specialization_match": round(float(components["specialization"][index]), 1),
+                "experience_match": round(float(components["experience"][index]), 1),
+                "budget_match": round(float(components["budget"][index]), 1),
+                "availability_match": round(float(components["availability"][index]), 1),
+                "match_reasons": {
+                    "category": criteria.category,
+                    "specializations": snapshot.values(row, "specializations"),
+                    "years_experience": float(np.nan_to_num(snapshot.column("years_experience")[row], nan=0.0)),
+                    "hourly_rate": None if np.isnan(rate) else float(rate),
+                    "availability_status": (snapshot.values(row, "availability_status") or ["available"])[0],
+                    "rank_score": round(float(components["rank"][index]), 1),
+                },
+            })
+        return matches
+
+matching_engine = MatchingEngine(directory_snapshot)
+
+def match_documents(matches: List[Dict], case_id: Optional[ObjectId] = None) -> List[Dict]:
+    """ai_matches documents (AIMatchInDB shape) for recommend() results"""
+    now = datetime.utcnow()
+    return [
+        {
+            "_id": ObjectId(),
+            "case_id": case_id,
+            **match,
+            "lawyer_id": ObjectId(match["lawyer_id"]),
+            "is_recommended": position < RECOMMENDED_COUNT,
+            "created_at": now,
+        }
+        for position, match in enumerate(matches)
+    ]
+
+def matches_key(documents: List[Dict]) -> str:
+    """Fingerprint of a match list: who was matched, in which order, with which score"""
+    ranking = ",".join(f"{document['lawyer_id']}:{document['match_score']:.2f}" for document in documents)
+    return hashlib.sha1(ranking.encode()).hexdigest()
+
+async def store_matches(db, case_id: ObjectId, documents: List[Dict]) -> List[Dict]:
+    """Persist the matches of a case unless they are unchanged; returns the matches to serve.
+
+    The case document records the key of its current matches. Only a caller
+    that moves the key writes, and after writing every caller drops matches
+    with any other key, so concurrent writers converge on the last one.
+    """
+    key = matches_key(documents)
+    claimed = await db.cases.update_one(
+        {"_id": case_id, "matches_key": {"$ne": key}},
+        {"$set": {"matches_key": key}}
+    )
+    if not claimed.modified_count:
+        stored = await db.ai_matches.find({"case_id": case_id, "matches_key": key}).sort(
+            [("match_score", -1), ("_id", 1)]
+        ).to_list(length=None)
+        # Another request may still be writing them
+        return stored if len(stored) == len(documents) else documents
+
+    documents = [{**document, "matches_key": key} for document in documents]
+    if documents:
+        await db.ai_matches.insert_many(documents)
+    case = await db.cases.find_one({"_id": case_id}, {"matches_key": 1})
+    current = case.get("matches_key") if case else None
+    await db.ai_matches.delete_many({"case_id": case_id, "matches_key": {"$ne": current}})
+    return documents
+
+def to_response(document: Dict) -> Dict:
+    """ai_matches document in the AIMatchResponse shape"""
+    return {
+        **document,
+        "_id": str(document["_id"]),
+        "case_id": str(document["case_id"]) if document.get("case_id") else None,
+        "lawyer_id": str(document["lawyer_id"]),
+    }
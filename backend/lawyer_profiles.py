@@ -0,0 +1,248 @@
+"""
+Lawyer profile reads and writes for J.A.I
+
+Updates are field-level diffs: only the fields whose value actually changes
+are $set, together with a version bump, and the write is conditional on the
+version it was computed from, so two concurrent edits cannot silently undo
+each other (the loser re-reads and re-diffs). An update that changes nothing
+is not written at all.
+
+Profiles are served from an in-process cache that the writes go through:
+after a write the new document replaces the cached one. public_profiles
+serves batches of public directory entries (comparison views) the same way,
+from a second cache filled by one $in query for the misses. Everything derived
+from profiles (the directory read model, its response / facet caches and
+in-memory search indexes, matching) is invalidated through one hook,
+lawyer_directory.refresh_lawyer, whose change event also evicts this cache
+on the other workers.
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import os
+
+import lawyer_directory
+import lawyer_rank
+from gazetteer import profile_point
+from models.lawyer import LawyerProfileCreate, LawyerProfileUpdate
+
+# Profile cache configuration
+PROFILE_CACHE_MAX_ENTRIES = int(os.getenv("PROFILE_CACHE_MAX_ENTRIES", "2048"))
+
+UPDATE_ATTEMPTS = 3
+PUBLIC_BATCH_MAX_IDS = 100
+
+PUBLIC_PROJECTION = {field: 1 for field in lawyer_directory.USER_FIELDS + tuple(lawyer_directory.PROFILE_FIELDS)}
+
+# Fields an update may clear with an explicit null; for the others null means "unchanged"
+NULLABLE_FIELDS = {"law_firm", "hourly_rate", "bio", "location"}
+
+# Defaults for fields missing from older profile documents
+RESPONSE_DEFAULTS = {
+    "bar_number": "",
+    "bar_state": "",
+    "law_firm": None,
+    "years_experience": 0,
+    "hourly_rate": None,
+    "bio": None,
+    "location": None,
+    "specializations": [],
+    "education": [],
+    "certifications": [],
+    "languages": [],
+    "availability_status": "available",
+    "rating": 0.0,
+    "total_reviews": 0,
+    "total_cases": 0,
+    "success_rate": 0.0,
+    "ai_match_score": 0.0,
+    "rank_score": 0.0,
+    "version": 0,
+}
+
+class ProfileExists(ValueError):
+    """Raised when creating a profile for a lawyer (or bar number) that already has one"""
+
+class ProfileConflict(ValueError):
+    """Raised when concurrent edits keep changing the profile under an update"""
+
+class ProfileCache:
+    """user id -> profile document, least recently used evicted first"""
+
+    def __init__(self, max_entries: int = PROFILE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self.generation = 0  # bumped by every eviction
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str) -> Optional[Dict]:
+        profile = self._entries.get(user_id)
+        if profile is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(user_id)
+        return profile
+
+    def put(self, user_id: str, profile: Dict, generation: Optional[int] = None):
+        """Store profile unless a newer version is cached, or it was read before generation moved on"""
+        if generation is not None and generation != self.generation:
+            return
+        cached = self._entries.get(user_id)
+        if cached is not None and cached.get("version", 0) > profile.get("version", 0):
+            return
+        self._entries[user_id] = profile
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def evict(self, user_ids: List[str]):
+        self.generation += 1
+        for user_id in user_ids:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+
+    def on_directory_change(self, event: dict):
+        if event.get("rebuilt"):
+            self.clear()
+        else:
+            self.evict(event.get("user_ids", []))
+
+profile_cache = ProfileCache()
+lawyer_directory.on_directory_change(profile_cache.on_directory_change)
+
+# Public directory entries (lawyer_directory.to_public), keyed by lawyer user id
+public_profile_cache = ProfileCache()
+lawyer_directory.on_directory_change(public_profile_cache.on_directory_change)
+
+def to_response(profile: Dict) -> Dict:
+    """Profile document in the LawyerResponse shape"""
+    response = {}
+    for field, default in RESPONSE_DEFAULTS.items():
+        value = profile.get(field)
+        response[field] = default if value is None else value
+    created_at = profile.get("created_at") or profile["_id"].generation_time.replace(tzinfo=None)
+    response.update({
+        "_id": str(profile["_id"]),
+        "user_id": str(profile["user_id"]),
+        "created_at": created_at,
+        "updated_at": profile.get("updated_at") or created_at,
+    })
+    return response
+
+def profile_diff(profile: Dict, update: LawyerProfileUpdate) -> Dict:
+    """The fields of update whose value differs from the stored profile"""
+    changes = {}
+    for field, value in update.model_dump(exclude_unset=True, mode="json").items():
+        if value is None and field not in NULLABLE_FIELDS:
+            continue
+        if profile.get(field) != value:
+            changes[field] = value
+    return changes
+
+async def get_profile(db, user_id: str) -> Optional[Dict]:
+    """A lawyer's profile document, from the cache when present"""
+    profile = profile_cache.get(user_id)
+    if profile is None:
+        generation = profile_cache.generation
+        profile = await db.lawyers.find_one({"user_id": ObjectId(user_id)})
+        if profile is not None:
+            profile_cache.put(user_id, profile, generation)
+    return profile
+
+async def public_profiles(db, lawyer_ids: List[str]) -> List[Dict]:
+    """Public directory entries for lawyer_ids, in the same order.
+
+    Entries carry "found": true; ids that are not a listed lawyer (or not an
+    id at all) come back as {"id": ..., "found": false}. Cache misses are
+    read with one $in query.
+    """
+    found: Dict[str, Dict] = {}
+    missing = []
+    for lawyer_id in dict.fromkeys(lawyer_ids):
+        lawyer = public_profile_cache.get(lawyer_id)
+        if lawyer is not None:
+            found[lawyer_id] = lawyer
+        elif ObjectId.is_valid(lawyer_id):
+            missing.append(ObjectId(lawyer_id))
+
+    if missing:
+        generation = public_profile_cache.generation
+        async for entry in db[lawyer_directory.DIRECTORY_COLLECTION].find({"_id": {"$in": missing}}, PUBLIC_PROJECTION):
+            lawyer = lawyer_directory.to_public(entry)
+            public_profile_cache.put(lawyer["id"], lawyer, generation)
+            found[lawyer["id"]] = lawyer
+
+    return [
+        {**found[lawyer_id], "found": True} if lawyer_id in found else {"id": lawyer_id, "found": False}
+        for lawyer_id in lawyer_ids
+    ]
+
+async def _written(db, user_id: str, profile: Dict) -> Dict:
+    # The one invalidation hook for everything derived from profiles, then write through
+    await lawyer_directory.refresh_lawyer(db, user_id)
+    profile_cache.put(user_id, profile)
+    return profile
+
+async def create_profile(db, user_id: str, data: LawyerProfileCreate) -> Dict:
+    """Create the profile of a lawyer account that has none yet"""
+    now = datetime.utcnow()
+    profile = {
+        "user_id": ObjectId(user_id),
+        **data.model_dump(mode="json"),
+        "availability_status": "available",
+        "rating": 0.0,
+        "total_reviews": 0,
+        "total_cases": 0,
+        "success_rate": 0.0,
+        "ai_match_score": 0.0,
+        "version": 1,
+        "created_at": now,
+        "updated_at": now
+    }
+    geo = profile_point(profile.get("location"), profile.get("bar_state"))
+    if geo:
+        profile["geo"] = geo
+    profile.update(lawyer_rank.rank_fields(profile))
+    try:
+        result = await db.lawyers.insert_one(profile)
+    except DuplicateKeyError:
+        raise ProfileExists("A profile already exists for this lawyer or bar number")
+    profile["_id"] = result.inserted_id
+    return await _written(db, user_id, profile)
+
+async def update_profile(db, user_id: str, update: LawyerProfileUpdate) -> Tuple[Optional[Dict], List[str]]:
+    """Apply the changed fields of update; returns the profile and the names of the fields written"""
+    for _ in range(UPDATE_ATTEMPTS):
+        profile = await db.lawyers.find_one({"user_id": ObjectId(user_id)})
+        if profile is None:
+            return None, []
+        changes = profile_diff(profile, update)
+        if not changes:
+            profile_cache.put(user_id, profile)
+            return profile, []
+
+        operation: Dict = {"$set": {**changes, "updated_at": datetime.utcnow()}, "$inc": {"version": 1}}
+        if "location" in changes:
+            geo = profile_point(changes["location"], profile.get("bar_state"))
+            if geo:
+                operation["$set"]["geo"] = geo
+            elif "geo" in profile:
+                operation["$unset"] = {"geo": ""}
+
+        updated = await db.lawyers.find_one_and_update(
+            {"_id": profile["_id"], "version": profile.get("version")},
+            operation,
+            return_document=ReturnDocument.AFTER
+        )
+        if updated is not None:
+            return await _written(db, user_id, updated), sorted(changes)
+    raise ProfileConflict("The profile changed while it was being updated; try again")
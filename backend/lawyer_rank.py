@@ -0,0 +1,172 @@
+"""
+Composite ranking score for the J.A.I lawyer directory
+
+Sorting by the raw rating lets a 5.0 from a single review outrank a 4.8 from
+120. rank_score (0-100) blends three signals, each a Bayesian average that
+starts at a prior and moves towards the lawyer's own value as evidence grows:
+- rating, weighted by total_reviews
+- success_rate, weighted by total_cases
+- responsiveness: the share of recent requests answered within
+  RANK_RESPONSE_HOURS, weighted by the number of requests that are due
+
+The priors are fixed rather than taken from the whole directory, so a score
+only depends on the lawyer's own inputs. Those inputs are stored next to the
+score (rank_inputs) and a profile is only rewritten when they change.
+
+update_rank recomputes one lawyer after a write that changes an input (a
+request answered, a review). The background pass (run_rank_worker) catches
+what no write announces, mainly requests going unanswered past the deadline,
+and updates the directory entries of the lawyers whose score moved. Sorting by
+rank_score is then an indexed top-K read.
+"""
+
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+from bson import ObjectId
+from pymongo import UpdateOne
+import asyncio
+import os
+import logging
+
+import lawyer_directory
+
+logger = logging.getLogger(__name__)
+
+# Rank configuration
+RANK_REFRESH_SECONDS = int(os.getenv("RANK_REFRESH_SECONDS", "900"))
+RANK_RESPONSE_HOURS = float(os.getenv("RANK_RESPONSE_HOURS", "48"))
+RANK_RESPONSE_WINDOW_DAYS = 180
+
+# Share of the score per signal
+RANK_WEIGHTS = {"rating": 0.6, "success_rate": 0.25, "responsiveness": 0.15}
+
+# (prior value, weight in observations) per signal
+PRIOR_RATING = (3.5, 10)
+PRIOR_SUCCESS_RATE = (50.0, 10)
+PRIOR_RESPONSIVENESS = (0.5, 5)
+
+WRITE_BATCH = 500
+
+INPUT_PROJECTION = {
+    "user_id": 1, "rating": 1, "total_reviews": 1, "success_rate": 1, "total_cases": 1,
+    "rank_inputs": 1, "rank_score": 1,
+}
+
+def _number(value, default=0):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else default
+
+def smoothed(value: float, count: int, prior) -> float:
+    """Bayesian average of value observed count times, starting at prior"""
+    prior_value, prior_weight = prior
+    return (value * count + prior_value * prior_weight) / (count + prior_weight)
+
+def rank_inputs(profile: Dict, responses: Optional[Dict] = None) -> Dict:
+    """Everything rank_score depends on, from a profile and its response stats"""
+    responses = responses or {}
+    return {
+        "rating": float(_number(profile.get("rating"))),
+        "total_reviews": int(_number(profile.get("total_reviews"))),
+        "success_rate": float(_number(profile.get("success_rate"))),
+        "total_cases": int(_number(profile.get("total_cases"))),
+        "requests": int(responses.get("requests", 0)),
+        "on_time": int(responses.get("on_time", 0)),
+    }
+
+def rank_score(inputs: Dict) -> float:
+    requests = inputs["requests"]
+    signals = {
+        "rating": smoothed(inputs["rating"], inputs["total_reviews"], PRIOR_RATING) / 5,
+        "success_rate": smoothed(inputs["success_rate"], inputs["total_cases"], PRIOR_SUCCESS_RATE) / 100,
+        "responsiveness": smoothed(inputs["on_time"] / requests if requests else 0.0, requests, PRIOR_RESPONSIVENESS),
+    }
+    return round(100 * sum(RANK_WEIGHTS[signal] * value for signal, value in signals.items()), 3)
+
+def rank_fields(profile: Dict, responses: Optional[Dict] = None) -> Dict:
+    """rank_inputs and rank_score to $set on a profile (also used for new profiles)"""
+    inputs = rank_inputs(profile, responses)
+    return {"rank_inputs": inputs, "rank_score": rank_score(inputs)}
+
+def _changed(profile: Dict, fields: Dict) -> bool:
+    return any(profile.get(field) != value for field, value in fields.items())
+
+def response_pipeline(now: datetime, lawyer_ids: Optional[List[ObjectId]] = None) -> List[dict]:
+    """Per lawyer: requests that are due (answered, or older than the deadline) and those answered in time"""
+    match = {"created_at": {"$gte": now - timedelta(days=RANK_RESPONSE_WINDOW_DAYS)}}
+    if lawyer_ids is not None:
+        match["lawyer_id"] = {"$in": lawyer_ids}
+    answered = {"$ne": [{"$ifNull": ["$responded_at", None]}, None]}
+    deadline_ms = RANK_RESPONSE_HOURS * 3600 * 1000
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": "$lawyer_id",
+            "requests": {"$sum": {"$cond": [
+                {"$or": [answered, {"$lte": ["$created_at", now - timedelta(hours=RANK_RESPONSE_HOURS)]}]}, 1, 0
+            ]}},
+            "on_time": {"$sum": {"$cond": [
+                {"$and": [answered, {"$lte": [{"$subtract": ["$responded_at", "$created_at"]}, deadline_ms]}]}, 1, 0
+            ]}},
+        }}
+    ]
+
+async def response_stats(db, lawyer_ids: Optional[List[ObjectId]] = None) -> Dict[ObjectId, Dict]:
+    """Lawyer user id -> {"requests", "on_time"} over the response window"""
+    stats = {}
+    async for row in db.lawyer_requests.aggregate(response_pipeline(datetime.utcnow(), lawyer_ids)):
+        stats[row["_id"]] = row
+    return stats
+
+async def update_rank(db, user_id) -> Optional[float]:
+    """Recompute one lawyer's rank_score after one of its inputs changed"""
+    user_id = ObjectId(user_id)
+    profile = await db.lawyers.find_one({"user_id": user_id}, INPUT_PROJECTION)
+    if not profile:
+        return None
+    stats = await response_stats(db, [user_id])
+    fields = rank_fields(profile, stats.get(user_id))
+    if _changed(profile, fields):
+        await db.lawyers.update_one({"_id": profile["_id"]}, {"$set": fields})
+        await lawyer_directory.refresh_lawyer(db, user_id)
+    return fields["rank_score"]
+
+async def refresh_ranks(db) -> int:
+    """Recompute every profile, writing only those whose inputs changed; returns how many"""
+    stats = await response_stats(db)
+    profiles: List[UpdateOne] = []
+    entries: List[UpdateOne] = []
+    changed: List[ObjectId] = []
+
+    async def flush():
+        if profiles:
+            await db.lawyers.bulk_write(profiles, ordered=False)
+            await db[lawyer_directory.DIRECTORY_COLLECTION].bulk_write(entries, ordered=False)
+        profiles.clear()
+        entries.clear()
+
+    async for profile in db.lawyers.find({}, INPUT_PROJECTION):
+        fields = rank_fields(profile, stats.get(profile.get("user_id")))
+        if not _changed(profile, fields):
+            continue
+        profiles.append(UpdateOne({"_id": profile["_id"]}, {"$set": fields}))
+        entries.append(UpdateOne({"_id": profile["user_id"]}, {"$set": {"rank_score": fields["rank_score"]}}))
+        changed.append(profile["user_id"])
+        if len(profiles) >= WRITE_BATCH:
+            await flush()
+    await flush()
+
+    if changed:
+        await lawyer_directory.notify_changed(changed)
+    return len(changed)
+
+async def run_rank_worker(get_db: Callable, interval: int = RANK_REFRESH_SECONDS):
+    """Refresh rank scores every interval seconds until cancelled"""
+    while True:
+        db = get_db()
+        if db is not None:
+            try:
+                changed = await refresh_ranks(db)
+                if changed:
+                    logger.info(f"Rank refresh updated {changed} lawyers")
+            except Exception as e:
+                logger.error(f"Rank refresh failed: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,220 @@
+"""
+Client reviews of lawyers for J.A.I
+
+A client can review a lawyer once per accepted request. Reviews are kept in
+the reviews collection (unique per request) and folded into the lawyer's
+profile with one $inc of running aggregates, never by re-reading every review:
+- rating_sum / total_reviews give rating
+- successful_reviews / outcome_reviews give success_rate (only reviews that
+  say whether the matter went the way the client hoped count)
+The derived averages are then $set only while the counts are still the ones
+that $inc returned, so when reviews race, the last one to increment is the
+one whose averages stick.
+
+The first review of a profile keeps the rating / success_rate it already had
+(seeded profiles) as review_baseline, and the aggregates build on top of it.
+reconcile_reviews recomputes baseline + reviews for every reviewed profile,
+repairing a profile update that never landed after its review was stored.
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+import lawyer_rank
+from content_filter import check_text
+from models.review import ReviewCreate
+
+# Review configuration
+REVIEWS_COLLECTION = "reviews"
+DEFAULT_REVIEW_PAGE_SIZE = 10
+MAX_REVIEW_PAGE_SIZE = 50
+
+AGGREGATE_FIELDS = ("rating_sum", "total_reviews", "successful_reviews", "outcome_reviews")
+
+class ReviewNotAllowed(ValueError):
+    """Raised when the reviewer has no accepted request with the lawyer"""
+
+class ReviewBlocked(ValueError):
+    """Raised when the review comment is rejected by the content filter"""
+
+    def __init__(self, reasons: List[str]):
+        super().__init__(f"Review was blocked by the content filter ({', '.join(reasons)})")
+        self.reasons = reasons
+
+class DuplicateReview(ValueError):
+    """Raised when the request was already reviewed"""
+
+class InvalidCursor(ValueError):
+    """Raised when a review page cursor cannot be decoded"""
+
+async def create_review_indexes(db):
+    collection = db[REVIEWS_COLLECTION]
+    await collection.create_index("request_id", unique=True)
+    await collection.create_index([("lawyer_id", 1), ("_id", -1)])
+
+def reviewer_name(user: Dict) -> str:
+    last = (user.get("last_name") or "").strip()
+    return f"{(user.get('first_name') or '').strip()} {last[:1] + '.' if last else ''}".strip()
+
+def to_public(review: Dict) -> Dict:
+    return {
+        "id": str(review["_id"]),
+        "lawyer_id": str(review["lawyer_id"]),
+        "rating": review["rating"],
+        "comment": review.get("comment"),
+        "successful": review.get("successful"),
+        "reviewer_name": review.get("reviewer_name", ""),
+        "created_at": review["created_at"],
+    }
+
+def review_baseline(profile: Dict) -> Dict:
+    """Aggregates equivalent to the rating / success_rate a profile had before any review"""
+    reviews = int(profile.get("total_reviews") or 0)
+    cases = int(profile.get("total_cases") or 0)
+    success_rate = float(profile.get("success_rate") or 0.0)
+    outcomes = cases if success_rate else 0
+    return {
+        "rating_sum": float(profile.get("rating") or 0.0) * reviews,
+        "total_reviews": reviews,
+        "successful_reviews": round(success_rate / 100 * outcomes),
+        "outcome_reviews": outcomes,
+    }
+
+def averages(aggregates: Dict) -> Dict:
+    """rating (and success_rate, once any review reported an outcome) from the aggregates"""
+    derived = {}
+    if aggregates.get("total_reviews"):
+        derived["rating"] = round(aggregates["rating_sum"] / aggregates["total_reviews"], 2)
+    if aggregates.get("outcome_reviews"):
+        derived["success_rate"] = round(100 * aggregates["successful_reviews"] / aggregates["outcome_reviews"], 1)
+    return derived
+
+def increments(review: Dict) -> Dict:
+    inc = {"rating_sum": review["rating"], "total_reviews": 1}
+    if review.get("successful") is not None:
+        inc["outcome_reviews"] = 1
+        inc["successful_reviews"] = int(review["successful"])
+    return inc
+
+async def _ensure_baseline(db, lawyer_id: ObjectId):
+    profile = await db.lawyers.find_one({"user_id": lawyer_id, "review_baseline": {"$exists": False}})
+    if profile:
+        baseline = review_baseline(profile)
+        await db.lawyers.update_one(
+            {"_id": profile["_id"], "review_baseline": {"$exists": False}},
+            {"$set": {"review_baseline": baseline, **baseline}}
+        )
+
+async def apply_review(db, review: Dict) -> Optional[Dict]:
+    """Fold one stored review into its lawyer's aggregates; returns the derived averages"""
+    await _ensure_baseline(db, review["lawyer_id"])
+    profile = await db.lawyers.find_one_and_update(
+        {"user_id": review["lawyer_id"]},
+        {"$inc": increments(review)},
+        projection={field: 1 for field in AGGREGATE_FIELDS},
+        return_document=ReturnDocument.AFTER
+    )
+    if profile is None:
+        return None
+    derived = averages(profile)
+    await db.lawyers.update_one(
+        {"_id": profile["_id"], **{field: profile.get(field) for field in AGGREGATE_FIELDS}},
+        {"$set": derived}
+    )
+    return derived
+
+async def add_review(db, lawyer_id: ObjectId, reviewer: Dict, review: ReviewCreate) -> Dict:
+    """Store a client's review of an accepted request and update the lawyer's aggregates"""
+    client_id = ObjectId(reviewer["id"])
+    request = await db.lawyer_requests.find_one({
+        "_id": ObjectId(review.request_id),
+        "lawyer_id": lawyer_id,
+        "client_id": client_id,
+        "status": "accepted"
+    }, {"_id": 1})
+    if not request:
+        raise ReviewNotAllowed("Only the client of an accepted request can review this lawyer")
+
+    comment = (review.comment or "").strip() or None
+    if comment:
+        screening = check_text(comment)
+        if not screening.allowed:
+            raise ReviewBlocked(screening.reasons)
+
+    document = {
+        "request_id": request["_id"],
+        "lawyer_id": lawyer_id,
+        "client_id": client_id,
+        "reviewer_name": reviewer_name(reviewer),
+        "rating": review.rating,
+        "comment": comment,
+        "successful": review.successful,
+        "created_at": datetime.utcnow()
+    }
+    try:
+        result = await db[REVIEWS_COLLECTION].insert_one(document)
+    except DuplicateKeyError:
+        raise DuplicateReview("This request has already been reviewed")
+    document["_id"] = result.inserted_id
+
+    await apply_review(db, document)
+    # A new review always changes the rank inputs, which refreshes the directory entry
+    await lawyer_rank.update_rank(db, lawyer_id)
+    return document
+
+async def list_reviews(
+    db,
+    lawyer_id: ObjectId,
+    page_size: int = DEFAULT_REVIEW_PAGE_SIZE,
+    cursor: Optional[str] = None
+) -> Tuple[List[Dict], Optional[str]]:
+    """One page of a lawyer's reviews, newest first, and the cursor for the next page"""
+    query: Dict = {"lawyer_id": lawyer_id}
+    if cursor:
+        if not ObjectId.is_valid(cursor):
+            raise InvalidCursor("Invalid pagination cursor")
+        query["_id"] = {"$lt": ObjectId(cursor)}
+
+    reviews = await db[REVIEWS_COLLECTION].find(query).sort("_id", -1).limit(page_size + 1).to_list(length=page_size + 1)
+    next_cursor = None
+    if len(reviews) > page_size:
+        reviews = reviews[:page_size]
+        next_cursor = str(reviews[-1]["_id"])
+    return reviews, next_cursor
+
+def review_totals_pipeline() -> List[dict]:
+    return [{"$group": {
+        "_id": "$lawyer_id",
+        "rating_sum": {"$sum": "$rating"},
+        "total_reviews": {"$sum": 1},
+        "successful_reviews": {"$sum": {"$cond": [{"$eq": ["$successful", True]}, 1, 0]}},
+        "outcome_reviews": {"$sum": {"$cond": [{"$in": ["$successful", [True, False]]}, 1, 0]}},
+    }}]
+
+async def reconcile_reviews(db, dry_run: bool = False) -> Dict[str, int]:
+    """Recompute baseline + reviews for every reviewed profile and fix those that drifted.
+
+    Run it while no reviews are being written: a review stored after the
+    totals are read would be undone until the next run.
+    """
+    totals = {row["_id"]: row async for row in db[REVIEWS_COLLECTION].aggregate(review_totals_pipeline())}
+    stats = {"checked": 0, "fixed": 0}
+
+    query = {"$or": [{"review_baseline": {"$exists": True}}, {"user_id": {"$in": list(totals)}}]}
+    async for profile in db.lawyers.find(query):
+        stats["checked"] += 1
+        baseline = profile.get("review_baseline") or review_baseline(profile)
+        reviewed = totals.get(profile["user_id"], {})
+        expected = {field: baseline[field] + reviewed.get(field, 0) for field in AGGREGATE_FIELDS}
+        fields = {"review_baseline": baseline, **expected, **averages(expected)}
+        if all(profile.get(field) == value for field, value in fields.items()):
+            continue
+        stats["fixed"] += 1
+        if dry_run:
+            continue
+        await db.lawyers.update_one({"_id": profile["_id"]}, {"$set": fields})
+        await lawyer_rank.update_rank(db, profile["user_id"])
+    return stats
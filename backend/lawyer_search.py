@@ -0,0 +1,361 @@
+"""
+Server-side lawyer search for the J.A.I directory
+
+Translates LawyerSearchFilters into a MongoDB query on lawyer profiles, served
+by the compound indexes created in database.py, and pages through results with
+a keyset cursor (last sort value + _id) instead of skip, so deep pages cost the
+same as the first one.
+
+While the in-memory profile snapshot (lawyer_snapshot) is fresh, searches
+without near= are filtered and ordered there and only the page is read from
+MongoDB. A q= search is BM25 full text over the profiles (lawyer_fulltext,
+inside the snapshot), or with fuzzy=true a typo-tolerant name search
+(lawyer_fuzzy). On the MongoDB path the best MAX_MATCHES text matches become a
+user_id filter, and sorting by relevance orders them by their score.
+"""
+
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+import base64
+import json
+
+import gazetteer
+from lawyer_fuzzy import MAX_MATCHES, name_index
+from lawyer_snapshot import directory_snapshot
+from models.lawyer import LawyerSearchFilters, LawyerSortOption
+
+# sort option -> (profile field, direction); _id breaks ties in the same direction
+SORT_FIELDS = {
+    LawyerSortOption.RANK: ("rank_score", -1),
+    LawyerSortOption.RATING: ("rating", -1),
+    LawyerSortOption.EXPERIENCE: ("years_experience", -1),
+    LawyerSortOption.RATE: ("hourly_rate", 1),
+    LawyerSortOption.DISTANCE: ("distance", 1),  # computed by $geoNear
+    LawyerSortOption.RELEVANCE: ("score", -1),   # from the name index
+}
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Range facet boundaries (lower bound inclusive); values past the last one share its bucket
+EXPERIENCE_BUCKETS = [0, 3, 5, 10, 20]
+HOURLY_RATE_BUCKETS = [0, 250, 500, 1000, 2500]
+NO_VALUE = "none"
+
+DEFAULT_RADIUS_KM = 25.0
+MAX_RADIUS_KM = 500.0
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+class UnknownPlace(ValueError):
+    """Raised when a near= place is not in the gazetteer"""
+
+class MissingQuery(ValueError):
+    """Raised when sorting by relevance without a q= search"""
+
+def near_point(filters: LawyerSearchFilters) -> Optional[Tuple[float, float]]:
+    """(longitude, latitude) of the near= filter, if one is set"""
+    if not filters.near:
+        return None
+    point = gazetteer.coordinates(filters.near)
+    if point is None:
+        raise UnknownPlace(f"Unknown place: {filters.near}")
+    return point
+
+def radius_km(filters: LawyerSearchFilters) -> float:
+    return min(filters.radius_km or DEFAULT_RADIUS_KM, MAX_RADIUS_KM)
+
+def text_matches(filters: LawyerSearchFilters, limit: Optional[int] = MAX_MATCHES) -> Dict[str, float]:
+    """Lawyer user id -> score for the q= search (the best limit; None for every BM25 match)"""
+    if filters.fuzzy:
+        return dict(name_index.search(filters.q or "", fuzzy=True))
+    if directory_snapshot.loaded_at is not None:
+        return directory_snapshot.text_search(filters.q or "", limit)
+    # No snapshot (NumPy missing or still loading): exact name / firm words
+    return dict(name_index.search(filters.q or ""))
+
+def build_filter_query(filters: LawyerSearchFilters, matches: Optional[Dict[str, float]] = None) -> Dict:
+    """Mongo query for the given filters; unset filters match everything"""
+    query: Dict = {}
+    if filters.q:
+        if matches is None:
+            matches = text_matches(filters)
+        query["user_id"] = {"$in": [ObjectId(user_id) for user_id in matches]}
+    if filters.specializations:
+        query["specializations"] = {"$in": filters.specializations}
+    if filters.languages:
+        query["languages"] = {"$in": filters.languages}
+    if filters.availability_status:
+        query["availability_status"] = filters.availability_status.value
+    if filters.bar_state:
+        query["bar_state"] = filters.bar_state
+    if filters.min_experience is not None:
+        query["years_experience"] = {"$gte": filters.min_experience}
+    if filters.max_hourly_rate is not None:
+        query["hourly_rate"] = {"$lte": filters.max_hourly_rate}
+    if filters.min_rating is not None:
+        query["rating"] = {"$gte": filters.min_rating}
+    point = near_point(filters)
+    if point:
+        # Served by the 2dsphere index on geo
+        query["geo"] = {"$geoWithin": {
+            "$centerSphere": [list(point), radius_km(filters) / gazetteer.EARTH_RADIUS_KM]
+        }}
+    return query
+
+# facet -> the filter field it ignores when counting
+FACET_FIELDS = {
+    "specializations": "specializations",
+    "bar_state": "bar_state",
+    "languages": "languages",
+    "experience": "years_experience",
+    "hourly_rate": "hourly_rate",
+}
+
+def _value_facet(field: str, unwind: bool) -> List[Dict]:
+    stages = [{"$unwind": f"${field}"}] if unwind else [{"$match": {field: {"$nin": [None, ""]}}}]
+    return stages + [
+        {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1, "_id": 1}}
+    ]
+
+def _range_facet(field: str, boundaries: List[float]) -> List[Dict]:
+    return [{"$bucket": {
+        "groupBy": f"${field}",
+        "boundaries": boundaries + [float("inf")],
+        "default": NO_VALUE,
+        "output": {"count": {"$sum": 1}}
+    }}]
+
+def facet_pipeline(filters: LawyerSearchFilters, matches: Optional[Dict[str, float]] = None) -> List[Dict]:
+    """One $facet aggregation counting every facet for the current filters.
+
+    Each facet drops its own filter (choosing one specialization should still
+    show how many lawyers the other specializations have), so the shared
+    filters are applied up front and the rest inside the facet branches.
+    """
+    query = build_filter_query(filters, matches)
+    facet_filters = set(FACET_FIELDS.values())
+    shared = {field: condition for field, condition in query.items() if field not in facet_filters}
+    own = {field: condition for field, condition in query.items() if field in facet_filters}
+
+    def without(field: str) -> List[Dict]:
+        rest = {other: condition for other, condition in own.items() if other != field}
+        return [{"$match": rest}] if rest else []
+
+    branches = {
+        "total": [{"$match": own}, {"$count": "count"}] if own else [{"$count": "count"}],
+        "specializations": without("specializations") + _value_facet("specializations", unwind=True),
+        "bar_state": without("bar_state") + _value_facet("bar_state", unwind=False),
+        "languages": without("languages") + _value_facet("languages", unwind=True),
+        "experience": without("years_experience") + _range_facet("years_experience", EXPERIENCE_BUCKETS),
+        "hourly_rate": without("hourly_rate") + _range_facet("hourly_rate", HOURLY_RATE_BUCKETS),
+    }
+    return [{"$match": shared}, {"$facet": branches}]
+
+def _ranges(buckets: List[Dict], boundaries: List[float]) -> List[Dict]:
+    counts = {bucket["_id"]: bucket["count"] for bucket in buckets}
+    ranges = []
+    for index, low in enumerate(boundaries):
+        high = boundaries[index + 1] if index + 1 < len(boundaries) else None
+        ranges.append({"min": low, "max": high, "count": counts.get(low, 0)})
+    if counts.get(NO_VALUE):
+        ranges.append({"min": None, "max": None, "count": counts[NO_VALUE]})
+    return ranges
+
+async def facet_counts(collection, filters: LawyerSearchFilters) -> Dict:
+    """Facet counts for the directory sidebar.
+
+    A q= search counts every BM25 match, not just the MAX_MATCHES the MongoDB
+    search path pages through, so totals agree with snapshot search results.
+    """
+    matches = text_matches(filters, limit=None) if filters.q else None
+    result = await collection.aggregate(facet_pipeline(filters, matches)).to_list(length=1)
+    facets = result[0] if result else {}
+    total = facets.get("total") or [{"count": 0}]
+
+    def values(name: str) -> List[Dict]:
+        return [{"value": str(bucket["_id"]), "count": bucket["count"]} for bucket in facets.get(name, [])]
+
+    return {
+        "total": total[0]["count"],
+        "specializations": values("specializations"),
+        "bar_state": values("bar_state"),
+        "languages": values("languages"),
+        "experience": _ranges(facets.get("experience", []), EXPERIENCE_BUCKETS),
+        "hourly_rate": _ranges(facets.get("hourly_rate", []), HOURLY_RATE_BUCKETS),
+    }
+
+def encode_cursor(value, last_id: ObjectId) -> str:
+    raw = json.dumps({"v": value, "id": str(last_id)})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[Optional[float], ObjectId]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        data = json.loads(raw)
+        value, last_id = data["v"], ObjectId(data["id"])
+    except Exception:
+        raise InvalidCursor("Invalid pagination cursor")
+    # Every sort key is numeric (or missing)
+    if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+        raise InvalidCursor("Invalid pagination cursor")
+    return value, last_id
+
+def after_cursor(field: str, direction: int, value, last_id: ObjectId) -> Dict:
+    """Condition selecting the documents that sort after (value, last_id).
+
+    Missing / null values sort lowest in MongoDB: last in descending order,
+    first in ascending order.
+    """
+    op = "$lt" if direction < 0 else "$gt"
+    if value is None:
+        if direction < 0:
+            return {field: None, "_id": {op: last_id}}
+        return {"$or": [{field: None, "_id": {op: last_id}}, {field: {"$ne": None}}]}
+
+    conditions = [{field: {op: value}}, {field: value, "_id": {op: last_id}}]
+    if direction < 0:
+        conditions.append({field: None})
+    return {"$or": conditions}
+
+async def search_profiles(
+    collection,
+    filters: LawyerSearchFilters,
+    sort: LawyerSortOption = LawyerSortOption.RANK,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    projection: Optional[Dict] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """One page of matching profile documents and the cursor for the next page"""
+    if sort == LawyerSortOption.DISTANCE:
+        return await search_nearest(collection, filters, page_size, cursor, projection)
+    if sort == LawyerSortOption.RELEVANCE and not filters.q:
+        raise MissingQuery("Sorting by relevance needs a q= search")
+
+    field, direction = SORT_FIELDS[sort]
+    if not filters.near and directory_snapshot.fresh():
+        return await search_snapshot(collection, filters, field, direction, page_size, cursor, projection)
+    if sort == LawyerSortOption.RELEVANCE:
+        return await search_relevant(collection, filters, page_size, cursor, projection)
+
+    query = build_filter_query(filters)
+    if cursor:
+        value, last_id = decode_cursor(cursor)
+        query = {"$and": [query, after_cursor(field, direction, value, last_id)]}
+
+    documents = await collection.find(query, projection).sort(
+        [(field, direction), ("_id", direction)]
+    ).limit(page_size + 1).to_list(length=page_size + 1)
+
+    next_cursor = None
+    if len(documents) > page_size:
+        documents = documents[:page_size]
+        last = documents[-1]
+        next_cursor = encode_cursor(last.get(field), last["_id"])
+    return documents, next_cursor
+
+async def search_snapshot(
+    collection,
+    filters: LawyerSearchFilters,
+    field: str,
+    direction: int,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    projection: Optional[Dict] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """search_profiles answered from the in-memory snapshot; only the page is fetched"""
+    matches = text_matches(filters) if filters.q and filters.fuzzy else None
+    after = decode_cursor(cursor) if cursor else None
+    page = directory_snapshot.page(filters, field, direction, page_size + 1, after, matches)
+
+    next_cursor = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        next_cursor = encode_cursor(page[-1][1], page[-1][0])
+
+    profile_ids = [profile_id for profile_id, _ in page]
+    documents = {
+        document["_id"]: document
+        for document in await collection.find({"_id": {"$in": profile_ids}}, projection).to_list(length=len(profile_ids))
+    }
+    if field == "score":
+        for profile_id, score in page:
+            if profile_id in documents:
+                documents[profile_id]["score"] = score
+    return [documents[profile_id] for profile_id in profile_ids if profile_id in documents], next_cursor
+
+async def search_nearest(
+    collection,
+    filters: LawyerSearchFilters,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    projection: Optional[Dict] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """Like search_profiles, nearest first; documents carry distance (meters)"""
+    point = near_point(filters)
+    if point is None:
+        raise UnknownPlace("Sorting by distance needs a near= place")
+
+    query = build_filter_query(filters)
+    query.pop("geo", None)  # $geoNear applies the radius itself
+    geo_near = {
+        "near": {"type": "Point", "coordinates": list(point)},
+        "distanceField": "distance",
+        "maxDistance": radius_km(filters) * 1000,
+        "spherical": True,
+        "key": "geo",
+        "query": query
+    }
+    pipeline = [{"$geoNear": geo_near}]
+    if cursor:
+        value, last_id = decode_cursor(cursor)
+        geo_near["minDistance"] = value
+        pipeline.append({"$match": after_cursor("distance", 1, value, last_id)})
+    # $geoNear leaves ties in no particular order; _id makes the cursor stable
+    pipeline += [{"$sort": {"distance": 1, "_id": 1}}, {"$limit": page_size + 1}]
+    if projection:
+        pipeline.append({"$project": {**projection, "distance": 1}})
+
+    documents = await collection.aggregate(pipeline).to_list(length=page_size + 1)
+    next_cursor = None
+    if len(documents) > page_size:
+        documents = documents[:page_size]
+        last = documents[-1]
+        next_cursor = encode_cursor(last["distance"], last["_id"])
+    return documents, next_cursor
+
+async def search_relevant(
+    collection,
+    filters: LawyerSearchFilters,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    projection: Optional[Dict] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """Like search_profiles, best q= match first; documents carry score.
+
+    The matches are capped at MAX_MATCHES, so all of them are fetched and
+    ordered here rather than by the database.
+    """
+    if not filters.q:
+        raise MissingQuery("Sorting by relevance needs a q= search")
+
+    matches = text_matches(filters)
+    if projection:
+        projection = {**projection, "user_id": 1}
+    documents = await collection.find(build_filter_query(filters, matches), projection).to_list(length=None)
+    for document in documents:
+        document["score"] = matches.get(str(document["user_id"]), 0.0)
+    documents.sort(key=lambda document: (document["score"], document["_id"]), reverse=True)
+
+    if cursor:
+        value, last_id = decode_cursor(cursor)
+        documents = [document for document in documents if (document["score"], document["_id"]) < (value, last_id)]
+
+    next_cursor = None
+    if len(documents) > page_size:
+        documents = documents[:page_size]
+        last = documents[-1]
+        next_cursor = encode_cursor(last["score"], last["_id"])
+    return documents, next_cursor
@@ -0,0 +1,386 @@
+"""
+Columnar in-memory snapshot of lawyer profiles for directory filtering
+
+Directory searches combine a handful of filters over a collection that
+rarely changes, so each worker keeps the filterable profile fields in NumPy
+columns and answers them without a query plan:
+- Specializations, languages, bar state and availability get one boolean
+  bitmap per value; filters AND (and, within a field, OR) them together.
+- years_experience, hourly_rate, rating and rank_score are kept in row order plus a
+  sorted order (ties broken by profile _id, missing values lowest, as MongoDB
+  sorts), so ranges are two searchsorted calls and a page is the first
+  matching rows of that order.
+- A q= search scores every row with the BM25 index (lawyer_fulltext) and
+  ANDs "score > 0" into the filters; sorting by relevance takes the best
+  scores among the matching rows.
+
+Only the page itself is then fetched from MongoDB, by _id. Cursors are the
+same (value, _id) pairs the MongoDB path uses, so a search can move between
+the two paths mid-pagination.
+
+The snapshot is loaded from the lawyers collection (names from users) and
+refreshed per lawyer from directory change events (changes that land while
+a reload is loading are applied to the new snapshot before it is swapped
+in). While it is not loaded,
+has changes still to apply, or has gone SNAPSHOT_MAX_AGE_SECONDS without a
+full reload, fresh() is False and searches use the MongoDB query path
+instead. A changed lawyer gets a new row; rows of changed and removed
+lawyers are only reclaimed by the next full reload. NumPy is optional;
+without it the snapshot stays empty.
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+from bson import ObjectId
+import asyncio
+import os
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import lawyer_directory
+from lawyer_fulltext import TextIndex, profile_fields
+from models.lawyer import LawyerSearchFilters
+
+# Snapshot configuration (the directory worker triggers a full reload every DIRECTORY_REBUILD_SECONDS)
+SNAPSHOT_MAX_AGE_SECONDS = float(os.getenv(
+    "SNAPSHOT_MAX_AGE_SECONDS", str(2 * lawyer_directory.DIRECTORY_REBUILD_SECONDS)
+))
+
+LIST_FIELDS = ("specializations", "languages")
+VALUE_FIELDS = ("bar_state", "availability_status")
+NUMERIC_FIELDS = ("years_experience", "hourly_rate", "rating", "rank_score")
+TEXT_FIELDS = ("law_firm", "bio", "education", "certifications")
+PROJECTION = {field: 1 for field in ("user_id",) + LIST_FIELDS + VALUE_FIELDS + NUMERIC_FIELDS + TEXT_FIELDS}
+NAME_FIELDS = {"first_name": 1, "last_name": 1}
+
+MIN_CAPACITY = 1024
+
+def id_parts(object_id: ObjectId) -> Tuple[int, int]:
+    """ObjectId as (first 4 bytes, last 8 bytes), which compare like the ObjectId"""
+    raw = object_id.binary
+    return int.from_bytes(raw[:4], "big"), int.from_bytes(raw[4:], "big")
+
+def _number(value) -> float:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return float("nan")
+
+def _resized(array, capacity: int, fill):
+    grown = np.full(capacity, fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+class DirectorySnapshot(lawyer_directory.DirectoryIndex):
+    """Filterable profile fields, one row per lawyer (keyed by user id)"""
+
+    def __init__(self):
+        self._rows: Dict[str, int] = {}
+        self._user_ids: List[str] = []
+        self._profile_ids: List[Optional[ObjectId]] = []
+        self._row_values: List[Dict[str, List[str]]] = []  # bitmap values set for each row
+        self._size = 0
+        self._capacity = 0
+        self._bitmaps: Dict[str, Dict[str, "np.ndarray"]] = {field: {} for field in LIST_FIELDS + VALUE_FIELDS}
+        self._orders: Dict[str, Tuple["np.ndarray", "np.ndarray"]] = {}  # dropped on every change
+        self.text = TextIndex()
+        self.loaded_at: Optional[float] = None
+        self.changes = 0  # rows added or removed since the load
+        if np is not None:
+            self._alive = np.zeros(0, dtype=bool)
+            self._id_high = np.zeros(0, dtype=np.int64)
+            self._id_low = np.zeros(0, dtype=np.uint64)
+            self._numbers = {field: np.zeros(0, dtype=np.float64) for field in NUMERIC_FIELDS}
+
+    def __len__(self):
+        return len(self._rows)
+
+    @property
+    def size(self) -> int:
+        """Rows in use, including dead ones; row masks and columns have this length"""
+        return self._size
+
+    def alive(self) -> "np.ndarray":
+        return self._alive[:self._size]
+
+    def column(self, field: str) -> "np.ndarray":
+        """One of NUMERIC_FIELDS by row (NaN where missing); a view, do not modify"""
+        return self._numbers[field][:self._size]
+
+    def row(self, user_id: str) -> Optional[int]:
+        return self._rows.get(user_id)
+
+    def user_id(self, row: int) -> str:
+        return self._user_ids[row]
+
+    def values(self, row: int, field: str) -> List[str]:
+        """Values of a bitmap field (LIST_FIELDS / VALUE_FIELDS) for a live row"""
+        return self._row_values[row].get(field, [])
+
+    def distinct(self, field: str) -> List[str]:
+        """Every value seen in a bitmap field since the load (some may no longer be set on any row)"""
+        return list(self._bitmaps[field])
+
+    def _grow(self):
+        capacity = max(2 * self._capacity, MIN_CAPACITY)
+        self._alive = _resized(self._alive, capacity, False)
+        self._id_high = _resized(self._id_high, capacity, 0)
+        self._id_low = _resized(self._id_low, capacity, 0)
+        for field, column in self._numbers.items():
+            self._numbers[field] = _resized(column, capacity, np.nan)
+        for bitmaps in self._bitmaps.values():
+            for value, bitmap in bitmaps.items():
+                bitmaps[value] = _resized(bitmap, capacity, False)
+        self._capacity = capacity
+
+    def _clear_bits(self, row: int):
+        for field, values in self._row_values[row].items():
+            for value in values:
+                self._bitmaps[field][value][row] = False
+        self._row_values[row] = {}
+
+    def _new_row(self, profile: Dict) -> int:
+        """Row for a profile document (see PROJECTION, plus first_name / last_name)"""
+        user_id = str(profile["user_id"])
+        self.remove(user_id)
+        if self._size == self._capacity:
+            self._grow()
+        row = self._size
+        self._size += 1
+        self._rows[user_id] = row
+        self._user_ids.append(user_id)
+        self._profile_ids.append(profile["_id"])
+        self._row_values.append({})
+
+        self._id_high[row], self._id_low[row] = id_parts(profile["_id"])
+        for field in NUMERIC_FIELDS:
+            self._numbers[field][row] = _number(profile.get(field))
+
+        values = {field: [value for value in profile.get(field) or [] if isinstance(value, str)] for field in LIST_FIELDS}
+        for field in VALUE_FIELDS:
+            value = profile.get(field)
+            values[field] = [value] if isinstance(value, str) else []
+        for field, field_values in values.items():
+            for value in field_values:
+                bitmap = self._bitmaps[field].get(value)
+                if bitmap is None:
+                    bitmap = self._bitmaps[field][value] = np.zeros(self._capacity, dtype=bool)
+                bitmap[row] = True
+        self._row_values[row] = values
+        self._alive[row] = True
+        self._orders.clear()
+        self.changes += 1
+        return row
+
+    def add(self, profile: Dict):
+        """Add or replace a lawyer"""
+        row = self._new_row(profile)
+        self.text.add(row, profile_fields(profile))
+
+    def remove(self, lawyer_id: str):
+        row = self._rows.pop(lawyer_id, None)
+        if row is None:
+            return
+        self._clear_bits(row)
+        self._alive[row] = False
+        self._profile_ids[row] = None
+        self._orders.clear()
+        self.changes += 1
+
+    def load(self, profiles: Iterable[Dict]):
+        rows = [(self._new_row(profile), profile) for profile in profiles]
+        self.text.load((row, profile_fields(profile)) for row, profile in rows)
+        self.loaded_at = time.monotonic()
+
+    @staticmethod
+    async def _profiles(db, query: Dict) -> List[Dict]:
+        """Profile documents with the account names merged in"""
+        profiles = await db.lawyers.find(query, PROJECTION).to_list(length=None)
+        names = {}
+        user_ids = [profile["user_id"] for profile in profiles]
+        for start in range(0, len(user_ids), 10000):
+            async for user in db.users.find({"_id": {"$in": user_ids[start:start + 10000]}}, NAME_FIELDS):
+                names[user["_id"]] = user
+        for profile in profiles:
+            user = names.get(profile["user_id"], {})
+            profile["first_name"] = user.get("first_name", "")
+            profile["last_name"] = user.get("last_name", "")
+        return profiles
+
+    async def rebuild(self, db):
+        """Reload every profile from the lawyers collection"""
+        if np is None:
+            return
+
+        async def build() -> "DirectorySnapshot":
+            profiles = await self._profiles(db, {})
+            fresh = DirectorySnapshot()
+            # Tokenizing every profile takes a while; keep the event loop serving meanwhile
+            await asyncio.get_running_loop().run_in_executor(None, fresh.load, profiles)
+            return fresh
+
+        await self._swap_in(db, build)
+
+    async def refresh(self, db, lawyer_ids: List[str]):
+        self._note_refresh(lawyer_ids)
+        if np is None or self.loaded_at is None:
+            return
+        profiles = {
+            str(profile["user_id"]): profile for profile in await self._profiles(
+                db, {"user_id": {"$in": [ObjectId(lawyer_id) for lawyer_id in lawyer_ids]}}
+            )
+        }
+        for lawyer_id in lawyer_ids:
+            if lawyer_id in profiles:
+                self.add(profiles[lawyer_id])
+            else:
+                self.remove(lawyer_id)
+
+    def fresh(self) -> bool:
+        """Whether searches may be answered from the snapshot"""
+        return (
+            np is not None
+            and self.loaded_at is not None
+            and not self.updating
+            and time.monotonic() - self.loaded_at < SNAPSHOT_MAX_AGE_SECONDS
+        )
+
+    def _order(self, field: str) -> Tuple["np.ndarray", "np.ndarray"]:
+        """(rows, keys) ascending by (value, _id); missing values are -inf"""
+        cached = self._orders.get(field)
+        if cached is None:
+            column = self._numbers[field][:self._size]
+            keys = np.where(np.isnan(column), -np.inf, column)
+            rows = np.lexsort((self._id_low[:self._size], self._id_high[:self._size], keys))
+            cached = self._orders[field] = (rows, keys[rows])
+        return cached
+
+    def _range(self, field: str, low: Optional[float] = None, high: Optional[float] = None) -> "np.ndarray":
+        """Rows with low <= value <= high (missing values never match)"""
+        rows, keys = self._order(field)
+        start = np.searchsorted(keys, low, "left") if low is not None else np.searchsorted(keys, -np.inf, "right")
+        end = np.searchsorted(keys, high, "right") if high is not None else len(keys)
+        mask = np.zeros(self._size, dtype=bool)
+        mask[rows[start:end]] = True
+        return mask
+
+    def any_of(self, field: str, values: Iterable[str]) -> "np.ndarray":
+        """Row mask of lawyers with any of values in a bitmap field"""
+        mask = np.zeros(self._size, dtype=bool)
+        for value in values:
+            bitmap = self._bitmaps[field].get(value)
+            if bitmap is not None:
+                mask |= bitmap[:self._size]
+        return mask
+
+    def text_scores(self, filters: LawyerSearchFilters, matches: Optional[Dict[str, float]] = None) -> Optional["np.ndarray"]:
+        """Per-row q= scores: BM25, or the given user id -> score matches (fuzzy name search)"""
+        if not filters.q:
+            return None
+        if matches is None:
+            return self.text.scores(filters.q, self._size, len(self._rows))
+        scores = np.zeros(self._size, dtype=np.float64)
+        for user_id, score in matches.items():
+            row = self._rows.get(user_id)
+            if row is not None:
+                scores[row] = score
+        return scores
+
+    def text_search(self, query: str, limit: Optional[int]) -> Dict[str, float]:
+        """User id -> BM25 score of the best limit lawyers for query (every match when limit is None)"""
+        scores = self.text.scores(query, self._size, len(self._rows))
+        scores[~self._alive[:self._size]] = 0
+        rows = np.flatnonzero(scores > 0)
+        if limit is not None and len(rows) > limit:
+            rows = rows[np.argpartition(-scores[rows], limit - 1)[:limit]]
+        return {self._user_ids[row]: round(float(scores[row]), 4) for row in rows}
+
+    def match(self, filters: LawyerSearchFilters, scores: Optional["np.ndarray"] = None) -> "np.ndarray":
+        """Row mask for the filters (near= is not supported); scores are the q= text_scores"""
+        mask = self._alive[:self._size].copy()
+        if scores is not None:
+            mask &= scores > 0
+        if filters.specializations:
+            mask &= self.any_of("specializations", filters.specializations)
+        if filters.languages:
+            mask &= self.any_of("languages", filters.languages)
+        if filters.availability_status:
+            mask &= self.any_of("availability_status", [filters.availability_status.value])
+        if filters.bar_state:
+            mask &= self.any_of("bar_state", [filters.bar_state])
+        if filters.min_experience is not None:
+            mask &= self._range("years_experience", low=filters.min_experience)
+        if filters.max_hourly_rate is not None:
+            mask &= self._range("hourly_rate", high=filters.max_hourly_rate)
+        if filters.min_rating is not None:
+            mask &= self._range("rating", low=filters.min_rating)
+        return mask
+
+    def page(
+        self,
+        filters: LawyerSearchFilters,
+        field: str,
+        direction: int,
+        limit: int,
+        after: Optional[Tuple[Optional[float], ObjectId]] = None,
+        matches: Optional[Dict[str, float]] = None
+    ) -> List[Tuple[ObjectId, Optional[float]]]:
+        """(profile _id, field value) of the first limit matching rows sorted by (field, _id).
+
+        field "score" sorts by q= relevance. after is a decoded cursor: only
+        rows sorting after that (value, _id) are returned. matches replace
+        BM25 for fuzzy name searches (see text_scores).
+        """
+        scores = self.text_scores(filters, matches)
+        mask = self.match(filters, scores)
+        if field == "score":
+            return self._relevance_page(mask, scores, limit, after)
+        rows, keys = self._order(field)
+        if direction < 0:
+            rows, keys = rows[::-1], keys[::-1]
+        selected = mask[rows]
+
+        if after is not None:
+            value, last_id = after
+            key = -np.inf if value is None else value
+            high, low = id_parts(last_id)
+            ids_high, ids_low = self._id_high[rows], self._id_low[rows]
+            if direction < 0:
+                later = (keys < key) | ((keys == key) & ((ids_high < high) | ((ids_high == high) & (ids_low < low))))
+            else:
+                later = (keys > key) | ((keys == key) & ((ids_high > high) | ((ids_high == high) & (ids_low > low))))
+            selected &= later
+
+        page = []
+        for row in rows[np.flatnonzero(selected)[:limit]]:
+            value = self._numbers[field][row]
+            page.append((self._profile_ids[row], None if np.isnan(value) else float(value)))
+        return page
+
+    def _relevance_page(
+        self,
+        mask: "np.ndarray",
+        scores: "np.ndarray",
+        limit: int,
+        after: Optional[Tuple[Optional[float], ObjectId]]
+    ) -> List[Tuple[ObjectId, Optional[float]]]:
+        rows = np.flatnonzero(mask)
+        keys = np.round(scores[rows], 4)  # the precision cursors carry
+        ids_high, ids_low = self._id_high[rows], self._id_low[rows]
+        if after is not None:
+            value, last_id = after
+            high, low = id_parts(last_id)
+            later = (keys < value) | ((keys == value) & ((ids_high < high) | ((ids_high == high) & (ids_low < low))))
+            rows, keys, ids_high, ids_low = rows[later], keys[later], ids_high[later], ids_low[later]
+
+        if len(rows) > limit:
+            # Only rows scoring at least the limit-th best score (ties included) can be on the page
+            threshold = np.partition(keys, len(keys) - limit)[len(keys) - limit]
+            best = keys >= threshold
+            rows, keys, ids_high, ids_low = rows[best], keys[best], ids_high[best], ids_low[best]
+        order = np.lexsort((ids_low, ids_high, keys))[::-1][:limit]
+        return [(self._profile_ids[rows[index]], float(keys[index])) for index in order]
+
+directory_snapshot = DirectorySnapshot()
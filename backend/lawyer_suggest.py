@@ -0,0 +1,195 @@
+"""
+Typeahead suggestions for the lawyer directory
+
+An in-memory prefix index over lawyer names, law firms and specializations.
+Names are also indexed from each later word ("smi" finds "John Smith").
+
+- Terms live in one sorted list, so the terms under a prefix are one bisect
+  range.
+- For short prefixes (up to TOP_PREFIX_LENGTH characters) the best-rated
+  suggestions are kept precomputed, because those ranges are the large ones.
+- Longer prefixes scan their (small) range.
+
+Either way a lookup stays well under a millisecond.
+
+The index is built from the lawyer_directory collection at startup and kept
+current from directory change events:
+- A changed lawyer's terms are removed and re-inserted, touching only the
+  affected prefixes.
+- A full directory rebuild rebuilds the index.
+"""
+
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+import heapq
+import re
+
+import lawyer_directory
+
+DEFAULT_SUGGESTIONS = 8
+MAX_SUGGESTIONS = 20
+# Prefixes up to this long keep their best MAX_SUGGESTIONS suggestions precomputed
+TOP_PREFIX_LENGTH = 6
+
+NAME, FIRM, SPECIALIZATION = "name", "firm", "specialization"
+
+SuggestionKey = Tuple[str, str]
+
+def normalize(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+def word_starts(text: str) -> List[str]:
+    """The text and each of its later-word suffixes, normalized"""
+    words = normalize(text).split()
+    return [" ".join(words[index:]) for index in range(len(words))]
+
+def short_prefixes(term: str) -> List[str]:
+    return [term[:length] for length in range(1, min(len(term), TOP_PREFIX_LENGTH) + 1)]
+
+class Suggestion:
+    """One suggestible value; firms and specializations group several lawyers"""
+
+    __slots__ = ("kind", "text", "members", "rating")
+
+    def __init__(self, kind: str, text: str):
+        self.kind = kind
+        self.text = text
+        self.members: Dict[str, float] = {}  # lawyer id -> rating
+        self.rating = 0.0                    # best member rating
+
+    def add_member(self, lawyer_id: str, rating: float):
+        self.members[lawyer_id] = rating
+        self.rating = max(self.rating, rating)
+
+    def remove_member(self, lawyer_id: str):
+        rating = self.members.pop(lawyer_id, None)
+        if rating is not None and rating >= self.rating:
+            self.rating = max(self.members.values(), default=0.0)
+
+    def score(self) -> Tuple:
+        return (self.rating, len(self.members), -len(self.text), self.text)
+
+    def as_dict(self) -> Dict:
+        result = {"type": self.kind, "text": self.text, "rating": self.rating, "count": len(self.members)}
+        if self.kind == NAME:
+            result["lawyer_id"] = next(iter(self.members))
+        return result
+
+class SuggestIndex(lawyer_directory.DirectoryIndex):
+    """Sorted (term, suggestion key) pairs plus precomputed tops for short prefixes"""
+
+    def __init__(self):
+        self._terms: List[Tuple[str, SuggestionKey]] = []
+        self._suggestions: Dict[SuggestionKey, Suggestion] = {}
+        self._by_lawyer: Dict[str, List[SuggestionKey]] = {}
+        self._top: Dict[str, List[SuggestionKey]] = {}
+
+    def __len__(self):
+        return len(self._terms)
+
+    def _keys_for(self, lawyer: Dict) -> List[Tuple[SuggestionKey, str]]:
+        """(suggestion key, display text) for every value a lawyer contributes"""
+        keys = []
+        name = f"{lawyer.get('first_name', '')} {lawyer.get('last_name', '')}".strip()
+        if name:
+            keys.append(((NAME, lawyer["id"]), name))
+        if lawyer.get("law_firm"):
+            keys.append(((FIRM, normalize(lawyer["law_firm"])), lawyer["law_firm"]))
+        for specialization in lawyer.get("specializations") or []:
+            keys.append(((SPECIALIZATION, normalize(specialization)), specialization))
+        return keys
+
+    def _rank(self, key: SuggestionKey) -> Tuple:
+        return self._suggestions[key].score(), key
+
+    def _best(self, keys: Iterable[SuggestionKey], limit: int) -> List[SuggestionKey]:
+        return heapq.nlargest(limit, keys, key=self._rank)
+
+    def _range(self, prefix: str) -> Set[SuggestionKey]:
+        start = bisect_left(self._terms, (prefix,))
+        end = bisect_left(self._terms, (prefix + "\uffff",), start)
+        return {key for _, key in self._terms[start:end]}
+
+    def _improved(self, key: SuggestionKey):
+        """key is new or ranks higher than before: it can only enter tops"""
+        rank = self._rank(key)
+        for term in word_starts(self._suggestions[key].text):
+            for prefix in short_prefixes(term):
+                top = self._top.setdefault(prefix, [])
+                if key not in top:
+                    if len(top) >= MAX_SUGGESTIONS and self._rank(top[-1]) >= rank:
+                        continue
+                    top.append(key)
+                top.sort(key=self._rank, reverse=True)
+                del top[MAX_SUGGESTIONS:]
+
+    def _worsened(self, key: SuggestionKey, text: str):
+        """key ranks lower or is gone: tops holding it are recomputed from their range"""
+        for term in word_starts(text):
+            for prefix in short_prefixes(term):
+                top = self._top.get(prefix)
+                if top is None or key not in top:
+                    continue
+                best = self._best(self._range(prefix), MAX_SUGGESTIONS)
+                if best:
+                    self._top[prefix] = best
+                else:
+                    del self._top[prefix]
+
+    def add(self, lawyer: Dict, maintain_tops: bool = True):
+        """Index a lawyer in the public directory shape (see lawyer_directory.to_public)"""
+        self.remove(lawyer["id"], maintain_tops)
+        rating = lawyer.get("rating") or 0.0
+        keys = []
+        for key, text in self._keys_for(lawyer):
+            suggestion = self._suggestions.get(key)
+            if suggestion is None:
+                suggestion = self._suggestions[key] = Suggestion(key[0], text)
+                for term in word_starts(text):
+                    insort(self._terms, (term, key))
+            suggestion.add_member(lawyer["id"], rating)
+            keys.append(key)
+            if maintain_tops:
+                self._improved(key)
+        self._by_lawyer[lawyer["id"]] = keys
+
+    def remove(self, lawyer_id: str, maintain_tops: bool = True):
+        for key in self._by_lawyer.pop(lawyer_id, []):
+            suggestion = self._suggestions.get(key)
+            if suggestion is None:
+                continue
+            suggestion.remove_member(lawyer_id)
+            if not suggestion.members:
+                del self._suggestions[key]
+                for term in word_starts(suggestion.text):
+                    position = bisect_left(self._terms, (term, key))
+                    if position < len(self._terms) and self._terms[position] == (term, key):
+                        del self._terms[position]
+            if maintain_tops:
+                self._worsened(key, suggestion.text)
+
+    def _build_tops(self):
+        candidates: Dict[str, Set[SuggestionKey]] = defaultdict(set)
+        for term, key in self._terms:
+            for prefix in short_prefixes(term):
+                candidates[prefix].add(key)
+        self._top = {prefix: self._best(keys, MAX_SUGGESTIONS) for prefix, keys in candidates.items()}
+
+    def suggest(self, prefix: str, limit: int = DEFAULT_SUGGESTIONS) -> List[Dict]:
+        """Best-rated suggestions with a term starting with prefix"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        if len(prefix) <= TOP_PREFIX_LENGTH:
+            keys = self._top.get(prefix, [])[:limit]
+        else:
+            keys = self._best(self._range(prefix), limit)
+        return [self._suggestions[key].as_dict() for key in keys]
+
+    def load(self, lawyers: Iterable[Dict]):
+        for lawyer in lawyers:
+            self.add(lawyer, maintain_tops=False)
+        self._build_tops()
+
+suggest_index = SuggestIndex()
@@ -1,9 +1,12 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Request
+from fastapi import FastAPI, HTTPException, Depends, status, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, RedirectResponse
 from contextlib import asynccontextmanager
+from typing import Optional
+import asyncio
+import json
 import uvicorn
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
@@ -14,13 +17,28 @@ load_dotenv()
 
 # Import routers
 try:
-    from routers import auth, users, lawyers, cases, ai_matching, lawyer_requests, messages
+    from routers import auth, users, lawyers, cases, ai_matching, lawyer_requests, messages, sync
     print("✅ All routers imported successfully")
 except Exception as e:
     print(f"❌ Router import error: {e}")
     raise
 
 from database import connect_to_mongo, close_mongo_connection, get_database
+import message_store
+from write_coalescer import flush_all
+from content_filter import check_text
+from conversation_summary import SUMMARY_ENABLED, run_summary_worker
+from events import event_bus
+from presence import presence_registry
+import lawyer_directory
+import lawyer_rank
+from gazetteer import geocode_profiles, get_gazetteer, profile_point
+from lawyer_suggest import suggest_index
+from lawyer_fuzzy import name_index
+from lawyer_snapshot import directory_snapshot
+from lawyer_profiles import PUBLIC_BATCH_MAX_IDS, public_profiles
+from conditional import ConditionalGetMiddleware, body_etag, check_not_modified, validator_headers
+from response_cache import ResponseCache, cache_key
 
 # Security
 security = HTTPBearer()
@@ -33,10 +51,76 @@ async def lifespan(app: FastAPI):
     # Create test users if they don't exist
     await create_initial_users()
     
+    # Place names for proximity search; geocode profiles saved before it existed
+    await geocode_lawyer_profiles()
+    
+    # Build the public lawyer directory, then keep rebuilding it in the background
+    await rebuild_lawyer_directory()
+    await build_directory_indexes()
+    directory_task = asyncio.create_task(lawyer_directory.run_directory_worker(get_database))
+    rank_task = asyncio.create_task(lawyer_rank.run_rank_worker(get_database))
+    
+    # Keep conversation summaries up to date in the background
+    summary_task = asyncio.create_task(run_summary_worker(get_database)) if SUMMARY_ENABLED else None
+    
+    # Real-time events (relayed through Redis when configured) and presence expiry
+    await event_bus.start()
+    presence_task = asyncio.create_task(presence_registry.run_sweeper())
+    
     yield
     # Shutdown
+    if summary_task:
+        summary_task.cancel()
+    presence_task.cancel()
+    directory_task.cancel()
+    rank_task.cancel()
+    await event_bus.stop()
+    await flush_all()
     await close_mongo_connection()
 
+async def geocode_lawyer_profiles():
+    """Load the gazetteer and give every lawyer profile it can place a geo point"""
+    try:
+        get_gazetteer()
+        db = get_database()
+        if db is None:
+            return
+        updated = await geocode_profiles(db)
+        if updated:
+            print(f"✅ Geocoded {updated} lawyer profiles")
+    except Exception as e:
+        print(f"⚠️ Error geocoding lawyer profiles: {e}")
+
+async def rebuild_lawyer_directory():
+    """Rebuild the lawyer directory read model at startup"""
+    try:
+        db = get_database()
+        if db is None:
+            return
+        await lawyer_directory.rebuild_directory(db)
+        print("✅ Lawyer directory rebuilt")
+    except Exception as e:
+        print(f"⚠️ Error rebuilding lawyer directory: {e}")
+
+async def build_directory_indexes():
+    """Build the in-memory directory indexes and follow directory changes"""
+    try:
+        suggest_index.attach(get_database)
+        name_index.attach(get_database)
+        directory_snapshot.attach(get_database)
+        db = get_database()
+        if db is None:
+            return
+        await suggest_index.rebuild(db)
+        await name_index.rebuild(db)
+        await directory_snapshot.rebuild(db)
+        print(
+            f"✅ Directory indexes built ({len(suggest_index)} suggest terms, {len(name_index)} names, "
+            f"{len(directory_snapshot)} profiles in the filter snapshot)"
+        )
+    except Exception as e:
+        print(f"⚠️ Error building directory indexes: {e}")
+
 async def create_initial_users():
     """Create test users if database is empty"""
     try:
@@ -122,6 +206,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 304 Not Modified for unchanged GET responses (endpoints add cheap version-based ETags)
+app.add_middleware(ConditionalGetMiddleware)
+
 # Include routers FIRST - before any catch-all routes
 print("📋 Including API routers...")
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
@@ -138,6 +225,8 @@ app.include_router(messages.router, prefix="/api/messages", tags=["Messages"])
 print("   ✅ Messages router included")
 app.include_router(ai_matching.router, prefix="/api/ai", tags=["AI Services"])
 print("   ✅ AI matching router included")
+app.include_router(sync.router, prefix="/api", tags=["Sync"])
+print("   ✅ Sync router included")
 print("🎉 All routers included successfully!")
 
 # API root endpoint
@@ -418,6 +507,7 @@ async def signup(signup_data: dict):
                 "years_experience": int(signup_data.get("years_experience", 0)),
                 "hourly_rate": float(signup_data.get("hourly_rate", 0)) if signup_data.get("hourly_rate") else None,
                 "bio": signup_data.get("bio", ""),
+                "location": signup_data.get("location", ""),
                 "specializations": signup_data.get("specializations", []),
                 "education": [],
                 "certifications": [],
@@ -431,7 +521,12 @@ async def signup(signup_data: dict):
                 "created_at": datetime.utcnow(),
                 "updated_at": datetime.utcnow()
             }
+            geo = profile_point(lawyer_profile["location"], lawyer_profile["bar_state"])
+            if geo:
+                lawyer_profile["geo"] = geo
+            lawyer_profile.update(lawyer_rank.rank_fields(lawyer_profile))
             await db.lawyers.insert_one(lawyer_profile)
+            await lawyer_directory.refresh_lawyer(db, result.inserted_id)
             print(f"✅ Lawyer profile created")
         
         # Return success response (without password hash)
@@ -483,6 +578,15 @@ async def send_lawyer_request(request_data: dict, authorization: str = None):
             if not request_data.get(field):
                 raise HTTPException(status_code=400, detail=f"{field} is required")
         
+        # Spam / abuse screening of the free-text fields
+        screening = check_text(
+            request_data["title"],
+            request_data["description"],
+            request_data.get("additional_notes")
+        )
+        if not screening.allowed:
+            raise HTTPException(status_code=400, detail="Request was blocked by the content filter")
+        
         # TODO: Extract client_id from JWT token
         # For now, we'll determine the client from the login context
         # In a real implementation, this would come from the JWT token
@@ -532,6 +636,9 @@ async def send_lawyer_request(request_data: dict, authorization: str = None):
             "meeting_slots": None,
             "selected_meeting": None
         }
+        if screening.as_moderation():
+            request_doc["moderation"] = screening.as_moderation()
+            print(f"🚩 Request flagged by content filter: {screening.reasons}")  # Debug
         
         print(f"💾 Inserting request for lawyer: {lawyer['email']}")  # Debug
         
@@ -545,6 +652,8 @@ async def send_lawyer_request(request_data: dict, authorization: str = None):
             "lawyer_name": f"{lawyer['first_name']} {lawyer['last_name']}"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error in send_lawyer_request: {e}")  # Debug
         import traceback
@@ -725,10 +834,14 @@ async def respond_to_request(request_id: str, response_data: dict):
         if action == "accept" and response_data.get("meeting_slots"):
             update_data["meeting_slots"] = response_data["meeting_slots"]
         
-        await db.lawyer_requests.update_one(
-            {"_id": request_obj_id},
+        # Written directly: the response must land before the rank update and
+        # welcome message, and a concurrent response must not be overwritten
+        result = await db.lawyer_requests.update_one(
+            {"_id": request_obj_id, "status": "pending"},
             {"$set": update_data}
         )
+        if result.matched_count == 0:
+            raise HTTPException(status_code=409, detail="Request was already responded to")
         
         print(f"✅ Request {action}ed successfully")  # Debug
         
@@ -747,7 +860,7 @@ async def respond_to_request(request_id: str, response_data: dict):
                     "created_at": datetime.utcnow(),
                     "updated_at": datetime.utcnow()
                 }
-                await db.messages.insert_one(welcome_message)
+                await message_store.insert_message(db, welcome_message)
                 print("💬 Welcome message sent to start conversation")
         
         return {"message": f"Request {action}ed successfully"}
@@ -759,51 +872,67 @@ async def respond_to_request(request_id: str, response_data: dict):
         raise HTTPException(status_code=500, detail=f"Error responding to request: {str(e)}")
 
 # Get lawyers with profiles - dedicated endpoint to avoid router conflicts
+# Serialized /api/public/lawyers bodies, dropped whenever a directory entry changes
+public_lawyers_cache = ResponseCache()
+lawyer_directory.on_directory_change(lambda event: public_lawyers_cache.invalidate())
+
+def batch_ids(ids) -> list:
+    """Requested lawyer ids in order, blanks dropped; too many is a 400"""
+    ids = [str(lawyer_id).strip() for lawyer_id in ids if str(lawyer_id).strip()]
+    if len(ids) > PUBLIC_BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {PUBLIC_BATCH_MAX_IDS} ids per request")
+    return ids
+
 @app.get("/api/public/lawyers")
-async def get_all_lawyers_public():
-    """Get all lawyers with their profiles - public endpoint"""
+async def get_all_lawyers_public(request: Request, response: Response, ids: Optional[str] = None):
+    """Get all lawyers with their profiles - public endpoint (?ids=a,b,c for just those, in that order)"""
     try:
         db = get_database()
         
-        # Join users and lawyers collections
-        pipeline = [
-            {
-                "$lookup": {
-                    "from": "lawyers",
-                    "localField": "_id",
-                    "foreignField": "user_id",
-                    "as": "profile"
-                }
-            },
-            {
-                "$match": {
-                    "user_type": "lawyer",
-                    "profile": {"$ne": []}
-                }
-            }
-        ]
-        
-        lawyers = []
-        async for lawyer in db.users.aggregate(pipeline):
-            profile = lawyer["profile"][0] if lawyer["profile"] else {}
-            
-            lawyer_data = {
-                "id": str(lawyer["_id"]),
-                "first_name": lawyer["first_name"],
-                "last_name": lawyer["last_name"],
-                "email": lawyer["email"],
-                "specializations": profile.get("specializations", []),
-                "rating": profile.get("rating", 0.0),
-                "years_experience": profile.get("years_experience", 0),
-                "hourly_rate": profile.get("hourly_rate"),
-                "law_firm": profile.get("law_firm", ""),
-                "bio": profile.get("bio", ""),
-                "availability_status": profile.get("availability_status", "available")
-            }
-            lawyers.append(lawyer_data)
-        
-        return {"lawyers": lawyers}
+        if ids is not None:
+            # Comparison views: one batch instead of a call per lawyer
+            lawyers = await public_profiles(db, batch_ids(ids.split(",")))
+            body = json.dumps({"lawyers": lawyers}).encode()
+            etag = body_etag(body)
+            not_modified = check_not_modified(request, response, etag, private=False)
+            if not_modified:
+                return not_modified
+            return Response(content=body, media_type="application/json", headers=validator_headers(etag, private=False))
+        
+        async def build():
+            # Served from the lawyer_directory read model, no join per request
+            lawyers = await lawyer_directory.list_directory(db)
+            return json.dumps({"lawyers": lawyers}).encode()
+        
+        cached = await public_lawyers_cache.get(
+            cache_key(request.url.path, request.url.query), build
+        )
+        not_modified = check_not_modified(request, response, cached.etag, private=False)
+        if not_modified:
+            return not_modified
+        
+        return Response(
+            content=cached.body,
+            media_type="application/json",
+            headers=validator_headers(cached.etag, private=False)
+        )
         
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching lawyers: {str(e)}")
+
+@app.post("/api/public/lawyers")
+async def get_lawyers_by_ids_public(request_data: dict):
+    """Same as GET ?ids= for lists too long for a URL: {"ids": [...]}"""
+    ids = request_data.get("ids")
+    if not isinstance(ids, list):
+        raise HTTPException(status_code=400, detail="ids must be a list of lawyer ids")
+    try:
+        db = get_database()
+        return {"lawyers": await public_profiles(db, batch_ids(ids))}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching lawyers: {str(e)}")
 
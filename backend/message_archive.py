@@ -0,0 +1,234 @@
+"""
+Cold storage for inactive J.A.I conversations
+
+Conversations idle for ARCHIVE_IDLE_DAYS are packed into a single compressed
+BSON blob in the message_archive collection and removed from the hot message
+store, so closed matters stop weighing on the messages indexes. Reads
+rehydrate the blob transparently (with a small per-worker LRU of recently
+opened threads, invalidated over the event bus on ARCHIVE_TOPIC),
+search unpacks the archives of the conversations it covers, and a new message
+moves the conversation back into the hot store.
+"""
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from bson import BSON, Binary, ObjectId
+import os
+import zlib
+import logging
+
+import message_store
+from events import event_bus
+from text_analysis import analyze
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; zlib is always available
+    zstandard = None
+
+# Archive configuration
+ARCHIVE_IDLE_DAYS = int(os.getenv("ARCHIVE_IDLE_DAYS", "90"))
+ARCHIVE_CACHE_SIZE = int(os.getenv("ARCHIVE_CACHE_SIZE", "32"))
+ARCHIVE_CODEC = os.getenv("ARCHIVE_CODEC", "zstd" if zstandard else "zlib").lower()
+
+# Event carrying {"request_id": ...} when a conversation is archived or restored
+ARCHIVE_TOPIC = "archive:changed"
+
+def compress(payload: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(payload)
+    return zlib.compress(payload, 9)
+
+def decompress(blob: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Archive was written with zstd but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return zlib.decompress(blob)
+
+def pack_messages(messages: List[dict]) -> Dict:
+    """Serialize a conversation to compressed BSON"""
+    codec = ARCHIVE_CODEC if (ARCHIVE_CODEC != "zstd" or zstandard) else "zlib"
+    entries = [message_store.to_entry(message) for message in messages]
+    raw = BSON.encode({"messages": entries})
+    return {
+        "codec": codec,
+        "raw_size": len(raw),
+        "blob": Binary(compress(raw, codec))
+    }
+
+def unpack_messages(archive_doc: dict) -> List[dict]:
+    """Inverse of pack_messages; returns regular message documents"""
+    raw = decompress(bytes(archive_doc["blob"]), archive_doc["codec"])
+    entries = BSON(raw).decode()["messages"]
+    return [message_store.from_entry(entry, archive_doc["_id"]) for entry in entries]
+
+class ArchiveCache:
+    """Least-recently-used cache of rehydrated conversations"""
+
+    def __init__(self, max_size: int = ARCHIVE_CACHE_SIZE):
+        self.max_size = max_size
+        self._items: "OrderedDict[ObjectId, List[dict]]" = OrderedDict()
+
+    def get(self, request_id: ObjectId) -> Optional[List[dict]]:
+        messages = self._items.get(request_id)
+        if messages is not None:
+            self._items.move_to_end(request_id)
+        return messages
+
+    def put(self, request_id: ObjectId, messages: List[dict]):
+        self._items[request_id] = messages
+        self._items.move_to_end(request_id)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def evict(self, request_id: ObjectId):
+        self._items.pop(request_id, None)
+
+archive_cache = ArchiveCache()
+event_bus.on(ARCHIVE_TOPIC, lambda event: archive_cache.evict(ObjectId(event["request_id"])))
+
+async def notify_changed(request_id: ObjectId):
+    """Drop the conversation from every worker's archive cache"""
+    await event_bus.publish(ARCHIVE_TOPIC, {"request_id": str(request_id)})
+
+async def create_archive_indexes(db):
+    """Indexes for the archive and for finding idle conversations"""
+    await db.message_archive.create_index("archived_at")
+    await db.lawyer_requests.create_index([("messages_archived", 1), ("updated_at", 1)])
+
+async def archive_conversation(db, request_id: ObjectId, idle_before: Optional[datetime] = None) -> int:
+    """Pack one conversation into the archive; returns the number of messages archived.
+
+    With idle_before, the conversation is only switched to the archive while
+    its request has not been touched since then.
+    """
+    messages = await message_store.read_messages(db, request_id)
+    if not messages:
+        return 0
+    packed_ids = [message["_id"] for message in messages]
+
+    # Fold in anything archived earlier so one conversation has one blob
+    existing = await db.message_archive.find_one({"_id": request_id})
+    if existing:
+        messages = unpack_messages(existing) + messages
+
+    packed = pack_messages(messages)
+    last = messages[-1]
+    await db.message_archive.replace_one(
+        {"_id": request_id},
+        {
+            "_id": request_id,
+            **packed,
+            "message_count": len(messages),
+            "last_message": message_store.to_entry(last),
+            "last_message_at": last["created_at"],
+            "archived_at": datetime.utcnow()
+        },
+        upsert=True
+    )
+
+    # Only drop the hot copy once the archive is safely written, and only the
+    # messages that went into it
+    still_idle = {"_id": request_id}
+    if idle_before is not None:
+        still_idle["updated_at"] = {"$lt": idle_before}
+    result = await db.lawyer_requests.update_one(still_idle, {"$set": {"messages_archived": True}})
+    if not result.matched_count:
+        # Active again before the switch: keep serving the hot copy
+        await restore_conversation(db, request_id)
+        logger.info(f"Conversation {request_id} became active while archiving; left in the hot store")
+        return 0
+    await message_store.delete_messages(db, request_id, packed_ids)
+    await notify_changed(request_id)
+
+    if await message_store.last_message(db, request_id):
+        # A message arrived while archiving: the conversation is active again
+        await restore_conversation(db, request_id)
+        logger.info(f"Conversation {request_id} got a new message while archiving; restored")
+        return 0
+    return len(messages)
+
+async def archive_idle_conversations(db, idle_days: int = ARCHIVE_IDLE_DAYS) -> Dict[str, int]:
+    """Archive every conversation whose request has not changed for idle_days"""
+    cutoff = datetime.utcnow() - timedelta(days=idle_days)
+    stats = {"conversations": 0, "messages": 0}
+
+    async for request in db.lawyer_requests.find(
+        {"messages_archived": {"$ne": True}, "updated_at": {"$lt": cutoff}},
+        {"_id": 1}
+    ):
+        archived = await archive_conversation(db, request["_id"], idle_before=cutoff)
+        if archived:
+            stats["conversations"] += 1
+            stats["messages"] += archived
+            logger.info(f"Archived {archived} messages of conversation {request['_id']}")
+    return stats
+
+async def load_archived_messages(db, request_id: ObjectId) -> List[dict]:
+    """Rehydrate an archived conversation, oldest message first"""
+    messages = archive_cache.get(request_id)
+    if messages is not None:
+        return messages
+
+    archive_doc = await db.message_archive.find_one({"_id": request_id})
+    messages = unpack_messages(archive_doc) if archive_doc else []
+    archive_cache.put(request_id, messages)
+    return messages
+
+async def read_archived_conversation(db, request_id: ObjectId) -> List[dict]:
+    """An archived conversation plus any message that reached the hot store
+    while it was being archived (until the next send restores it)"""
+    archived = await load_archived_messages(db, request_id)
+    hot = await message_store.read_messages(db, request_id)
+    if not hot:
+        return archived
+    known = {message["_id"] for message in archived}
+    merged = archived + [message for message in hot if message["_id"] not in known]
+    merged.sort(key=lambda message: message["created_at"])
+    return merged
+
+async def search_archived(db, request_ids: List[ObjectId], query: str) -> List[dict]:
+    """Messages of the archived conversations among request_ids matching query, newest first.
+
+    Terms are stemmed and matched as in bucketed message search. Archives have
+    no text index, so hits carry no relevance score (0).
+    """
+    wanted, excluded = message_store.search_terms(query)
+    if not wanted or not request_ids:
+        return []
+
+    hits = []
+    async for archive_doc in db.message_archive.find({"_id": {"$in": request_ids}}):
+        # Not cached: a search touches many threads nobody is reading
+        messages = archive_cache.get(archive_doc["_id"]) or unpack_messages(archive_doc)
+        for position, message in enumerate(messages):
+            content = message.get("content") or ""
+            if not message_store.matches_terms(wanted, content) or excluded & set(analyze(content)):
+                continue
+            hits.append({**message, "position": position, "score": 0.0})
+    hits.sort(key=lambda hit: hit["created_at"], reverse=True)
+    return hits
+
+async def last_archived_message(db, request_id: ObjectId) -> Optional[dict]:
+    """Last message of an archived conversation without decompressing it"""
+    archive_doc = await db.message_archive.find_one({"_id": request_id}, {"last_message": 1})
+    if not archive_doc or not archive_doc.get("last_message"):
+        return None
+    return message_store.from_entry(archive_doc["last_message"], request_id)
+
+async def restore_conversation(db, request_id: ObjectId):
+    """Move an archived conversation back into the hot store (safe to run concurrently)"""
+    archive_doc = await db.message_archive.find_one({"_id": request_id})
+    if archive_doc:
+        await message_store.restore_messages(db, request_id, unpack_messages(archive_doc))
+        await db.message_archive.delete_one({"_id": request_id})
+
+    await db.lawyer_requests.update_one(
+        {"_id": request_id},
+        {"$unset": {"messages_archived": ""}}
+    )
+    await notify_changed(request_id)
@@ -0,0 +1,527 @@
+"""
+Message storage for J.A.I conversations
+
+Messages can be stored one document per chat line (the original layout) or in
+bucket documents that group up to MESSAGE_BUCKET_SIZE messages of the same day
+for one conversation. Buckets keep the index footprint proportional to the
+number of buckets instead of the number of messages, and a history page reads a
+handful of bucket documents instead of hundreds of message documents.
+
+The router talks to this module only, so the storage mode can be switched with
+MESSAGE_STORAGE_MODE once migrate_messages_to_buckets.py has been run.
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+from bson import ObjectId
+from pymongo import ReplaceOne, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+import os
+import logging
+
+from text_analysis import analyze
+
+logger = logging.getLogger(__name__)
+
+# Storage configuration
+STORAGE_MODE_DOCUMENTS = "documents"
+STORAGE_MODE_BUCKETS = "buckets"
+MESSAGE_STORAGE_MODE = os.getenv("MESSAGE_STORAGE_MODE", STORAGE_MODE_DOCUMENTS).lower()
+MESSAGE_BUCKET_SIZE = int(os.getenv("MESSAGE_BUCKET_SIZE", "200"))
+
+# Upper bound on matching buckets expanded per search in bucket mode
+SEARCH_BUCKET_SCAN_LIMIT = 500
+
+# Fields copied into a bucket entry; request_id lives on the bucket itself
+ENTRY_FIELDS = (
+    "_id", "sender_id", "sender_type", "content", "message_type",
+    "file_url", "file_name", "is_read", "created_at", "updated_at", "moderation"
+)
+
+def is_bucketed() -> bool:
+    """True when messages are stored in bucket documents"""
+    return MESSAGE_STORAGE_MODE == STORAGE_MODE_BUCKETS
+
+def day_start(moment: datetime) -> datetime:
+    """Midnight (UTC) of the day a message was sent"""
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def to_entry(message_doc: dict) -> dict:
+    """Strip a message document down to what is stored inside a bucket"""
+    return {field: message_doc.get(field) for field in ENTRY_FIELDS}
+
+def from_entry(entry: dict, request_id: ObjectId) -> dict:
+    """Turn a bucket entry back into a regular message document"""
+    message = dict(entry)
+    message["request_id"] = request_id
+    return message
+
+def build_buckets(request_id: ObjectId, messages: List[dict]) -> List[dict]:
+    """Group chronologically sorted messages into bucket documents"""
+    buckets = []
+    current = None
+    for message in messages:
+        created_at = message["created_at"]
+        if (current is None
+                or current["count"] >= MESSAGE_BUCKET_SIZE
+                or current["bucket_day"] != day_start(created_at)):
+            current = {
+                "request_id": request_id,
+                "bucket_start": created_at,
+                "bucket_day": day_start(created_at),
+                "count": 0,
+                "last_at": created_at,
+                "messages": [],
+                "updated_at": datetime.utcnow()
+            }
+            buckets.append(current)
+        current["messages"].append(to_entry(message))
+        current["count"] += 1
+        current["last_at"] = max(current["last_at"], created_at)
+    return buckets
+
+async def create_bucket_indexes(db):
+    """Indexes for the bucketed layout"""
+    await db.message_buckets.create_index([("request_id", 1), ("bucket_start", 1)], unique=True)
+    await db.message_buckets.create_index("messages._id")
+    await db.message_buckets.create_index([("messages.content", "text")])
+    await db.message_buckets.create_index([("request_id", 1), ("updated_at", 1)])
+
+async def insert_message(db, message_doc: dict) -> ObjectId:
+    """Store a new message and return its id"""
+    if not is_bucketed():
+        result = await db.messages.insert_one(message_doc)
+        return result.inserted_id
+
+    message_doc.setdefault("_id", ObjectId())
+    await append_to_bucket(db, message_doc)
+    return message_doc["_id"]
+
+async def append_to_bucket(db, message_doc: dict):
+    """Append a message to the conversation's open bucket, opening a new one when needed"""
+    request_id = message_doc["request_id"]
+    created_at = message_doc["created_at"]
+    entry = to_entry(message_doc)
+
+    for _ in range(3):
+        latest = await db.message_buckets.find_one(
+            {"request_id": request_id},
+            {"count": 1, "bucket_day": 1},
+            sort=[("bucket_start", -1)]
+        )
+
+        if (latest and latest["count"] < MESSAGE_BUCKET_SIZE
+                and latest["bucket_day"] == day_start(created_at)):
+            result = await db.message_buckets.update_one(
+                {"_id": latest["_id"], "count": {"$lt": MESSAGE_BUCKET_SIZE}},
+                {
+                    "$push": {"messages": entry},
+                    "$inc": {"count": 1},
+                    "$max": {"last_at": created_at},
+                    "$set": {"updated_at": datetime.utcnow()}
+                }
+            )
+            if result.modified_count:
+                return
+            # The bucket filled up between the read and the write; look again
+            continue
+
+        try:
+            await db.message_buckets.insert_one(build_buckets(request_id, [message_doc])[0])
+            return
+        except DuplicateKeyError:
+            # Another writer opened a bucket with the same start time; retry against it
+            continue
+
+    raise RuntimeError(f"Could not append message to a bucket for conversation {request_id}")
+
+async def read_messages(
+    db,
+    request_id: ObjectId,
+    offset: int = 0,
+    limit: Optional[int] = None
+) -> List[dict]:
+    """Read a conversation oldest first, optionally as a window of messages"""
+    if not is_bucketed():
+        cursor = db.messages.find({"request_id": request_id}).sort("created_at", 1).skip(offset)
+        if limit:
+            cursor = cursor.limit(limit)
+        return await cursor.to_list(length=None)
+
+    # Walk the bucket headers to find which buckets overlap the window
+    end = offset + limit if limit else None
+    wanted = []
+    position = 0
+    async for header in db.message_buckets.find(
+        {"request_id": request_id}, {"count": 1}
+    ).sort("bucket_start", 1):
+        bucket_end = position + header["count"]
+        if bucket_end > offset and (end is None or position < end):
+            wanted.append((header["_id"], position))
+        position = bucket_end
+        if end is not None and position >= end:
+            break
+
+    if not wanted:
+        return []
+
+    bucket_offsets = dict(wanted)
+    buckets = await db.message_buckets.find(
+        {"_id": {"$in": list(bucket_offsets.keys())}}
+    ).sort("bucket_start", 1).to_list(length=None)
+
+    messages = []
+    for bucket in buckets:
+        first_position = bucket_offsets[bucket["_id"]]
+        for index, entry in enumerate(bucket["messages"]):
+            absolute = first_position + index
+            if absolute < offset or (end is not None and absolute >= end):
+                continue
+            messages.append(from_entry(entry, request_id))
+    return messages
+
+async def last_message(db, request_id: ObjectId) -> Optional[dict]:
+    """Most recent message of a conversation"""
+    if not is_bucketed():
+        return await db.messages.find_one({"request_id": request_id}, sort=[("created_at", -1)])
+
+    bucket = await db.message_buckets.find_one(
+        {"request_id": request_id},
+        {"messages": {"$slice": -1}},
+        sort=[("bucket_start", -1)]
+    )
+    if not bucket or not bucket.get("messages"):
+        return None
+    return from_entry(bucket["messages"][-1], request_id)
+
+async def count_unread(db, request_id: ObjectId, user_id: ObjectId) -> int:
+    """Messages in a conversation the user has not read yet"""
+    if not is_bucketed():
+        return await db.messages.count_documents({
+            "request_id": request_id,
+            "sender_id": {"$ne": user_id},
+            "is_read": False
+        })
+
+    pipeline = [
+        {"$match": {"request_id": request_id}},
+        {"$unwind": "$messages"},
+        {"$match": {"messages.sender_id": {"$ne": user_id}, "messages.is_read": False}},
+        {"$count": "unread"}
+    ]
+    result = await db.message_buckets.aggregate(pipeline).to_list(length=1)
+    return result[0]["unread"] if result else 0
+
+async def mark_conversation_read(db, request_id: ObjectId, user_id: ObjectId):
+    """Mark every message the user received in a conversation as read"""
+    now = datetime.utcnow()
+    if not is_bucketed():
+        await db.messages.update_many(
+            {
+                "request_id": request_id,
+                "sender_id": {"$ne": user_id},
+                "is_read": False
+            },
+            {"$set": {"is_read": True, "updated_at": now}}
+        )
+        return
+
+    unread = {"sender_id": {"$ne": user_id}, "is_read": False}
+    await db.message_buckets.update_many(
+        {"request_id": request_id, "messages": {"$elemMatch": unread}},
+        {"$set": {
+            "messages.$[m].is_read": True,
+            "messages.$[m].updated_at": now,
+            "updated_at": now
+        }},
+        array_filters=[{"m.sender_id": {"$ne": user_id}, "m.is_read": False}]
+    )
+
+async def mark_read(db, message_ids: List[ObjectId], user_id: ObjectId) -> int:
+    """Mark specific messages (not sent by the user) as read; returns how many changed"""
+    now = datetime.utcnow()
+    if not is_bucketed():
+        result = await db.messages.update_many(
+            {
+                "_id": {"$in": message_ids},
+                "sender_id": {"$ne": user_id},
+                "is_read": False
+            },
+            {"$set": {"is_read": True, "updated_at": now}}
+        )
+        return result.modified_count
+
+    # update_many reports buckets, so count the affected messages first
+    pipeline = [
+        {"$match": {"messages._id": {"$in": message_ids}}},
+        {"$unwind": "$messages"},
+        {"$match": {
+            "messages._id": {"$in": message_ids},
+            "messages.sender_id": {"$ne": user_id},
+            "messages.is_read": False
+        }},
+        {"$count": "pending"}
+    ]
+    result = await db.message_buckets.aggregate(pipeline).to_list(length=1)
+    pending = result[0]["pending"] if result else 0
+
+    if pending:
+        await db.message_buckets.update_many(
+            {"messages._id": {"$in": message_ids}},
+            {"$set": {
+                "messages.$[m].is_read": True,
+                "messages.$[m].updated_at": now,
+                "updated_at": now
+            }},
+            array_filters=[{
+                "m._id": {"$in": message_ids},
+                "m.sender_id": {"$ne": user_id},
+                "m.is_read": False
+            }]
+        )
+    return pending
+
+async def changed_messages(
+    db,
+    request_ids: List[ObjectId],
+    since: datetime,
+    limit: int,
+    after_id: Optional[ObjectId] = None
+) -> List[dict]:
+    """Messages created or updated (e.g. read) after since, oldest change first.
+
+    Ties on updated_at are ordered by _id; pass the last (updated_at, _id)
+    returned as (since, after_id) to continue a page without skipping the
+    rest of a tie (one read receipt stamps many messages with the same time).
+    """
+    if not request_ids:
+        return []
+    if not is_bucketed():
+        query: Dict = {"request_id": {"$in": request_ids}, "updated_at": {"$gt": since}}
+        if after_id is not None:
+            query["updated_at"] = {"$gte": since}
+            query["$or"] = [{"updated_at": {"$gt": since}}, {"_id": {"$gt": after_id}}]
+        cursor = db.messages.find(query).sort([("updated_at", 1), ("_id", 1)]).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    # A bucket's updated_at moves on every append and read receipt
+    position = (since, after_id) if after_id is not None else None
+    messages = []
+    async for bucket in db.message_buckets.find(
+        {"request_id": {"$in": request_ids}, "updated_at": {"$gte" if position else "$gt": since}},
+        {"request_id": 1, "messages": 1}
+    ):
+        for entry in bucket["messages"]:
+            changed_at = entry.get("updated_at")
+            if not changed_at or changed_at < since:
+                continue
+            if changed_at > since or (position and entry["_id"] > after_id):
+                messages.append(from_entry(entry, bucket["request_id"]))
+    messages.sort(key=lambda message: (message["updated_at"], message["_id"]))
+    return messages[:limit]
+
+async def latest_change(db, request_ids: List[ObjectId]) -> Optional[datetime]:
+    """When a message in these conversations was last sent or read (a cheap version key)"""
+    if not request_ids:
+        return None
+    collection = db.message_buckets if is_bucketed() else db.messages
+    latest = await collection.find(
+        {"request_id": {"$in": request_ids}}, {"updated_at": 1}
+    ).sort("updated_at", -1).limit(1).to_list(length=1)
+    return latest[0].get("updated_at") if latest else None
+
+def search_terms(query: str) -> Tuple[Set[str], Set[str]]:
+    """Stemmed (wanted, excluded) terms of a $text style query; "-word" excludes"""
+    words = query.split()
+    wanted = set(analyze(" ".join(word for word in words if not word.startswith("-"))))
+    excluded = set(analyze(" ".join(word[1:] for word in words if word.startswith("-"))))
+    return wanted, excluded
+
+def matches_terms(terms: Set[str], content: str) -> bool:
+    """Whether content has one of the stemmed terms; prefixes count, as stemmers differ on edge cases"""
+    return any(
+        word == term or (min(len(word), len(term)) >= 3 and (word.startswith(term) or term.startswith(word)))
+        for word in set(analyze(content)) for term in terms
+    )
+
+async def search(
+    db,
+    request_ids: List[ObjectId],
+    query: str,
+    skip: int,
+    limit: int
+) -> Tuple[int, List[dict]]:
+    """Text search in the given conversations; returns (total, hits) with score and position"""
+    if not is_bucketed():
+        search_query = {
+            "$text": {"$search": query},
+            "request_id": {"$in": request_ids}
+        }
+        total = await db.messages.count_documents(search_query)
+
+        cursor = db.messages.find(
+            search_query,
+            {"score": {"$meta": "textScore"}, "request_id": 1, "sender_id": 1,
+             "sender_type": 1, "content": 1, "created_at": 1}
+        ).sort([("score", {"$meta": "textScore"}), ("created_at", -1)])
+        hits = await cursor.skip(skip).limit(limit).to_list(length=limit)
+
+        for hit in hits:
+            # Position within the conversation, served by the request_id + created_at index
+            hit["position"] = await db.messages.count_documents({
+                "request_id": hit["request_id"],
+                "created_at": {"$lt": hit["created_at"]}
+            })
+        return total, hits
+
+    # Buckets match as a whole, so expand them to the messages that contain a
+    # term, stemmed as $text stems them ("contract" finds "contracting")
+    terms, _ = search_terms(query)
+    cursor = db.message_buckets.find(
+        {"$text": {"$search": query}, "request_id": {"$in": request_ids}},
+        {"score": {"$meta": "textScore"}, "request_id": 1, "bucket_start": 1, "messages": 1}
+    ).sort([("score", {"$meta": "textScore"})]).limit(SEARCH_BUCKET_SCAN_LIMIT)
+
+    hits = []
+    first_positions: Dict[ObjectId, int] = {}
+    async for bucket in cursor:
+        for index, entry in enumerate(bucket["messages"]):
+            if not matches_terms(terms, entry.get("content") or ""):
+                continue
+            hit = from_entry(entry, bucket["request_id"])
+            hit["score"] = bucket.get("score", 0.0)
+            hit["_bucket"] = (bucket["request_id"], bucket["bucket_start"], index)
+            hits.append(hit)
+
+    hits.sort(key=lambda hit: (-hit["score"], -hit["created_at"].timestamp()))
+    total = len(hits)
+    page = hits[skip:skip + limit]
+
+    for hit in page:
+        request_id, bucket_start, index = hit.pop("_bucket")
+        key = (request_id, bucket_start)
+        if key not in first_positions:
+            before = await db.message_buckets.aggregate([
+                {"$match": {"request_id": request_id, "bucket_start": {"$lt": bucket_start}}},
+                {"$group": {"_id": None, "messages": {"$sum": "$count"}}}
+            ]).to_list(length=1)
+            first_positions[key] = before[0]["messages"] if before else 0
+        hit["position"] = first_positions[key] + index
+    return total, page
+
+async def delete_messages(db, request_id: ObjectId, message_ids: List[ObjectId]) -> int:
+    """Remove the given hot messages of a conversation; messages added since they were read stay"""
+    if not message_ids:
+        return 0
+    if not is_bucketed():
+        result = await db.messages.delete_many({"request_id": request_id, "_id": {"$in": message_ids}})
+        return result.deleted_count
+
+    wanted = set(message_ids)
+    removed = 0
+    async for bucket in db.message_buckets.find({"request_id": request_id}, {"messages._id": 1, "count": 1}):
+        ids = [entry["_id"] for entry in bucket["messages"]]
+        gone = [message_id for message_id in ids if message_id in wanted]
+        if not gone:
+            continue
+        if len(gone) == len(ids):
+            # Drop the whole bucket unless a message was appended since it was read
+            result = await db.message_buckets.delete_one({"_id": bucket["_id"], "count": bucket["count"]})
+            if result.deleted_count:
+                removed += len(gone)
+                continue
+        left = await db.message_buckets.find_one_and_update(
+            {"_id": bucket["_id"]},
+            {"$pull": {"messages": {"_id": {"$in": gone}}}, "$inc": {"count": -len(gone)}},
+            projection={"messages.created_at": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        removed += len(gone)
+        if not left["messages"]:
+            await db.message_buckets.delete_one({"_id": bucket["_id"], "count": 0})
+            continue
+        # Start the bucket at what is left, so restoring the removed messages cannot collide with it
+        try:
+            await db.message_buckets.update_one(
+                {"_id": bucket["_id"]},
+                {"$set": {"bucket_start": min(entry["created_at"] for entry in left["messages"])}}
+            )
+        except DuplicateKeyError:
+            pass
+    return removed
+
+async def restore_messages(db, request_id: ObjectId, messages: List[dict]):
+    """Write previously removed messages (oldest first) back into the hot store.
+
+    Idempotent: messages (or buckets) that are already there from a concurrent
+    restore of the same conversation are skipped.
+    """
+    if not messages:
+        return
+    try:
+        if not is_bucketed():
+            await db.messages.insert_many([from_entry(message, request_id) for message in messages], ordered=False)
+        else:
+            await db.message_buckets.insert_many(build_buckets(request_id, messages), ordered=False)
+    except BulkWriteError as e:
+        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+
+async def migrate_to_buckets(db) -> Dict[str, int]:
+    """Move per-message documents into buckets, one conversation at a time.
+
+    Safe to re-run: a conversation's existing buckets and loose messages are
+    merged and rebuilt in order, the new buckets written over the old ones (by
+    bucket_start) and only then is anything removed. A run that stops in
+    between leaves duplicates, which the next run merges away, never gaps.
+    """
+    stats = {"conversations": 0, "messages": 0, "buckets": 0}
+    for request_id in await db.messages.distinct("request_id"):
+        loose = await db.messages.find({"request_id": request_id}).to_list(length=None)
+        old_buckets = await db.message_buckets.find({"request_id": request_id}).to_list(length=None)
+
+        merged = {message["_id"]: message for message in loose}
+        for bucket in old_buckets:
+            for entry in bucket["messages"]:
+                merged.setdefault(entry["_id"], from_entry(entry, request_id))
+        ordered = sorted(merged.values(), key=lambda message: (message["created_at"], message["_id"]))
+
+        new_buckets = build_buckets(request_id, ordered)
+        if new_buckets:
+            await db.message_buckets.bulk_write([
+                ReplaceOne({"request_id": request_id, "bucket_start": bucket["bucket_start"]}, bucket, upsert=True)
+                for bucket in new_buckets
+            ], ordered=False)
+        starts = {bucket["bucket_start"] for bucket in new_buckets}
+        replaced = [bucket["_id"] for bucket in old_buckets if bucket["bucket_start"] not in starts]
+        if replaced:
+            await db.message_buckets.delete_many({"_id": {"$in": replaced}})
+        await db.messages.delete_many({"_id": {"$in": [m["_id"] for m in loose]}})
+
+        stats["conversations"] += 1
+        stats["messages"] += len(loose)
+        stats["buckets"] += len(new_buckets)
+        logger.info(f"Bucketed {len(loose)} messages of conversation {request_id}")
+    return stats
+
+async def migrate_to_documents(db) -> Dict[str, int]:
+    """Reverse migration: unpack buckets back into one document per message"""
+    stats = {"conversations": 0, "messages": 0, "buckets": 0}
+    for request_id in await db.message_buckets.distinct("request_id"):
+        buckets = await db.message_buckets.find({"request_id": request_id}).to_list(length=None)
+        existing = set(await db.messages.distinct("_id", {"request_id": request_id}))
+
+        messages = [
+            from_entry(entry, request_id)
+            for bucket in buckets
+            for entry in bucket["messages"]
+            if entry["_id"] not in existing
+        ]
+        if messages:
+            await db.messages.insert_many(messages)
+        await db.message_buckets.delete_many({"_id": {"$in": [b["_id"] for b in buckets]}})
+
+        stats["conversations"] += 1
+        stats["messages"] += len(messages)
+        stats["buckets"] += len(buckets)
+    return stats
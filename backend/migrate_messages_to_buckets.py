@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Migrate chat messages between per-message documents and bucket documents.
+
+Run before switching MESSAGE_STORAGE_MODE:
+    python migrate_messages_to_buckets.py            # messages -> message_buckets
+    python migrate_messages_to_buckets.py --reverse  # message_buckets -> messages
+"""
+import asyncio
+import sys
+from motor.motor_asyncio import AsyncIOMotorClient
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import message_store
+
+async def migrate_messages(reverse: bool = False):
+    """Move messages into (or out of) the bucketed layout"""
+
+    direction = "buckets → documents" if reverse else "documents → buckets"
+    print(f"📦 Migrating messages ({direction})...")
+    print(f"   Bucket size: {message_store.MESSAGE_BUCKET_SIZE} messages or one day")
+
+    # Connect to MongoDB
+    mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+    database_name = os.getenv("DATABASE_NAME", "jai_database")
+
+    client = AsyncIOMotorClient(mongodb_url)
+    db = client[database_name]
+
+    try:
+        await message_store.create_bucket_indexes(db)
+
+        before_messages = await db.messages.count_documents({})
+        before_buckets = await db.message_buckets.count_documents({})
+        print(f"📋 Before: {before_messages} message documents, {before_buckets} buckets")
+
+        if reverse:
+            stats = await message_store.migrate_to_documents(db)
+        else:
+            stats = await message_store.migrate_to_buckets(db)
+
+        after_messages = await db.messages.count_documents({})
+        after_buckets = await db.message_buckets.count_documents({})
+
+        print(f"\n🎉 Migrated {stats['messages']} messages across {stats['conversations']} conversations")
+        print(f"📊 After: {after_messages} message documents, {after_buckets} buckets")
+
+        mode = message_store.STORAGE_MODE_DOCUMENTS if reverse else message_store.STORAGE_MODE_BUCKETS
+        print(f"\n👉 Set MESSAGE_STORAGE_MODE={mode} and restart the API")
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    asyncio.run(migrate_messages(reverse="--reverse" in sys.argv))
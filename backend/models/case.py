@@ -98,7 +98,7 @@ class AIMatchInDB(AIMatch):
 
 class AIMatchResponse(BaseModel):
     id: str = Field(alias="_id")
-    case_id: str
+    case_id: Optional[str] = None  # None when matched against ad-hoc criteria
     lawyer_id: str
     match_score: float
     match_reasons: Dict[str, Any]
@@ -112,6 +112,11 @@ class AIMatchResponse(BaseModel):
     class Config:
         populate_by_name = True
 
+class AIRecommendationsResponse(BaseModel):
+    case_id: Optional[str] = None
+    matches: List[AIMatchResponse] = []
+    recommended_lawyers: List[Dict[str, Any]] = []  # Public directory entries plus match_score, best first
+
 class CaseSearchFilters(BaseModel):
     status: Optional[CaseStatus] = None
     category: Optional[str] = None
@@ -30,6 +30,7 @@ class LawyerProfile(BaseModel):
     years_experience: int = Field(..., ge=0)
     hourly_rate: Optional[float] = Field(None, ge=0)
     bio: Optional[str] = None
+    location: Optional[str] = None  # "City, State"; geocoded into geo for proximity search
     specializations: List[str] = []
     education: List[Education] = []
     certifications: List[Certification] = []
@@ -40,6 +41,7 @@ class LawyerProfile(BaseModel):
     total_cases: int = Field(default=0, ge=0)
     success_rate: float = Field(default=0.0, ge=0, le=100)
     ai_match_score: float = Field(default=0.0, ge=0, le=100)
+    rank_score: float = Field(default=0.0, ge=0, le=100)  # maintained by lawyer_rank
 
 class LawyerProfileCreate(BaseModel):
     bar_number: str = Field(..., min_length=1)
@@ -48,6 +50,7 @@ class LawyerProfileCreate(BaseModel):
     years_experience: int = Field(..., ge=0)
     hourly_rate: Optional[float] = Field(None, ge=0)
     bio: Optional[str] = None
+    location: Optional[str] = None
     specializations: List[str] = []
     education: List[Education] = []
     certifications: List[Certification] = []
@@ -57,6 +60,7 @@ class LawyerProfileUpdate(BaseModel):
     law_firm: Optional[str] = None
     hourly_rate: Optional[float] = Field(None, ge=0)
     bio: Optional[str] = None
+    location: Optional[str] = None
     specializations: Optional[List[str]] = None
     education: Optional[List[Education]] = None
     certifications: Optional[List[Certification]] = None
@@ -82,6 +86,7 @@ class LawyerResponse(BaseModel):
     years_experience: int
     hourly_rate: Optional[float]
     bio: Optional[str]
+    location: Optional[str] = None
     specializations: List[str]
     education: List[Education]
     certifications: List[Certification]
@@ -92,12 +97,18 @@ class LawyerResponse(BaseModel):
     total_cases: int
     success_rate: float
     ai_match_score: float
+    rank_score: float = 0.0
+    version: int = 0  # bumped by every profile update that changes something
     created_at: datetime
     updated_at: datetime
 
     class Config:
         populate_by_name = True
 
+class LawyerProfileUpdateResponse(BaseModel):
+    profile: LawyerResponse
+    changed: List[str] = []  # Fields the update actually changed (none: nothing was written)
+
 class LawyerSearchFilters(BaseModel):
     specializations: Optional[List[str]] = None
     min_experience: Optional[int] = None
@@ -105,4 +116,70 @@ class LawyerSearchFilters(BaseModel):
     min_rating: Optional[float] = None
     languages: Optional[List[str]] = None
     availability_status: Optional[AvailabilityStatus] = None
-    bar_state: Optional[str] = None
\ No newline at end of file
+    bar_state: Optional[str] = None
+    near: Optional[str] = None          # place name or "lat,lon"
+    radius_km: Optional[float] = None
+    q: Optional[str] = None             # full-text search over the profile
+    fuzzy: bool = False                 # q as a typo-tolerant name / firm search instead
+
+class LawyerSortOption(str, Enum):
+    RANK = "rank"  # rank_score: rating, success rate and responsiveness combined
+    RATING = "rating"
+    EXPERIENCE = "experience"
+    RATE = "rate"
+    DISTANCE = "distance"  # requires near
+    RELEVANCE = "relevance"  # requires q
+
+class LawyerCard(BaseModel):
+    """Public directory entry for a lawyer (id is the lawyer's user id)"""
+    id: str
+    first_name: str
+    last_name: str
+    law_firm: Optional[str] = None
+    bio: Optional[str] = None
+    bar_state: Optional[str] = None
+    location: Optional[str] = None
+    distance_km: Optional[float] = None  # only when searching near a place
+    score: Optional[float] = None        # only when sorted by relevance to q (higher is better)
+    specializations: List[str] = []
+    languages: List[str] = []
+    years_experience: int = 0
+    hourly_rate: Optional[float] = None
+    rating: float = 0.0
+    total_reviews: int = 0
+    availability_status: AvailabilityStatus = AvailabilityStatus.AVAILABLE
+
+class LawyerSearchResponse(BaseModel):
+    results: List[LawyerCard] = []
+    sort: LawyerSortOption
+    page_size: int
+    next_cursor: Optional[str] = None  # Pass back as ?cursor= for the next page
+
+class LawyerSuggestion(BaseModel):
+    type: str                        # "name", "firm" or "specialization"
+    text: str
+    rating: float                    # best rating among the lawyers behind it
+    count: int                       # lawyers behind it
+    lawyer_id: Optional[str] = None  # for names
+
+class LawyerSuggestResponse(BaseModel):
+    prefix: str
+    suggestions: List[LawyerSuggestion] = []
+
+class FacetCount(BaseModel):
+    value: str
+    count: int
+
+class RangeFacetCount(BaseModel):
+    min: Optional[float] = None  # inclusive; None for profiles without a value
+    max: Optional[float] = None  # exclusive; None means no upper bound
+    count: int
+
+class LawyerFacetsResponse(BaseModel):
+    """Counts per filter value; each facet ignores its own filter so alternatives stay visible"""
+    total: int
+    specializations: List[FacetCount] = []
+    bar_state: List[FacetCount] = []
+    languages: List[FacetCount] = []
+    experience: List[RangeFacetCount] = []
+    hourly_rate: List[RangeFacetCount] = []
@@ -76,4 +76,27 @@ class ConversationResponse(BaseModel):
     updated_at: datetime
 
 class MarkAsReadRequest(BaseModel):
-    message_ids: List[str]
\ No newline at end of file
+    message_ids: List[str]
+
+class PresenceHeartbeat(BaseModel):
+    request_id: Optional[str] = None  # Conversation the user is looking at
+    typing: Optional[bool] = None     # Typing state in that conversation
+
+class MessageSearchHit(BaseModel):
+    message_id: str
+    request_id: str
+    conversation_title: str
+    sender_id: str
+    sender_type: str
+    sender_name: str
+    snippet: str
+    position: int  # Zero-based index of the message within its conversation
+    score: float
+    created_at: datetime
+
+class MessageSearchResponse(BaseModel):
+    query: str
+    page: int
+    page_size: int
+    total: int
+    results: List[MessageSearchHit] = []
\ No newline at end of file
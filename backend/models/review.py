@@ -0,0 +1,23 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List
+from datetime import datetime
+
+class ReviewCreate(BaseModel):
+    request_id: str  # The accepted request the review is about
+    rating: int = Field(..., ge=1, le=5)
+    comment: Optional[str] = Field(None, max_length=2000)
+    successful: Optional[bool] = None  # Did the matter end the way the client hoped?
+
+class ReviewResponse(BaseModel):
+    id: str
+    lawyer_id: str
+    rating: int
+    comment: Optional[str] = None
+    successful: Optional[bool] = None
+    reviewer_name: str  # "First L."
+    created_at: datetime
+
+class ReviewListResponse(BaseModel):
+    reviews: List[ReviewResponse] = []
+    page_size: int
+    next_cursor: Optional[str] = None  # Pass back as ?cursor= for the next page
@@ -0,0 +1,159 @@
+"""
+Online presence and typing indicators for J.A.I conversations
+
+Held entirely in memory. Heartbeats (explicit ones, and an open live channel)
+refresh a user's entry; entries expire after PRESENCE_TTL_SECONDS, typing
+after TYPING_TTL_SECONDS. Every worker keeps its own replica: heartbeats are
+relayed to the other workers over the event bus and each worker derives the
+online / offline / typing events for its own live channels.
+
+Presence traffic never touches MongoDB. The only lookup is a conversation's
+participants, read once per worker and then cached (they never change).
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from bson import ObjectId
+import asyncio
+import os
+import time
+import logging
+
+from events import EventBus, conversation_topic, event_bus, user_topic
+
+logger = logging.getLogger(__name__)
+
+# Presence configuration
+PRESENCE_TTL_SECONDS = float(os.getenv("PRESENCE_TTL_SECONDS", "45"))
+TYPING_TTL_SECONDS = float(os.getenv("TYPING_TTL_SECONDS", "6"))
+PRESENCE_SWEEP_SECONDS = float(os.getenv("PRESENCE_SWEEP_SECONDS", "2"))
+PARTICIPANT_CACHE_SIZE = int(os.getenv("PARTICIPANT_CACHE_SIZE", "10000"))
+
+# Internal topic carrying raw heartbeats between workers
+HEARTBEAT_TOPIC = "presence:heartbeat"
+
+class ParticipantCache:
+    """Least-recently-used map of conversation id -> (client id, lawyer id)"""
+
+    def __init__(self, max_size: int = PARTICIPANT_CACHE_SIZE):
+        self.max_size = max_size
+        self._items: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+
+    def get(self, request_id: str) -> Optional[Tuple[str, str]]:
+        participants = self._items.get(request_id)
+        if participants is not None:
+            self._items.move_to_end(request_id)
+        return participants
+
+    def put(self, request_id: str, client_id: str, lawyer_id: str):
+        self._items[request_id] = (client_id, lawyer_id)
+        self._items.move_to_end(request_id)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+class PresenceRegistry:
+    """In-memory presence and typing state with TTL expiry"""
+
+    def __init__(self, bus: EventBus):
+        self.bus = bus
+        self.participants = ParticipantCache()
+        self._online: Dict[str, float] = {}               # user id -> expiry (monotonic)
+        self._last_seen: Dict[str, datetime] = {}
+        self._typing: Dict[Tuple[str, str], float] = {}   # (request id, user id) -> expiry
+        bus.on(HEARTBEAT_TOPIC, self._apply_remote)
+
+    def remember_participants(self, request_doc: dict):
+        """Cache who may signal in a conversation (called wherever the request is already loaded)"""
+        self.participants.put(
+            str(request_doc["_id"]), str(request_doc["client_id"]), str(request_doc["lawyer_id"])
+        )
+
+    async def participants_of(self, db, request_id: str) -> Optional[Tuple[str, str]]:
+        participants = self.participants.get(request_id)
+        if participants is None and db is not None:
+            request_doc = await db.lawyer_requests.find_one(
+                {"_id": ObjectId(request_id)}, {"client_id": 1, "lawyer_id": 1}
+            )
+            if request_doc:
+                self.remember_participants(request_doc)
+                participants = self.participants.get(request_id)
+        return participants
+
+    async def heartbeat(self, user_id: str, request_id: Optional[str] = None, typing: Optional[bool] = None):
+        """Record activity here and relay it to the other workers"""
+        self._apply(user_id, request_id, typing)
+        await self.bus.publish(
+            HEARTBEAT_TOPIC,
+            {"user_id": user_id, "request_id": request_id, "typing": typing},
+            local=False
+        )
+
+    def _apply_remote(self, event: dict):
+        self._apply(event["user_id"], event.get("request_id"), event.get("typing"))
+
+    def _apply(self, user_id: str, request_id: Optional[str], typing: Optional[bool]):
+        now = time.monotonic()
+        was_online = self._online.get(user_id, 0) > now
+        self._online[user_id] = now + PRESENCE_TTL_SECONDS
+        self._last_seen[user_id] = datetime.utcnow()
+        if not was_online:
+            self.bus.deliver(user_topic(user_id), {"type": "presence", "user_id": user_id, "online": True})
+
+        if request_id is None or typing is None:
+            return
+        key = (request_id, user_id)
+        was_typing = self._typing.get(key, 0) > now
+        if typing:
+            self._typing[key] = now + TYPING_TTL_SECONDS
+        else:
+            self._typing.pop(key, None)
+        if typing != was_typing:
+            self.bus.deliver(
+                conversation_topic(request_id),
+                {"type": "typing", "user_id": user_id, "typing": typing}
+            )
+
+    def is_online(self, user_id: str) -> bool:
+        return self._online.get(user_id, 0) > time.monotonic()
+
+    def is_typing(self, request_id: str, user_id: str) -> bool:
+        return self._typing.get((request_id, user_id), 0) > time.monotonic()
+
+    def status(self, user_id: str, request_id: Optional[str] = None) -> Dict:
+        """What a conversation partner sees for user_id"""
+        last_seen = self._last_seen.get(user_id)
+        return {
+            "online": self.is_online(user_id),
+            "typing": self.is_typing(request_id, user_id) if request_id else False,
+            "last_seen": last_seen.isoformat() if last_seen else None
+        }
+
+    def sweep(self):
+        """Expire stale entries and announce the transitions to local subscribers"""
+        now = time.monotonic()
+        for key, expires in list(self._typing.items()):
+            if expires <= now:
+                del self._typing[key]
+                request_id, user_id = key
+                self.bus.deliver(
+                    conversation_topic(request_id),
+                    {"type": "typing", "user_id": user_id, "typing": False}
+                )
+        for user_id, expires in list(self._online.items()):
+            if expires <= now:
+                del self._online[user_id]
+                last_seen = self._last_seen.get(user_id)
+                self.bus.deliver(user_topic(user_id), {
+                    "type": "presence",
+                    "user_id": user_id,
+                    "online": False,
+                    "last_seen": last_seen.isoformat() if last_seen else None
+                })
+
+    async def run_sweeper(self, interval: float = PRESENCE_SWEEP_SECONDS):
+        while True:
+            await asyncio.sleep(interval)
+            self.sweep()
+
+presence_registry = PresenceRegistry(event_bus)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Recompute every reviewed lawyer's rating aggregates from the reviews collection.
+
+    python reconcile_reviews.py
+    python reconcile_reviews.py --dry-run
+
+Run it while no reviews are being written.
+"""
+import asyncio
+import argparse
+from motor.motor_asyncio import AsyncIOMotorClient
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import lawyer_reviews
+
+async def reconcile(dry_run: bool):
+    """Fix profiles whose aggregates drifted from their reviews"""
+
+    print("⭐ Reconciling lawyer review aggregates...")
+
+    # Connect to MongoDB
+    mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+    database_name = os.getenv("DATABASE_NAME", "jai_database")
+
+    client = AsyncIOMotorClient(mongodb_url)
+    db = client[database_name]
+
+    try:
+        stats = await lawyer_reviews.reconcile_reviews(db, dry_run)
+
+        action = "would be fixed" if dry_run else "fixed"
+        print(f"\n🎉 Checked {stats['checked']} profiles, {stats['fixed']} {action}")
+
+        # Show summary
+        reviews = await db[lawyer_reviews.REVIEWS_COLLECTION].count_documents({})
+        print("\n📊 Review Summary:")
+        print(f"   Reviews: {reviews}")
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcile lawyer rating aggregates with their reviews")
+    parser.add_argument("--dry-run", action="store_true", help="Only report profiles that drifted")
+    args = parser.parse_args()
+    asyncio.run(reconcile(args.dry_run))
@@ -0,0 +1,124 @@
+"""
+In-process response cache for hot anonymous endpoints
+
+Entries hold the already serialized response body (and its ETag) for a
+normalized path + query string, so a hit skips the database and the JSON
+encoding entirely.
+
+- Single-flight: concurrent misses for one key share a single build.
+- Stale-while-revalidate: for stale_ttl seconds after an entry expires it is
+  still served while one background build replaces it.
+- invalidate() drops entries immediately; a build that started before the
+  invalidation is not stored, so it cannot put old data back.
+
+Every worker keeps its own cache; invalidation arrives through the event bus.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional
+from urllib.parse import parse_qsl, urlencode
+import asyncio
+import os
+import time
+import logging
+
+from conditional import body_etag
+
+logger = logging.getLogger(__name__)
+
+# Cache configuration
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "30"))
+RESPONSE_CACHE_STALE_SECONDS = float(os.getenv("RESPONSE_CACHE_STALE_SECONDS", "300"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+
+@dataclass
+class CachedBody:
+    body: bytes
+    etag: str
+    created: float
+
+    def age(self) -> float:
+        return time.monotonic() - self.created
+
+def cache_key(path: str, query_string: str) -> str:
+    """Path plus query parameters in a canonical order (blank values dropped)"""
+    params = sorted(parse_qsl(query_string, keep_blank_values=False))
+    return f"{path}?{urlencode(params)}" if params else path
+
+class ResponseCache:
+    """TTL cache of serialized bodies with single-flight builds"""
+
+    def __init__(
+        self,
+        ttl: float = RESPONSE_CACHE_TTL_SECONDS,
+        stale_ttl: float = RESPONSE_CACHE_STALE_SECONDS,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES
+    ):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CachedBody]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str, build: Callable[[], Awaitable[bytes]]) -> CachedBody:
+        """Cached body for key, building it (once, however many callers wait) when needed"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = entry.age()
+            if age < self.ttl:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry
+            if age < self.ttl + self.stale_ttl:
+                # Serve the stale copy; one background build replaces it
+                self.hits += 1
+                self._build(key, build)
+                return entry
+
+        self.misses += 1
+        return await asyncio.shield(self._build(key, build))
+
+    def _build(self, key: str, build: Callable[[], Awaitable[bytes]]) -> asyncio.Future:
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._run_build(key, build, self._generation))
+            future.add_done_callback(lambda done: self._finished(key, done))
+            self._inflight[key] = future
+        return future
+
+    def _finished(self, key: str, future: asyncio.Future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled():
+            future.exception()  # already logged; a background refresh may have no waiter
+
+    async def _run_build(self, key: str, build: Callable[[], Awaitable[bytes]], generation: int) -> CachedBody:
+        try:
+            body = await build()
+            entry = CachedBody(body=body, etag=body_etag(body), created=time.monotonic())
+            if generation == self._generation:
+                self._store(key, entry)
+            return entry
+        except Exception as e:
+            logger.error(f"Building cached response for {key} failed: {e}")
+            raise
+
+    def _store(self, key: str, entry: CachedBody):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Optional[str] = None):
+        """Drop one entry, or everything; builds already running are not stored"""
+        self._generation += 1
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+        # Later callers must not join a build that read the old data
+        self._inflight.clear()
@@ -1,9 +1,68 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Optional
+from bson import ObjectId
+
+from database import get_database
+from lawyer_matching import (
+    DEFAULT_RECOMMENDATIONS, MAX_RECOMMENDATIONS, CaseCriteria, match_documents, matching_engine,
+    store_matches, to_response
+)
+from lawyer_profiles import public_profiles
+from models.case import AIMatchResponse, AIRecommendationsResponse, UrgencyLevel
 from routers.auth import get_current_user
 
 router = APIRouter()
 
-@router.get("/recommendations")
-async def get_ai_recommendations(current_user: dict = Depends(get_current_user)):
-    """Get AI recommendations - placeholder"""
-    return {"recommended_lawyers": []}
\ No newline at end of file
+@router.get("/recommendations", response_model=AIRecommendationsResponse)
+async def get_ai_recommendations(
+    case_id: Optional[str] = Query(None, description="One of your cases; defaults to your latest open case"),
+    category: Optional[str] = Query(None, description="Match ad-hoc criteria instead of a stored case"),
+    urgency_level: UrgencyLevel = UrgencyLevel.MEDIUM,
+    budget_max: Optional[float] = Query(None, ge=0),
+    limit: int = Query(DEFAULT_RECOMMENDATIONS, ge=1, le=MAX_RECOMMENDATIONS),
+    current_user: dict = Depends(get_current_user)
+):
+    """Lawyers best matching a case, scored on specialization, experience, budget and availability"""
+    try:
+        db = get_database()
+        client_id = ObjectId(current_user["id"])
+        
+        case = None
+        if case_id:
+            if not ObjectId.is_valid(case_id):
+                raise HTTPException(status_code=400, detail="Invalid case id")
+            case = await db.cases.find_one({"_id": ObjectId(case_id), "client_id": client_id})
+            if not case:
+                raise HTTPException(status_code=404, detail="Case not found")
+        elif not category:
+            case = await db.cases.find_one({"client_id": client_id, "status": "open"}, sort=[("created_at", -1)])
+        
+        if case:
+            criteria = CaseCriteria.from_case(case)
+        elif category:
+            criteria = CaseCriteria(category=category, urgency_level=urgency_level.value, budget_max=budget_max)
+        else:
+            return AIRecommendationsResponse()
+        
+        if case:
+            # Stored matches are kept at full length so the limit does not change them
+            documents = match_documents(matching_engine.recommend(criteria, MAX_RECOMMENDATIONS), case["_id"])
+            documents = (await store_matches(db, case["_id"], documents))[:limit]
+        else:
+            documents = match_documents(matching_engine.recommend(criteria, limit))
+        
+        lawyers = await public_profiles(db, [str(document["lawyer_id"]) for document in documents])
+        recommended = [
+            {**lawyer, "match_score": document["match_score"]}
+            for lawyer, document in zip(lawyers, documents) if lawyer["found"]
+        ]
+        return AIRecommendationsResponse(
+            case_id=str(case["_id"]) if case else None,
+            matches=[AIMatchResponse(**to_response(document)) for document in documents],
+            recommended_lawyers=recommended
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error matching lawyers: {str(e)}")
@@ -8,6 +8,9 @@ import os
 from bson import ObjectId
 
 from database import get_database
+import lawyer_directory
+import lawyer_rank
+from gazetteer import profile_point
 
 router = APIRouter()
 security = HTTPBearer()
@@ -36,16 +39,24 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Get current user from JWT token"""
+def decode_user_id(token: str) -> str:
+    """User id (sub) of a valid JWT"""
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+        return user_id
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+
+async def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
+    """User id from the JWT alone, for hot paths that must not hit the database"""
+    return decode_user_id(credentials.credentials)
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Get current user from JWT token"""
+    user_id = decode_user_id(credentials.credentials)
     
     db = get_database()
     user = await db.users.find_one({"_id": ObjectId(user_id)})
@@ -168,6 +179,7 @@ async def signup(signup_data: dict):
                 "years_experience": int(signup_data.get("years_experience", 0)),
                 "hourly_rate": float(signup_data.get("hourly_rate", 0)) if signup_data.get("hourly_rate") else None,
                 "bio": signup_data.get("bio", ""),
+                "location": signup_data.get("location", ""),
                 "specializations": signup_data.get("specializations", []),
                 "education": [],
                 "certifications": [],
@@ -181,7 +193,12 @@ async def signup(signup_data: dict):
                 "created_at": datetime.utcnow(),
                 "updated_at": datetime.utcnow()
             }
+            geo = profile_point(lawyer_profile["location"], lawyer_profile["bar_state"])
+            if geo:
+                lawyer_profile["geo"] = geo
+            lawyer_profile.update(lawyer_rank.rank_fields(lawyer_profile))
             await db.lawyers.insert_one(lawyer_profile)
+            await lawyer_directory.refresh_lawyer(db, result.inserted_id)
         
         # Create access token
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -1,11 +1,18 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, status
 from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
+import logging
 
 from database import get_database
+from conditional import check_not_modified, collection_version, make_etag
+import lawyer_rank
+import message_store
+from content_filter import check_text
 from routers.auth import get_current_user
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 @router.post("/")
@@ -20,6 +27,15 @@ async def send_lawyer_request(request_data: dict, current_user: dict = Depends(g
             if not request_data.get(field):
                 raise HTTPException(status_code=400, detail=f"{field} is required")
         
+        # Spam / abuse screening of the free-text fields
+        screening = check_text(
+            request_data["title"],
+            request_data["description"],
+            request_data.get("additional_notes")
+        )
+        if not screening.allowed:
+            raise HTTPException(status_code=400, detail="Request was blocked by the content filter")
+        
         # Create request document
         request_doc = {
             "client_id": ObjectId(current_user["id"]),
@@ -41,6 +57,8 @@ async def send_lawyer_request(request_data: dict, current_user: dict = Depends(g
             "meeting_slots": None,
             "selected_meeting": None
         }
+        if screening.as_moderation():
+            request_doc["moderation"] = screening.as_moderation()
         
         result = await db.lawyer_requests.insert_one(request_doc)
         
@@ -54,8 +72,45 @@ async def send_lawyer_request(request_data: dict, current_user: dict = Depends(g
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error sending request: {str(e)}")
 
+async def serialize_request(db, request: dict) -> Optional[dict]:
+    """Request as returned to its client and lawyer, or None if either account is gone"""
+    # Get client and lawyer info
+    client = await db.users.find_one({"_id": request["client_id"]})
+    lawyer = await db.users.find_one({"_id": request["lawyer_id"]})
+    
+    if not client or not lawyer:
+        return None
+    
+    return {
+        "id": str(request["_id"]),
+        "title": request["title"],
+        "description": request["description"],
+        "category": request["category"],
+        "urgency_level": request["urgency_level"],
+        "budget_min": request.get("budget_min"),
+        "budget_max": request.get("budget_max"),
+        "preferred_meeting_type": request.get("preferred_meeting_type"),
+        "location": request.get("location"),
+        "additional_notes": request.get("additional_notes"),
+        "status": request["status"],
+        "created_at": request["created_at"],
+        "updated_at": request["updated_at"],
+        "response_message": request.get("response_message"),
+        "responded_at": request.get("responded_at"),
+        "meeting_slots": request.get("meeting_slots"),
+        "selected_meeting": request.get("selected_meeting"),
+        "client_name": f"{client['first_name']} {client['last_name']}",
+        "client_email": client["email"],
+        "lawyer_name": f"{lawyer['first_name']} {lawyer['last_name']}",
+        "lawyer_email": lawyer["email"]
+    }
+
 @router.get("/")
-async def get_user_requests(current_user: dict = Depends(get_current_user)):
+async def get_user_requests(
+    http_request: Request,
+    response: Response,
+    current_user: dict = Depends(get_current_user)
+):
     """Get all requests for the current user"""
     try:
         db = get_database()
@@ -68,36 +123,19 @@ async def get_user_requests(current_user: dict = Depends(get_current_user)):
         else:  # lawyer
             query = {"lawyer_id": user_id}
         
+        # Every change to a request bumps its updated_at; answer 304 before serializing
+        count, latest = await collection_version(db.lawyer_requests, query)
+        not_modified = check_not_modified(
+            http_request, response, make_etag("requests", user_id, count, latest), latest
+        )
+        if not_modified:
+            return not_modified
+        
         requests = []
         async for request in db.lawyer_requests.find(query).sort("created_at", -1):
-            # Get client and lawyer info
-            client = await db.users.find_one({"_id": request["client_id"]})
-            lawyer = await db.users.find_one({"_id": request["lawyer_id"]})
-            
-            if not client or not lawyer:
-                continue
-            
-            request_data = {
-                "id": str(request["_id"]),
-                "title": request["title"],
-                "description": request["description"],
-                "category": request["category"],
-                "urgency_level": request["urgency_level"],
-                "budget_min": request.get("budget_min"),
-                "budget_max": request.get("budget_max"),
-                "status": request["status"],
-                "created_at": request["created_at"],
-                "updated_at": request["updated_at"],
-                "response_message": request.get("response_message"),
-                "responded_at": request.get("responded_at"),
-                "meeting_slots": request.get("meeting_slots"),
-                "selected_meeting": request.get("selected_meeting"),
-                "client_name": f"{client['first_name']} {client['last_name']}",
-                "client_email": client["email"],
-                "lawyer_name": f"{lawyer['first_name']} {lawyer['last_name']}",
-                "lawyer_email": lawyer["email"]
-            }
-            requests.append(request_data)
+            request_data = await serialize_request(db, request)
+            if request_data:
+                requests.append(request_data)
         
         return requests
         
@@ -190,10 +228,21 @@ async def respond_to_request(
         if action == "accept" and response_data.get("meeting_slots"):
             update_data["meeting_slots"] = response_data["meeting_slots"]
         
-        await db.lawyer_requests.update_one(
-            {"_id": request_obj_id},
+        # Written directly: the response must land before the rank update and
+        # welcome message, and a concurrent response must not be overwritten
+        result = await db.lawyer_requests.update_one(
+            {"_id": request_obj_id, "status": "pending"},
             {"$set": update_data}
         )
+        if result.matched_count == 0:
+            raise HTTPException(status_code=409, detail="Request was already responded to")
+        
+        # Answering (in time or late) moves the lawyer's responsiveness; the
+        # response is already recorded, so a failure here waits for the rank worker
+        try:
+            await lawyer_rank.update_rank(db, lawyer_id)
+        except Exception as e:
+            logger.error(f"Rank update for lawyer {lawyer_id} failed: {e}")
         
         # If accepted, send a welcome message to start the conversation
         if action == "accept":
@@ -218,7 +267,7 @@ async def respond_to_request(
                 "created_at": datetime.utcnow(),
                 "updated_at": datetime.utcnow()
             }
-            await db.messages.insert_one(welcome_message)
+            await message_store.insert_message(db, welcome_message)
         
         return {"message": f"Request {action}ed successfully"}
         
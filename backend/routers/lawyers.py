@@ -1,30 +1,251 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from typing import List, Optional
+from bson import ObjectId
+import json
+
+from database import get_database
+import lawyer_directory
+import lawyer_search
+import lawyer_reviews
+import lawyer_profiles
+from lawyer_suggest import DEFAULT_SUGGESTIONS, MAX_SUGGESTIONS, suggest_index
+from conditional import check_not_modified, validator_headers
+from response_cache import ResponseCache, cache_key
+from models.lawyer import (
+    AvailabilityStatus, LawyerCard, LawyerFacetsResponse, LawyerProfileCreate, LawyerProfileUpdate,
+    LawyerProfileUpdateResponse, LawyerResponse, LawyerSearchFilters, LawyerSearchResponse, LawyerSortOption,
+    LawyerSuggestResponse
+)
+from models.review import ReviewCreate, ReviewListResponse, ReviewResponse
 from routers.auth import get_current_user
 
 router = APIRouter()
 
+# Facet counts per filter signature, dropped whenever a directory entry changes
+facets_cache = ResponseCache()
+lawyer_directory.on_directory_change(lambda event: facets_cache.invalidate())
+
+def search_filters(
+    specializations: Optional[List[str]] = Query(None),
+    min_experience: Optional[int] = Query(None, ge=0),
+    max_hourly_rate: Optional[float] = Query(None, ge=0),
+    min_rating: Optional[float] = Query(None, ge=0, le=5),
+    languages: Optional[List[str]] = Query(None),
+    availability_status: Optional[AvailabilityStatus] = None,
+    bar_state: Optional[str] = None,
+    near: Optional[str] = Query(None, description="Place name (\"Pune, Maharashtra\") or \"lat,lon\""),
+    radius_km: Optional[float] = Query(None, gt=0, le=lawyer_search.MAX_RADIUS_KM),
+    q: Optional[str] = Query(None, max_length=200, description="Full text: name, firm, specializations, education, certifications, bio"),
+    fuzzy: bool = Query(False, description="Match q against names and firms, tolerating typos")
+) -> LawyerSearchFilters:
+    """Directory filters from the query string (shared by search and facets)"""
+    return LawyerSearchFilters(
+        specializations=specializations,
+        min_experience=min_experience,
+        max_hourly_rate=max_hourly_rate,
+        min_rating=min_rating,
+        languages=languages,
+        availability_status=availability_status,
+        bar_state=bar_state,
+        near=near,
+        radius_km=radius_km,
+        q=q,
+        fuzzy=fuzzy
+    )
+
+@router.get("/search", response_model=LawyerSearchResponse)
+async def search_lawyers(
+    filters: LawyerSearchFilters = Depends(search_filters),
+    sort: Optional[LawyerSortOption] = Query(None, description="Defaults to relevance with q, else rank"),
+    page_size: int = Query(lawyer_search.DEFAULT_PAGE_SIZE, ge=1, le=lawyer_search.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    """Search the lawyer directory (public); page with the returned next_cursor"""
+    try:
+        db = get_database()
+        if sort is None:
+            sort = LawyerSortOption.RELEVANCE if filters.q else LawyerSortOption.RANK
+        
+        profiles, next_cursor = await lawyer_search.search_profiles(
+            db.lawyers, filters, sort, page_size, cursor
+        )
+        
+        # Names come from the user accounts, fetched for this page only
+        users = {}
+        async for user in db.users.find(
+            {"_id": {"$in": [profile["user_id"] for profile in profiles]}},
+            {"first_name": 1, "last_name": 1}
+        ):
+            users[user["_id"]] = user
+        
+        results = []
+        for profile in profiles:
+            user = users.get(profile["user_id"])
+            if not user:
+                continue
+            results.append(LawyerCard(
+                id=str(profile["user_id"]),
+                first_name=user["first_name"],
+                last_name=user["last_name"],
+                law_firm=profile.get("law_firm"),
+                bio=profile.get("bio"),
+                bar_state=profile.get("bar_state"),
+                location=profile.get("location"),
+                distance_km=round(profile["distance"] / 1000, 1) if "distance" in profile else None,
+                score=profile.get("score"),
+                specializations=profile.get("specializations", []),
+                languages=profile.get("languages", []),
+                years_experience=profile.get("years_experience", 0),
+                hourly_rate=profile.get("hourly_rate"),
+                rating=profile.get("rating", 0.0),
+                total_reviews=profile.get("total_reviews", 0),
+                availability_status=profile.get("availability_status", AvailabilityStatus.AVAILABLE)
+            ))
+        
+        return LawyerSearchResponse(
+            results=results,
+            sort=sort,
+            page_size=page_size,
+            next_cursor=next_cursor
+        )
+        
+    except (lawyer_search.InvalidCursor, lawyer_search.UnknownPlace, lawyer_search.MissingQuery) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching lawyers: {str(e)}")
+
+@router.get("/facets", response_model=LawyerFacetsResponse)
+async def lawyer_facets(
+    request: Request,
+    response: Response,
+    filters: LawyerSearchFilters = Depends(search_filters)
+):
+    """Sidebar counts per specialization, bar state, language, experience and rate range (public)"""
+    try:
+        db = get_database()
+        
+        async def build():
+            counts = await lawyer_search.facet_counts(db.lawyers, filters)
+            return json.dumps(LawyerFacetsResponse(**counts).model_dump()).encode()
+        
+        cached = await facets_cache.get(cache_key(request.url.path, request.url.query), build)
+        not_modified = check_not_modified(request, response, cached.etag, private=False)
+        if not_modified:
+            return not_modified
+        
+        return Response(
+            content=cached.body,
+            media_type="application/json",
+            headers=validator_headers(cached.etag, private=False)
+        )
+        
+    except lawyer_search.UnknownPlace as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error counting lawyers: {str(e)}")
+
+@router.get("/suggest", response_model=LawyerSuggestResponse)
+async def suggest_lawyers(
+    prefix: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(DEFAULT_SUGGESTIONS, ge=1, le=MAX_SUGGESTIONS)
+):
+    """Typeahead over lawyer names, firms and specializations, best rated first (public, in memory)"""
+    return LawyerSuggestResponse(prefix=prefix, suggestions=suggest_index.suggest(prefix, limit))
+
 @router.get("/all")
 async def get_all_lawyers():
     """Get all lawyers - placeholder"""
     return {"lawyers": []}
 
-@router.get("/profile")
+@router.get("/profile", response_model=LawyerResponse)
 async def get_lawyer_profile(current_user: dict = Depends(get_current_user)):
-    """Get lawyer profile - placeholder"""
+    """The signed-in lawyer's profile"""
     if current_user["user_type"] != "lawyer":
         raise HTTPException(status_code=403, detail="Only lawyers can access this endpoint")
-    return {"message": "Lawyer profile endpoint"}
+    try:
+        profile = await lawyer_profiles.get_profile(get_database(), current_user["id"])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching profile: {str(e)}")
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Lawyer profile not found")
+    return LawyerResponse(**lawyer_profiles.to_response(profile))
 
-@router.post("/profile")
-async def create_lawyer_profile(profile_data: dict, current_user: dict = Depends(get_current_user)):
-    """Create lawyer profile - placeholder"""
+@router.post("/profile", response_model=LawyerResponse)
+async def create_lawyer_profile(profile_data: LawyerProfileCreate, current_user: dict = Depends(get_current_user)):
+    """Create the signed-in lawyer's profile (accounts from signup already have one)"""
     if current_user["user_type"] != "lawyer":
         raise HTTPException(status_code=403, detail="Only lawyers can access this endpoint")
-    return {"message": "Lawyer profile created"}
+    try:
+        profile = await lawyer_profiles.create_profile(get_database(), current_user["id"], profile_data)
+        return LawyerResponse(**lawyer_profiles.to_response(profile))
+    except lawyer_profiles.ProfileExists as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating profile: {str(e)}")
 
-@router.put("/profile")
-async def update_lawyer_profile(profile_data: dict, current_user: dict = Depends(get_current_user)):
-    """Update lawyer profile - placeholder"""
+@router.put("/profile", response_model=LawyerProfileUpdateResponse)
+async def update_lawyer_profile(profile_data: LawyerProfileUpdate, current_user: dict = Depends(get_current_user)):
+    """Update the signed-in lawyer's profile; only fields that change are written"""
     if current_user["user_type"] != "lawyer":
         raise HTTPException(status_code=403, detail="Only lawyers can access this endpoint")
-    return {"message": "Lawyer profile updated"}
\ No newline at end of file
+    try:
+        profile, changed = await lawyer_profiles.update_profile(get_database(), current_user["id"], profile_data)
+    except lawyer_profiles.ProfileConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error updating profile: {str(e)}")
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Lawyer profile not found")
+    return LawyerProfileUpdateResponse(
+        profile=LawyerResponse(**lawyer_profiles.to_response(profile)),
+        changed=changed
+    )
+
+def lawyer_object_id(lawyer_id: str) -> ObjectId:
+    if not ObjectId.is_valid(lawyer_id):
+        raise HTTPException(status_code=400, detail="Invalid lawyer id")
+    return ObjectId(lawyer_id)
+
+@router.post("/{lawyer_id}/reviews", response_model=ReviewResponse)
+async def create_review(lawyer_id: str, review: ReviewCreate, current_user: dict = Depends(get_current_user)):
+    """Review a lawyer after one of your requests was accepted (once per request)"""
+    if current_user["user_type"] != "client":
+        raise HTTPException(status_code=403, detail="Only clients can review lawyers")
+    if not ObjectId.is_valid(review.request_id):
+        raise HTTPException(status_code=400, detail="Invalid request id")
+    try:
+        db = get_database()
+        document = await lawyer_reviews.add_review(db, lawyer_object_id(lawyer_id), current_user, review)
+        return ReviewResponse(**lawyer_reviews.to_public(document))
+    except lawyer_reviews.ReviewNotAllowed as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except lawyer_reviews.ReviewBlocked as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except lawyer_reviews.DuplicateReview as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error saving review: {str(e)}")
+
+@router.get("/{lawyer_id}/reviews", response_model=ReviewListResponse)
+async def list_reviews(
+    lawyer_id: str,
+    page_size: int = Query(lawyer_reviews.DEFAULT_REVIEW_PAGE_SIZE, ge=1, le=lawyer_reviews.MAX_REVIEW_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    """A lawyer's reviews, newest first (public)"""
+    try:
+        db = get_database()
+        reviews, next_cursor = await lawyer_reviews.list_reviews(db, lawyer_object_id(lawyer_id), page_size, cursor)
+        return ReviewListResponse(
+            reviews=[ReviewResponse(**lawyer_reviews.to_public(review)) for review in reviews],
+            page_size=page_size,
+            next_cursor=next_cursor
+        )
+    except lawyer_reviews.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching reviews: {str(e)}")
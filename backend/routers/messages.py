@@ -1,16 +1,185 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
+import json
+import re
+import time
 
 from database import get_database
-from models.message import MessageCreate, MessageResponse, ConversationResponse, MarkAsReadRequest
-from routers.auth import get_current_user
+from conditional import check_not_modified, collection_version, make_etag
+import message_store
+import message_archive
+import attachments
+import conversation_summary
+from write_coalescer import coalescer_for
+from content_filter import check_text
+from events import event_bus, conversation_topic, user_topic
+from presence import presence_registry, PRESENCE_TTL_SECONDS
+from models.message import (
+    MessageCreate, MessageResponse, MessageType, ConversationResponse, MarkAsReadRequest,
+    MessageSearchHit, MessageSearchResponse, PresenceHeartbeat
+)
+from routers.auth import get_current_user, get_current_user_id
 
 router = APIRouter()
 
+SNIPPET_RADIUS = 60
+LIVE_KEEPALIVE_SECONDS = 15
+
+def build_snippet(content: str, query: str, radius: int = SNIPPET_RADIUS) -> str:
+    """Cut a short excerpt of content centred on the first matching search term"""
+    terms = [t for t in re.findall(r"\w+", query.lower()) if t]
+    lowered = content.lower()
+    hit = -1
+    for term in terms:
+        index = lowered.find(term)
+        if index != -1 and (hit == -1 or index < hit):
+            hit = index
+    
+    if hit == -1 or len(content) <= radius * 2:
+        return content if len(content) <= radius * 2 else content[:radius * 2].rstrip() + "…"
+    
+    start = max(0, hit - radius)
+    end = min(len(content), hit + radius)
+    snippet = content[start:end].strip()
+    if start > 0:
+        snippet = "…" + snippet
+    if end < len(content):
+        snippet = snippet + "…"
+    return snippet
+
+@router.get("/search", response_model=MessageSearchResponse)
+async def search_messages(
+    q: str = Query(..., min_length=1, max_length=200),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(get_current_user)
+):
+    """Full-text search across the current user's conversations"""
+    try:
+        db = get_database()
+        user_id = ObjectId(current_user["id"])
+        
+        # Only search conversations the user takes part in
+        if current_user["user_type"] == "client":
+            requests_query = {"client_id": user_id, "status": "accepted"}
+        else:  # lawyer
+            requests_query = {"lawyer_id": user_id, "status": "accepted"}
+        
+        titles = {}
+        archived_ids = []
+        async for request in db.lawyer_requests.find(requests_query, {"title": 1, "messages_archived": 1}):
+            titles[request["_id"]] = request["title"]
+            if request.get("messages_archived"):
+                archived_ids.append(request["_id"])
+        
+        if not titles:
+            return MessageSearchResponse(query=q, page=page, page_size=page_size, total=0)
+        
+        skip = (page - 1) * page_size
+        total, matches = await message_store.search(db, list(titles.keys()), q, skip, page_size)
+        
+        # Archived conversations are searched too; their hits rank after the hot ones
+        archived = await message_archive.search_archived(db, archived_ids, q)
+        if len(matches) < page_size:
+            archived_skip = max(0, skip - total)
+            matches += archived[archived_skip:archived_skip + page_size - len(matches)]
+        total += len(archived)
+        
+        # Resolve sender names in one round trip
+        sender_ids = list({match["sender_id"] for match in matches})
+        senders = {}
+        async for sender in db.users.find({"_id": {"$in": sender_ids}}, {"first_name": 1, "last_name": 1}):
+            senders[sender["_id"]] = f"{sender['first_name']} {sender['last_name']}"
+        
+        results = []
+        for match in matches:
+            results.append(MessageSearchHit(
+                message_id=str(match["_id"]),
+                request_id=str(match["request_id"]),
+                conversation_title=titles[match["request_id"]],
+                sender_id=str(match["sender_id"]),
+                sender_type=match["sender_type"],
+                sender_name=senders.get(match["sender_id"], "Unknown"),
+                snippet=build_snippet(match["content"], q),
+                position=match["position"],
+                score=match.get("score", 0.0),
+                created_at=match["created_at"]
+            ))
+        
+        return MessageSearchResponse(
+            query=q,
+            page=page,
+            page_size=page_size,
+            total=total,
+            results=results
+        )
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching messages: {str(e)}")
+
+def to_message_response(message: dict, client: dict, lawyer: dict) -> MessageResponse:
+    """Shape a stored message for the API, naming its sender"""
+    sender = client if message["sender_id"] == client["_id"] else lawyer
+    return MessageResponse(
+        id=str(message["_id"]),
+        request_id=str(message["request_id"]),
+        sender_id=str(message["sender_id"]),
+        sender_type=message["sender_type"],
+        sender_name=f"{sender['first_name']} {sender['last_name']}",
+        content=message["content"],
+        message_type=message["message_type"],
+        file_url=message.get("file_url"),
+        file_name=message.get("file_name"),
+        is_read=message["is_read"],
+        created_at=message["created_at"],
+        updated_at=message["updated_at"]
+    )
+
+async def build_conversation(db, request: dict, user_id: ObjectId) -> Optional[ConversationResponse]:
+    """Conversation list entry for an accepted request, or None if a participant is gone"""
+    # Get client and lawyer info
+    client = await db.users.find_one({"_id": request["client_id"]})
+    lawyer = await db.users.find_one({"_id": request["lawyer_id"]})
+    
+    if not client or not lawyer:
+        return None
+    
+    # Get last message and unread count
+    last_message = None
+    
+    last_msg = await message_store.last_message(db, request["_id"])
+    if not last_msg and request.get("messages_archived"):
+        last_msg = await message_archive.last_archived_message(db, request["_id"])
+    
+    if last_msg:
+        last_message = to_message_response(last_msg, client, lawyer)
+    
+    # Count unread messages for current user
+    unread_count = await message_store.count_unread(db, request["_id"], user_id)
+    
+    return ConversationResponse(
+        request_id=str(request["_id"]),
+        request_title=request["title"],
+        client_name=f"{client['first_name']} {client['last_name']}",
+        lawyer_name=f"{lawyer['first_name']} {lawyer['last_name']}",
+        status=request["status"],
+        last_message=last_message,
+        unread_count=unread_count,
+        messages=[],  # Will be loaded separately
+        created_at=request["created_at"],
+        updated_at=request["updated_at"]
+    )
+
 @router.get("/conversations", response_model=List[ConversationResponse])
-async def get_user_conversations(current_user: dict = Depends(get_current_user)):
+async def get_user_conversations(
+    request: Request,
+    response: Response,
+    current_user: dict = Depends(get_current_user)
+):
     """Get all conversations for the current user"""
     try:
         db = get_database()
@@ -23,63 +192,27 @@ async def get_user_conversations(current_user: dict = Depends(get_current_user))
         else:  # lawyer
             requests_query = {"lawyer_id": user_id, "status": "accepted"}
         
+        # Version: the requests themselves plus the latest message sent or read in them
+        # (read receipts change unread counts without touching the request)
+        request_ids = [
+            doc["_id"] async for doc in db.lawyer_requests.find(requests_query, {"_id": 1})
+        ]
+        count, latest_request = await collection_version(db.lawyer_requests, requests_query)
+        latest_message = await message_store.latest_change(db, request_ids)
+        not_modified = check_not_modified(
+            request, response,
+            make_etag("conversations", user_id, count, latest_request, latest_message),
+            max(filter(None, (latest_request, latest_message)), default=None)
+        )
+        if not_modified:
+            return not_modified
+        
         conversations = []
         
-        async for request in db.lawyer_requests.find(requests_query).sort("updated_at", -1):
-            # Get client and lawyer info
-            client = await db.users.find_one({"_id": request["client_id"]})
-            lawyer = await db.users.find_one({"_id": request["lawyer_id"]})
-            
-            if not client or not lawyer:
-                continue
-            
-            # Get last message and unread count
-            last_message = None
-            unread_count = 0
-            
-            last_msg = await db.messages.find_one(
-                {"request_id": request["_id"]},
-                sort=[("created_at", -1)]
-            )
-            
-            if last_msg:
-                sender = client if last_msg["sender_id"] == request["client_id"] else lawyer
-                last_message = MessageResponse(
-                    id=str(last_msg["_id"]),
-                    request_id=str(last_msg["request_id"]),
-                    sender_id=str(last_msg["sender_id"]),
-                    sender_type=last_msg["sender_type"],
-                    sender_name=f"{sender['first_name']} {sender['last_name']}",
-                    content=last_msg["content"],
-                    message_type=last_msg["message_type"],
-                    file_url=last_msg.get("file_url"),
-                    file_name=last_msg.get("file_name"),
-                    is_read=last_msg["is_read"],
-                    created_at=last_msg["created_at"],
-                    updated_at=last_msg["updated_at"]
-                )
-            
-            # Count unread messages for current user
-            unread_count = await db.messages.count_documents({
-                "request_id": request["_id"],
-                "sender_id": {"$ne": user_id},
-                "is_read": False
-            })
-            
-            conversation = ConversationResponse(
-                request_id=str(request["_id"]),
-                request_title=request["title"],
-                client_name=f"{client['first_name']} {client['last_name']}",
-                lawyer_name=f"{lawyer['first_name']} {lawyer['last_name']}",
-                status=request["status"],
-                last_message=last_message,
-                unread_count=unread_count,
-                messages=[],  # Will be loaded separately
-                created_at=request["created_at"],
-                updated_at=request["updated_at"]
-            )
-            
-            conversations.append(conversation)
+        async for request_doc in db.lawyer_requests.find(requests_query).sort("updated_at", -1):
+            conversation = await build_conversation(db, request_doc, user_id)
+            if conversation:
+                conversations.append(conversation)
         
         return conversations
         
@@ -89,9 +222,11 @@ async def get_user_conversations(current_user: dict = Depends(get_current_user))
 @router.get("/conversations/{request_id}/messages", response_model=List[MessageResponse])
 async def get_conversation_messages(
     request_id: str,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=500),
     current_user: dict = Depends(get_current_user)
 ):
-    """Get all messages for a specific conversation"""
+    """Get messages for a specific conversation, optionally as a window starting at offset"""
     try:
         db = get_database()
         user_id = ObjectId(current_user["id"])
@@ -105,9 +240,16 @@ async def get_conversation_messages(
         if request_doc["client_id"] != user_id and request_doc["lawyer_id"] != user_id:
             raise HTTPException(status_code=403, detail="Access denied to this conversation")
         
-        # Get all messages for this request
+        # Get messages for this request (a window when offset/limit are given)
+        if request_doc.get("messages_archived"):
+            # Cold conversation: rehydrate from the compressed archive
+            archived = await message_archive.read_archived_conversation(db, request_obj_id)
+            window = archived[offset:offset + limit] if limit else archived[offset:]
+        else:
+            window = await message_store.read_messages(db, request_obj_id, offset, limit)
+        
         messages = []
-        async for message in db.messages.find({"request_id": request_obj_id}).sort("created_at", 1):
+        for message in window:
             # Get sender info
             sender = await db.users.find_one({"_id": message["sender_id"]})
             if not sender:
@@ -130,14 +272,7 @@ async def get_conversation_messages(
             messages.append(message_response)
         
         # Mark messages as read for current user
-        await db.messages.update_many(
-            {
-                "request_id": request_obj_id,
-                "sender_id": {"$ne": user_id},
-                "is_read": False
-            },
-            {"$set": {"is_read": True, "updated_at": datetime.utcnow()}}
-        )
+        await message_store.mark_conversation_read(db, request_obj_id, user_id)
         
         return messages
         
@@ -146,6 +281,77 @@ async def get_conversation_messages(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching messages: {str(e)}")
 
+async def deliver_message(
+    db,
+    request_doc: dict,
+    current_user: dict,
+    message_data: MessageCreate
+) -> MessageResponse:
+    """Store a message in an accepted conversation the user belongs to"""
+    user_id = ObjectId(current_user["id"])
+    request_obj_id = request_doc["_id"]
+    
+    # Spam / abuse screening
+    screening = check_text(message_data.content)
+    if not screening.allowed:
+        raise HTTPException(status_code=400, detail="Message was blocked by the content filter")
+    
+    # Create message document
+    message_doc = {
+        "request_id": request_obj_id,
+        "sender_id": user_id,
+        "sender_type": current_user["user_type"],
+        "content": message_data.content,
+        "message_type": message_data.message_type,
+        "file_url": message_data.file_url,
+        "file_name": message_data.file_name,
+        "is_read": False,
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow()
+    }
+    if screening.as_moderation():
+        message_doc["moderation"] = screening.as_moderation()
+    
+    # A new message brings an archived conversation back into the hot store
+    if request_doc.get("messages_archived"):
+        await message_archive.restore_conversation(db, request_obj_id)
+    
+    # Insert message
+    message_id = await message_store.insert_message(db, message_doc)
+    
+    # Update request's updated_at timestamp (coalesced: busy threads bump it constantly)
+    await coalescer_for(db.lawyer_requests).update_one(
+        {"_id": request_obj_id},
+        {"$set": {"updated_at": datetime.utcnow()}}
+    )
+    
+    # Get sender info for response
+    sender = await db.users.find_one({"_id": user_id})
+    
+    response = MessageResponse(
+        id=str(message_id),
+        request_id=str(request_obj_id),
+        sender_id=str(user_id),
+        sender_type=current_user["user_type"],
+        sender_name=f"{sender['first_name']} {sender['last_name']}",
+        content=message_data.content,
+        message_type=message_data.message_type,
+        file_url=message_data.file_url,
+        file_name=message_data.file_name,
+        is_read=False,
+        created_at=message_doc["created_at"],
+        updated_at=message_doc["updated_at"]
+    )
+    
+    # Push to open live channels; sending also ends the sender's typing indicator
+    await event_bus.publish(
+        conversation_topic(request_obj_id),
+        {"type": "message", "message": jsonable_encoder(response)}
+    )
+    await presence_registry.heartbeat(current_user["id"], str(request_obj_id), typing=False)
+    
+    return response
+
 @router.post("/conversations/{request_id}/messages", response_model=MessageResponse)
 async def send_message(
     request_id: str,
@@ -170,46 +376,7 @@ async def send_message(
         if request_doc["status"] != "accepted":
             raise HTTPException(status_code=400, detail="Can only message in accepted requests")
         
-        # Create message document
-        message_doc = {
-            "request_id": request_obj_id,
-            "sender_id": user_id,
-            "sender_type": current_user["user_type"],
-            "content": message_data.content,
-            "message_type": message_data.message_type,
-            "file_url": message_data.file_url,
-            "file_name": message_data.file_name,
-            "is_read": False,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }
-        
-        # Insert message
-        result = await db.messages.insert_one(message_doc)
-        
-        # Update request's updated_at timestamp
-        await db.lawyer_requests.update_one(
-            {"_id": request_obj_id},
-            {"$set": {"updated_at": datetime.utcnow()}}
-        )
-        
-        # Get sender info for response
-        sender = await db.users.find_one({"_id": user_id})
-        
-        return MessageResponse(
-            id=str(result.inserted_id),
-            request_id=request_id,
-            sender_id=str(user_id),
-            sender_type=current_user["user_type"],
-            sender_name=f"{sender['first_name']} {sender['last_name']}",
-            content=message_data.content,
-            message_type=message_data.message_type,
-            file_url=message_data.file_url,
-            file_name=message_data.file_name,
-            is_read=False,
-            created_at=message_doc["created_at"],
-            updated_at=message_doc["updated_at"]
-        )
+        return await deliver_message(db, request_doc, current_user, message_data)
         
     except HTTPException:
         raise
@@ -230,23 +397,23 @@ async def mark_messages_as_read(
         message_ids = [ObjectId(msg_id) for msg_id in mark_read_data.message_ids]
         
         # Update messages (only those not sent by current user)
-        result = await db.messages.update_many(
-            {
-                "_id": {"$in": message_ids},
-                "sender_id": {"$ne": user_id},
-                "is_read": False
-            },
-            {"$set": {"is_read": True, "updated_at": datetime.utcnow()}}
-        )
+        marked = await message_store.mark_read(db, message_ids, user_id)
         
-        return {"message": f"Marked {result.modified_count} messages as read"}
+        return {"message": f"Marked {marked} messages as read"}
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error marking messages as read: {str(e)}")
 
+def presence_version(status: dict) -> tuple:
+    """The part of a presence status that versions a response: last_seen moves
+    with every heartbeat while online, so it only counts once the user is offline"""
+    return status["online"], status["typing"], None if status["online"] else status["last_seen"]
+
 @router.get("/conversations/{request_id}/info")
 async def get_conversation_info(
     request_id: str,
+    request: Request,
+    response: Response,
     current_user: dict = Depends(get_current_user)
 ):
     """Get conversation details and participants"""
@@ -263,6 +430,21 @@ async def get_conversation_info(
         if request_doc["client_id"] != user_id and request_doc["lawyer_id"] != user_id:
             raise HTTPException(status_code=403, detail="Access denied to this conversation")
         
+        presence_registry.remember_participants(request_doc)
+        
+        # Version: the request, its summary and the (in-memory) presence of both sides
+        summary = await conversation_summary.get_summary(db, request_obj_id)
+        client_presence = presence_registry.status(str(request_doc["client_id"]), request_id)
+        lawyer_presence = presence_registry.status(str(request_doc["lawyer_id"]), request_id)
+        etag = make_etag(
+            "info", request_id, request_doc["updated_at"],
+            summary["updated_at"] if summary else None,
+            presence_version(client_presence), presence_version(lawyer_presence)
+        )
+        not_modified = check_not_modified(request, response, etag)
+        if not_modified:
+            return not_modified
+        
         # Get client and lawyer info
         client = await db.users.find_one({"_id": request_doc["client_id"]})
         lawyer = await db.users.find_one({"_id": request_doc["lawyer_id"]})
@@ -276,15 +458,19 @@ async def get_conversation_info(
             "client": {
                 "id": str(client["_id"]),
                 "name": f"{client['first_name']} {client['last_name']}",
-                "email": client["email"]
+                "email": client["email"],
+                "presence": client_presence
             },
             "lawyer": {
                 "id": str(lawyer["_id"]),
                 "name": f"{lawyer['first_name']} {lawyer['last_name']}",
-                "email": lawyer["email"]
+                "email": lawyer["email"],
+                "presence": lawyer_presence
             },
             "meeting_slots": request_doc.get("meeting_slots", []),
             "selected_meeting": request_doc.get("selected_meeting"),
+            # Maintained by the background summary worker; None until its first pass
+            "summary": summary,
             "created_at": request_doc["created_at"],
             "updated_at": request_doc["updated_at"]
         }
@@ -292,4 +478,213 @@ async def get_conversation_info(
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching conversation info: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error fetching conversation info: {str(e)}")
+
+@router.post("/presence/heartbeat")
+async def presence_heartbeat(
+    heartbeat: PresenceHeartbeat,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Mark the caller online, optionally typing in a conversation (memory only, no database)"""
+    if heartbeat.request_id:
+        if not ObjectId.is_valid(heartbeat.request_id):
+            raise HTTPException(status_code=400, detail="Invalid conversation id")
+        participants = await presence_registry.participants_of(get_database(), heartbeat.request_id)
+        if not participants or user_id not in participants:
+            raise HTTPException(status_code=403, detail="Access denied to this conversation")
+    
+    await presence_registry.heartbeat(user_id, heartbeat.request_id, heartbeat.typing)
+    return {"online": True}
+
+def sse_event(event_type: str, data: dict) -> str:
+    return f"event: {event_type}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@router.get("/conversations/{request_id}/live")
+async def conversation_live_channel(
+    request_id: str,
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """Server-sent events for an open conversation: new messages, presence and typing"""
+    if not ObjectId.is_valid(request_id):
+        raise HTTPException(status_code=400, detail="Invalid conversation id")
+    
+    db = get_database()
+    user_id = current_user["id"]
+    
+    request_doc = await db.lawyer_requests.find_one({"_id": ObjectId(request_id)})
+    if not request_doc:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    if str(request_doc["client_id"]) != user_id and str(request_doc["lawyer_id"]) != user_id:
+        raise HTTPException(status_code=403, detail="Access denied to this conversation")
+    
+    presence_registry.remember_participants(request_doc)
+    other_id = str(request_doc["lawyer_id"] if str(request_doc["client_id"]) == user_id else request_doc["client_id"])
+    
+    subscription = event_bus.subscribe(conversation_topic(request_id), user_topic(other_id))
+    # An open channel counts as a heartbeat, refreshed well inside the TTL
+    await presence_registry.heartbeat(user_id)
+    beat_every = PRESENCE_TTL_SECONDS / 3
+    
+    async def stream():
+        with subscription:
+            yield sse_event("presence", {"user_id": other_id, **presence_registry.status(other_id, request_id)})
+            last_beat = time.monotonic()
+            while not await request.is_disconnected():
+                item = await subscription.get(timeout=min(LIVE_KEEPALIVE_SECONDS, beat_every))
+                if time.monotonic() - last_beat >= beat_every:
+                    await presence_registry.heartbeat(user_id)
+                    last_beat = time.monotonic()
+                if item is None:
+                    yield ": keepalive\n\n"
+                    continue
+                _, event = item
+                if event["type"] == "typing" and event["user_id"] == user_id:
+                    continue
+                yield sse_event(event["type"], event)
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/conversations/{request_id}/attachments", response_model=MessageResponse)
+async def upload_attachment(
+    request_id: str,
+    request: Request,
+    file_name: str = Query(..., min_length=1, max_length=255),
+    caption: Optional[str] = Query(None, max_length=2000),
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream a file (raw request body) into the conversation as a file message"""
+    try:
+        db = get_database()
+        user_id = ObjectId(current_user["id"])
+        request_obj_id = ObjectId(request_id)
+        
+        # Verify user has access to this conversation
+        request_doc = await db.lawyer_requests.find_one({"_id": request_obj_id})
+        if not request_doc:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        
+        if request_doc["client_id"] != user_id and request_doc["lawyer_id"] != user_id:
+            raise HTTPException(status_code=403, detail="Access denied to this conversation")
+        
+        if request_doc["status"] != "accepted":
+            raise HTTPException(status_code=400, detail="Can only message in accepted requests")
+        
+        declared_size = request.headers.get("content-length")
+        if declared_size and not declared_size.isdigit():
+            raise HTTPException(status_code=400, detail="Invalid Content-Length")
+        if declared_size and int(declared_size) > attachments.MAX_FILE_SIZE:
+            raise HTTPException(status_code=413, detail="Attachment is too large")
+        
+        content_type = request.headers.get("content-type", "application/octet-stream")
+        claimed_digest = attachments.normalize_digest(request.headers.get("x-content-sha256"))
+        
+        # Re-sharing a file this user already uploaded: reference it without reading the body
+        digest = None
+        if (claimed_digest
+                and await attachments.uploaded_before(db, claimed_digest, user_id)
+                and await attachments.reuse_blob(db, claimed_digest)):
+            digest = claimed_digest
+        elif claimed_digest and declared_size == "0":
+            raise HTTPException(status_code=404, detail="Unknown attachment digest, upload the file content")
+        
+        if digest is None:
+            # The body is hashed into a local spool; GridFS is only written for new content
+            try:
+                digest, _, _ = await attachments.store_blob(
+                    db, request.stream(), file_name, content_type, expected_digest=claimed_digest
+                )
+            except attachments.AttachmentTooLarge:
+                raise HTTPException(status_code=413, detail="Attachment is too large")
+            except attachments.DigestMismatch as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        
+        attachment_id = await attachments.create_reference(
+            db, digest, request_obj_id, user_id, file_name, content_type
+        )
+        
+        message_data = MessageCreate(
+            content=caption or file_name,
+            message_type=MessageType.FILE,
+            file_url=attachments.attachment_url(attachment_id),
+            file_name=file_name
+        )
+        try:
+            return await deliver_message(db, request_doc, current_user, message_data)
+        except Exception:
+            await attachments.release_reference(db, attachment_id)
+            raise
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error uploading attachment: {str(e)}")
+
+@router.get("/attachments/{attachment_id}")
+async def download_attachment(
+    attachment_id: str,
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream an attachment, honouring Range and If-None-Match"""
+    try:
+        db = get_database()
+        user_id = ObjectId(current_user["id"])
+        
+        attachment = await attachments.resolve_attachment(db, ObjectId(attachment_id))
+        if not attachment:
+            raise HTTPException(status_code=404, detail="Attachment not found")
+        
+        # Attachments inherit the ACL of their conversation
+        request_doc = await db.lawyer_requests.find_one(
+            {"_id": attachment["request_id"]},
+            {"client_id": 1, "lawyer_id": 1}
+        )
+        if not request_doc:
+            raise HTTPException(status_code=404, detail="Attachment not found")
+        
+        if request_doc["client_id"] != user_id and request_doc["lawyer_id"] != user_id:
+            raise HTTPException(status_code=403, detail="Access denied to this attachment")
+        
+        length = attachment["length"]
+        etag = attachment["etag"]
+        headers = {
+            "ETag": etag,
+            "Accept-Ranges": "bytes",
+            "Cache-Control": "private, max-age=31536000, immutable",
+            "Content-Disposition": attachments.content_disposition(attachment["file_name"])
+        }
+        
+        if attachments.etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        
+        try:
+            byte_range = attachments.parse_range(request.headers.get("range"), length)
+        except attachments.RangeNotSatisfiable:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{length}"})
+        
+        status_code = 200
+        start, end = 0, length - 1
+        if byte_range:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+        headers["Content-Length"] = str(end - start + 1 if length else 0)
+        
+        body = attachments.stream_range(db, attachment["file_id"], start, end) if length else iter([b""])
+        return StreamingResponse(
+            body,
+            status_code=status_code,
+            headers=headers,
+            media_type=attachment["content_type"] or "application/octet-stream"
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error downloading attachment: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,141 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+from bson import ObjectId
+from bson.errors import InvalidId
+import base64
+import os
+
+from database import get_database
+import message_store
+from routers.auth import get_current_user
+from routers.lawyer_requests import serialize_request
+from routers.messages import build_conversation, to_message_response
+
+router = APIRouter()
+
+# Changes written up to this long before a sync may still be landing (updated_at is
+# set by the app before the write, and some writes are coalesced), so each token
+# points a little into the past. Deltas are applied by id, so overlap is harmless.
+SYNC_OVERLAP_SECONDS = float(os.getenv("SYNC_OVERLAP_SECONDS", "5"))
+SYNC_MESSAGE_LIMIT = int(os.getenv("SYNC_MESSAGE_LIMIT", "500"))
+
+def encode_token(moment: datetime, last_id: Optional[ObjectId] = None) -> str:
+    """Opaque sync token for a point in time, plus the last message id returned at that time"""
+    millis = int((moment - datetime(1970, 1, 1)).total_seconds() * 1000)
+    raw = f"v2:{millis}:{last_id}" if last_id else f"v1:{millis}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_token(token: Optional[str]) -> Tuple[Optional[datetime], Optional[ObjectId]]:
+    """(point in time, last message id) of a token; (None, None) when it is missing or not one of ours"""
+    if not token:
+        return None, None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        version, rest = raw.split(":", 1)
+        last_id = None
+        if version == "v2":
+            rest, last_id = rest.split(":", 1)
+            last_id = ObjectId(last_id)
+        elif version != "v1":
+            return None, None
+        return datetime(1970, 1, 1) + timedelta(milliseconds=int(rest)), last_id
+    except (ValueError, UnicodeDecodeError, InvalidId):
+        return None, None
+
+@router.get("/sync")
+async def sync(
+    since: Optional[str] = Query(None, description="Token from the previous sync"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Requests, conversations and messages changed since a sync token.
+
+    Without a (valid) token everything is returned with full=true and no messages;
+    the client should replace its state. Pass the returned token next time.
+    """
+    try:
+        db = get_database()
+        user_id = ObjectId(current_user["id"])
+        participant = "client_id" if current_user["user_type"] == "client" else "lawyer_id"
+
+        started = datetime.utcnow()
+        since_at, after_id = decode_token(since)
+        full = since_at is None
+
+        # Requests touched since the token (status changes, responses, new messages)
+        requests_query = {participant: user_id}
+        if not full:
+            # A continuation token points at a message; requests stamped that same moment are re-sent
+            requests_query["updated_at"] = {"$gte" if after_id else "$gt": since_at}
+        changed_requests = await db.lawyer_requests.find(requests_query).sort("updated_at", 1).to_list(length=None)
+
+        # Messages sent or read since the token, across the user's conversations
+        changed = []
+        more = False
+        if not full:
+            # Archived messages never change: sending (or restoring) moves them back first
+            conversation_ids = [
+                request["_id"] async for request in db.lawyer_requests.find(
+                    {participant: user_id, "status": "accepted", "messages_archived": {"$ne": True}},
+                    {"_id": 1}
+                )
+            ]
+            changed = await message_store.changed_messages(
+                db, conversation_ids, since_at, SYNC_MESSAGE_LIMIT, after_id
+            )
+            more = len(changed) >= SYNC_MESSAGE_LIMIT
+
+        requests_by_id = {request["_id"]: request for request in changed_requests}
+        missing = {message["request_id"] for message in changed} - set(requests_by_id)
+        if missing:
+            async for request in db.lawyer_requests.find({"_id": {"$in": list(missing)}}):
+                requests_by_id[request["_id"]] = request
+
+        requests = []
+        for request in changed_requests:
+            request_data = await serialize_request(db, request)
+            if request_data:
+                requests.append(request_data)
+
+        # A read receipt changes the unread count, so those conversations are re-sent too
+        conversations = []
+        for request in requests_by_id.values():
+            if request["status"] != "accepted":
+                continue
+            conversation = await build_conversation(db, request, user_id)
+            if conversation:
+                conversations.append(conversation)
+
+        messages: Dict[str, List] = {}
+        participants = {}
+        for message in changed:
+            request = requests_by_id[message["request_id"]]
+            if request["_id"] not in participants:
+                participants[request["_id"]] = (
+                    await db.users.find_one({"_id": request["client_id"]}),
+                    await db.users.find_one({"_id": request["lawyer_id"]})
+                )
+            client, lawyer = participants[request["_id"]]
+            if not client or not lawyer:
+                continue
+            messages.setdefault(str(request["_id"]), []).append(to_message_response(message, client, lawyer))
+
+        if more:
+            # Continue right after the last change returned; the client should sync again right away
+            token = encode_token(changed[-1]["updated_at"], changed[-1]["_id"])
+        else:
+            token = encode_token(started - timedelta(seconds=SYNC_OVERLAP_SECONDS))
+
+        return {
+            "token": token,
+            "full": full,
+            "more": more,
+            "requests": requests,
+            "conversations": conversations,
+            "messages": messages
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error syncing: {str(e)}")
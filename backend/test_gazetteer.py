@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Test place-name resolution against the bundled gazetteer file
+"""
+from gazetteer import coordinates, get_gazetteer
+
+def resolved(text):
+    place = get_gazetteer().resolve(text)
+    return (place.name, place.country) if place else None
+
+def test_us_cities_with_codes_shared_with_india():
+    """GA / TN / DC are US codes too; a listed US city with them stays in the US"""
+    assert resolved("Atlanta, GA") == ("Atlanta", "US")
+    assert resolved("Nashville, TN") == ("Nashville", "US")
+    assert resolved("Washington, DC") == ("District of Columbia", "US")
+
+def test_indian_cities_with_shared_codes():
+    assert resolved("Chennai, TN") == ("Chennai", "IN")
+    assert resolved("Panaji, GA") == ("Panaji", "IN")
+    assert resolved("Mumbai, IN") == ("Mumbai", "IN")
+
+def test_ambiguous_code_alone():
+    """An unknown city with a code used in both countries resolves to nothing, unless a country is named"""
+    assert resolved("Macon, GA") is None
+    assert resolved("Memphis, TN") is None
+    assert resolved("Macon, GA, USA") == ("Georgia", "US")
+    assert resolved("Vellore, TN, India") == ("Tamil Nadu", "IN")
+
+def test_regions():
+    assert resolved("Seattle, Washington") == ("Seattle", "US")
+    assert resolved("Washington") == ("Washington", "US")
+    assert resolved("Tamil Nadu") == ("Tamil Nadu", "IN")
+    assert resolved("Springfield, Illinois") == ("Illinois", "US")
+
+def test_coordinates():
+    lon, lat = coordinates("Atlanta, GA")
+    assert -85 < lon < -84 and 33 < lat < 34
+    assert coordinates("12.97, 77.59") == (77.59, 12.97)
+
+if __name__ == "__main__":
+    print("🧪 Testing gazetteer")
+    print("=" * 50)
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Test the write coalescer against an in-process fake collection (no MongoDB needed)
+"""
+import asyncio
+
+from write_coalescer import MODE_BATCHED, WriteCoalescer
+
+class SlowCollection:
+    """Just enough of a Motor collection: bulk_write takes a while and is recorded"""
+
+    name = "fake"
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.batches = []
+        self.writing = asyncio.Event()
+
+    def with_options(self, **kwargs):
+        return self
+
+    async def bulk_write(self, requests, ordered=True):
+        self.writing.set()
+        await asyncio.sleep(self.delay)
+        self.batches.append(list(requests))
+
+async def update_during_flush():
+    collection = SlowCollection(delay=0.05)
+    coalescer = WriteCoalescer(collection, window_ms=10, mode=MODE_BATCHED)
+
+    first = asyncio.create_task(coalescer.update_one({"_id": 1}, {"$set": {"updated_at": 1}}))
+    await collection.writing.wait()
+
+    # The window task is inside bulk_write now; this update needs a flush of its own
+    second = asyncio.create_task(coalescer.update_one({"_id": 2}, {"$set": {"updated_at": 2}}))
+    await asyncio.wait_for(asyncio.gather(first, second), timeout=2)
+
+    assert coalescer.pending == 0
+    assert len(collection.batches) == 2
+    await coalescer.close()
+
+def test_update_during_flush():
+    """An update queued while a window flush is writing is flushed and acknowledged"""
+    asyncio.run(update_during_flush())
+
+if __name__ == "__main__":
+    print("🧪 Testing write coalescer")
+    print("=" * 50)
+    test_update_during_flush()
+    print("✅ Update queued during a flush was written and acknowledged")
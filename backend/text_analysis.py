@@ -0,0 +1,37 @@
+"""
+Tokenizing and stemming shared by the full-text features
+
+Text is lower-cased and split into words, stop words are dropped and every
+word is reduced by a light suffix stemmer ("divorced", "divorces" ->
+"divorc"). Used by the lawyer BM25 index (lawyer_fulltext) and by message
+search.
+"""
+
+from functools import lru_cache
+from typing import List
+import re
+
+STOP_WORDS = set("""
+a an and are as at be by for from has have i in is it its my of on or our that the their this to was
+we were will with you your
+""".split())
+
+# (suffix, replacement), longest first; the stem keeps at least three letters
+STEM_RULES = [
+    ("nesses", ""), ("ations", ""), ("ators", ""), ("ments", ""), ("ation", ""), ("ating", ""),
+    ("ator", ""), ("ated", ""), ("ates", ""), ("ment", ""), ("ness", ""), ("ings", ""), ("edly", ""),
+    ("sses", "ss"), ("ies", "y"), ("ate", ""), ("ing", ""), ("ed", ""), ("es", ""), ("s", ""), ("e", ""),
+]
+
+@lru_cache(maxsize=200000)
+def stem(word: str) -> str:
+    if word.endswith(("ss", "us", "is")):
+        return word
+    for suffix, replacement in STEM_RULES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:len(word) - len(suffix)] + replacement
+    return word
+
+def analyze(text: str) -> List[str]:
+    """Stemmed index terms of text, in order"""
+    return [stem(word) for word in re.findall(r"[^\W_]+", text.lower()) if word not in STOP_WORDS]
@@ -0,0 +1,172 @@
+"""
+Write coalescing for hot single-document updates
+
+Some documents are touched on every event (a conversation's lawyer_requests
+entry gets a fresh updated_at on every message). WriteCoalescer collects
+update_one calls issued within a short window, or until max_ops are queued, and
+submits them as one unordered bulk_write. Updates that only $set "last value
+wins" fields (updated_at by default) on an {"_id": ...} filter are merged per
+document, so a burst of messages in one conversation becomes a single write.
+
+Durability modes:
+    immediate  every call is its own update_one (no coalescing)
+    batched    calls are coalesced; the caller waits until its batch is acknowledged
+    deferred   calls are coalesced; the caller returns at once and the batch is
+               written in the background (errors are logged, not raised)
+
+Only use it for updates that commute: ops on the same document in one batch may
+be applied in any order.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+from pymongo import UpdateOne
+from pymongo.write_concern import WriteConcern
+import asyncio
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Coalescer configuration
+MODE_IMMEDIATE = "immediate"
+MODE_BATCHED = "batched"
+MODE_DEFERRED = "deferred"
+DURABILITY_MODES = (MODE_IMMEDIATE, MODE_BATCHED, MODE_DEFERRED)
+
+WRITE_COALESCE_MODE = os.getenv("WRITE_COALESCE_MODE", MODE_BATCHED).lower()
+WRITE_COALESCE_MAX_OPS = int(os.getenv("WRITE_COALESCE_MAX_OPS", "100"))
+WRITE_COALESCE_WINDOW_MS = int(os.getenv("WRITE_COALESCE_WINDOW_MS", "50"))
+# Optional: "majority" or a number of nodes, plus journaling
+WRITE_COALESCE_W = os.getenv("WRITE_COALESCE_W")
+WRITE_COALESCE_JOURNAL = os.getenv("WRITE_COALESCE_JOURNAL", "false").lower() == "true"
+
+DEFAULT_MERGE_FIELDS = ("updated_at",)
+
+def default_write_concern() -> Optional[WriteConcern]:
+    if WRITE_COALESCE_W is None and not WRITE_COALESCE_JOURNAL:
+        return None
+    w = WRITE_COALESCE_W
+    if w is not None and w.isdigit():
+        w = int(w)
+    return WriteConcern(w=w, j=WRITE_COALESCE_JOURNAL or None)
+
+class WriteCoalescer:
+    """Batches update_one calls against one collection into unordered bulk writes"""
+
+    def __init__(
+        self,
+        collection,
+        max_ops: int = WRITE_COALESCE_MAX_OPS,
+        window_ms: int = WRITE_COALESCE_WINDOW_MS,
+        mode: str = WRITE_COALESCE_MODE,
+        merge_fields: Iterable[str] = DEFAULT_MERGE_FIELDS,
+        write_concern: Optional[WriteConcern] = None
+    ):
+        if mode not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode '{mode}', expected one of {DURABILITY_MODES}")
+
+        write_concern = write_concern or default_write_concern()
+        self.collection = collection.with_options(write_concern=write_concern) if write_concern else collection
+        self.max_ops = max_ops
+        self.window = window_ms / 1000
+        self.mode = mode
+        self.merge_fields = frozenset(merge_fields)
+
+        self._merged: Dict[Any, Dict[str, Any]] = {}
+        self._ops: List[UpdateOne] = []
+        self._waiters: List[asyncio.Future] = []
+        self._timer: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    @property
+    def pending(self) -> int:
+        return len(self._merged) + len(self._ops)
+
+    def _is_mergeable(self, filter: dict, update: dict) -> bool:
+        return (
+            list(filter.keys()) == ["_id"]
+            and list(update.keys()) == ["$set"]
+            and set(update["$set"].keys()) <= self.merge_fields
+        )
+
+    async def update_one(self, filter: dict, update: dict):
+        """Queue an update_one; see the module docstring for what the await covers"""
+        if self.mode == MODE_IMMEDIATE:
+            await self.collection.update_one(filter, update)
+            return
+
+        if self._is_mergeable(filter, update):
+            # Last value wins for the same document
+            self._merged.setdefault(filter["_id"], {}).update(update["$set"])
+        else:
+            self._ops.append(UpdateOne(filter, update))
+
+        waiter = None
+        if self.mode == MODE_BATCHED:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+
+        if self.pending >= self.max_ops:
+            await self.flush()
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_after_window())
+
+        if waiter is not None:
+            await waiter
+
+    async def _flush_after_window(self):
+        await asyncio.sleep(self.window)
+        # Updates queued while this flush is writing need a window of their own
+        self._timer = None
+        await self.flush()
+
+    async def flush(self):
+        """Write everything queued so far as one unordered bulk_write"""
+        async with self._flush_lock:
+            if not self.pending and not self._waiters:
+                return
+
+            requests = [UpdateOne({"_id": doc_id}, {"$set": fields}) for doc_id, fields in self._merged.items()]
+            requests.extend(self._ops)
+            waiters = self._waiters
+            self._merged, self._ops, self._waiters = {}, [], []
+
+            error = None
+            if requests:
+                try:
+                    await self.collection.bulk_write(requests, ordered=False)
+                except Exception as e:
+                    error = e
+                    logger.error(f"Coalesced write of {len(requests)} ops to {self.collection.name} failed: {e}")
+
+            for waiter in waiters:
+                if waiter.done():
+                    continue
+                if error:
+                    waiter.set_exception(error)
+                else:
+                    waiter.set_result(None)
+
+    async def close(self):
+        """Flush outstanding writes and stop the window timer"""
+        await self.flush()
+        if self._timer and not self._timer.done():
+            self._timer.cancel()
+
+# One coalescer per collection for the API process
+_coalescers: Dict[str, WriteCoalescer] = {}
+
+def coalescer_for(collection) -> WriteCoalescer:
+    """Shared coalescer for a collection, created on first use"""
+    key = collection.full_name
+    coalescer = _coalescers.get(key)
+    if coalescer is None:
+        coalescer = WriteCoalescer(collection)
+        _coalescers[key] = coalescer
+    return coalescer
+
+async def flush_all():
+    """Flush and drop every shared coalescer (call on shutdown)"""
+    for coalescer in list(_coalescers.values()):
+        await coalescer.close()
+    _coalescers.clear()